@@ -0,0 +1,104 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils import metrics
+
+# Buckets for the number of items flushed per batch
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers and processes them in batches.
+
+    A batch is flushed as soon as it reaches max_batch_size, or max_wait_ms after
+    its first item arrived, whichever comes first. Each caller gets a Future
+    that resolves to the result for its own item.
+
+    Args:
+        process_batch (callable): Takes a list of items and returns a list of
+            results in the same order
+        max_batch_size (int): Largest batch handed to process_batch
+        max_wait_ms (float): Longest time the first item of a batch waits
+        name (str): Prefix for the batch-size and queue-wait histograms
+    """
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=10, name='batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.batch_size_histogram = metrics.histogram(f'{name}.batch_size', BATCH_SIZE_BUCKETS)
+        self.queue_wait_histogram = metrics.histogram(f'{name}.queue_wait_ms')
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so start one per worker process
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            if self._worker_pid != os.getpid():
+                # A forked child can't rely on the parent's queue; a worker that
+                # died in this process is restarted on the same queue so items
+                # already waiting are still processed
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, item):
+        """
+        Queue an item for the next batch
+
+        Returns:
+            Future: Resolves to the result for this item
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            flushed_at = time.monotonic()
+
+            self.batch_size_histogram.observe(len(batch))
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe((flushed_at - enqueued_at) * 1000.0)
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,217 @@
+"""
+Conversation history reads and chat turn writes, shared by both serving modes
+
+The Flask app calls the plain functions with the sync Firestore client and
+asgi.py the *_async ones with the async client. Query construction, the hot
+history cache and post-commit invalidation live here once; only the awaits
+differ.
+"""
+import logging
+from datetime import datetime, timezone
+
+from api import history_cache, read_cache
+from api.history_window import HISTORY_FETCH_LIMIT
+from api.user_stats import add_increments, stats_document
+from utils.lazy import LazyModule
+from utils.timing import timed
+
+firestore = LazyModule('firebase_admin.firestore')
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_document(db, user_id, conversation_id=None):
+    """
+    Reference a conversation, allocating a new ID if none is given
+    """
+    chats_ref = db.collection('conversations').document(user_id).collection('chats')
+    return chats_ref.document(conversation_id) if conversation_id else chats_ref.document()
+
+
+def _history_state(conversation_data):
+    # (summary, history_version, summary_until) of a conversation document
+    return (
+        conversation_data.get('summary'),
+        conversation_data.get(history_cache.VERSION_FIELD),
+        conversation_data.get('summary_until')
+    )
+
+
+def _messages_query(conversation_ref, summary_until):
+    # Newest first so long conversations keep their recent context
+    messages_ref = conversation_ref.collection('messages')
+    if summary_until is not None:
+        messages_ref = messages_ref.where('timestamp', '>', summary_until)
+    return messages_ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(HISTORY_FETCH_LIMIT)
+
+
+def _chat_messages(snapshots):
+    # Newest-first message documents to Groq chat format, oldest first
+    history = [
+        {
+            'role': 'user' if data.get('sender') == 'user' else 'assistant',
+            'content': data.get('content', '')
+        }
+        for data in (snapshot.to_dict() for snapshot in snapshots)
+    ]
+    history.reverse()
+    return history
+
+
+def load_conversation_history(db, user_id, conversation_id):
+    """
+    Load a conversation's running summary and the newest messages it doesn't cover
+
+    The messages come from the hot history cache when its entry matches the
+    conversation's history_version, so steady-state turns read only the
+    conversation document.
+
+    Returns:
+        tuple: (messages in Groq chat format oldest first, summary or None,
+            history_version or None)
+    """
+    if not conversation_id:
+        return [], None, None
+    summary = version = None
+    try:
+        conversation_ref = conversation_document(db, user_id, conversation_id)
+        with timed('firestore'):
+            conversation_data = conversation_ref.get().to_dict() or {}
+        summary, version, summary_until = _history_state(conversation_data)
+
+        cached = history_cache.get_window(user_id, conversation_id, version, summary_until)
+        if cached is not None:
+            return cached, summary, version
+
+        with timed('firestore'):
+            history = _chat_messages(list(_messages_query(conversation_ref, summary_until).stream()))
+        history_cache.put_window(user_id, conversation_id, version, summary_until, history)
+        return history, summary, version
+    except Exception as e:
+        logger.error(f"Error getting conversation history: {str(e)}", exc_info=True)
+        return [], summary, version
+
+
+async def load_conversation_history_async(db, user_id, conversation_id):
+    """
+    load_conversation_history() with an async Firestore client
+    """
+    if not conversation_id:
+        return [], None, None
+    summary = version = None
+    try:
+        conversation_ref = conversation_document(db, user_id, conversation_id)
+        with timed('firestore'):
+            conversation_data = (await conversation_ref.get()).to_dict() or {}
+        summary, version, summary_until = _history_state(conversation_data)
+
+        cached = history_cache.get_window(user_id, conversation_id, version, summary_until)
+        if cached is not None:
+            return cached, summary, version
+
+        with timed('firestore'):
+            history = _chat_messages([msg async for msg in _messages_query(conversation_ref, summary_until).stream()])
+        history_cache.put_window(user_id, conversation_id, version, summary_until, history)
+        return history, summary, version
+    except Exception as e:
+        logger.error(f"Error getting conversation history: {str(e)}", exc_info=True)
+        return [], summary, version
+
+
+def add_chat_turn(batch, conversation_ref, is_new, message, ai_response, sentiment=None, sent_at=None, replied_at=None, stats_ref=None):
+    """
+    Add the writes for one chat turn to a Firestore write batch
+
+    The conversation header and both messages are committed together, so a
+    turn is either stored completely or not at all. Messages carry app-side
+    timestamps: a server timestamp would be identical for both documents in
+    one commit and lose their order.
+
+    Args:
+        batch: A WriteBatch (or AsyncWriteBatch with async references)
+        conversation_ref: The conversation document
+        is_new (bool): Create the conversation instead of updating it
+        message (str): The user's message
+        ai_response (str): The AI reply
+        sentiment (dict): Sentiment result stored on the user message
+        sent_at (datetime): When the user message was received
+        replied_at (datetime): When the reply was generated
+        stats_ref: The user's stats summary, counting new conversations
+    """
+    sent_at = sent_at or datetime.now(timezone.utc)
+    replied_at = replied_at or datetime.now(timezone.utc)
+
+    if is_new:
+        batch.set(conversation_ref, {
+            'title': message[:30] + '...' if len(message) > 30 else message,
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'last_message': message,
+            history_cache.VERSION_FIELD: 2
+        })
+        if stats_ref is not None:
+            add_increments(batch, stats_ref, conversationCount=1)
+    else:
+        batch.update(conversation_ref, {
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'last_message': message,
+            history_cache.VERSION_FIELD: firestore.Increment(2)
+        })
+
+    messages_ref = conversation_ref.collection('messages')
+    user_message = {
+        'content': message,
+        'sender': 'user',
+        'timestamp': sent_at
+    }
+    if sentiment:
+        user_message['sentiment'] = sentiment
+    batch.set(messages_ref.document(), user_message)
+    batch.set(messages_ref.document(), {
+        'content': ai_response,
+        'sender': 'ai',
+        'timestamp': replied_at
+    })
+
+
+def _prepare_turn(db, user_id, conversation_id, message, ai_response, sentiment, sent_at):
+    # The conversation and a batch holding the turn's writes
+    conversation_ref = conversation_document(db, user_id, conversation_id)
+    batch = db.batch()
+    add_chat_turn(batch, conversation_ref, not conversation_id, message, ai_response, sentiment, sent_at,
+                  stats_ref=stats_document(db, user_id))
+    return conversation_ref, batch
+
+
+def _turn_committed(user_id, conversation_id, conversation_ref, version, message, ai_response):
+    # Caches are only updated once the turn is stored
+    history_cache.append_turn(user_id, conversation_ref.id, version, message, ai_response, is_new=not conversation_id)
+    read_cache.invalidate(user_id, 'conversations', 'stats')
+    return conversation_ref.id
+
+
+def save_chat_turn(db, user_id, conversation_id, message, ai_response, sentiment=None, sent_at=None, version=None):
+    """
+    Store a user message and the AI reply in one batch, creating the conversation if needed
+
+    Args:
+        version (int): The history_version the turn's history was loaded at,
+            used to extend the hot history cache
+
+    Returns:
+        str: The conversation ID
+    """
+    conversation_ref, batch = _prepare_turn(db, user_id, conversation_id, message, ai_response, sentiment, sent_at)
+    with timed('firestore'):
+        batch.commit()
+    return _turn_committed(user_id, conversation_id, conversation_ref, version, message, ai_response)
+
+
+async def save_chat_turn_async(db, user_id, conversation_id, message, ai_response, sentiment=None, sent_at=None, version=None):
+    """
+    save_chat_turn() with an async Firestore client
+    """
+    conversation_ref, batch = _prepare_turn(db, user_id, conversation_id, message, ai_response, sentiment, sent_at)
+    with timed('firestore'):
+        await batch.commit()
+    return _turn_committed(user_id, conversation_id, conversation_ref, version, message, ai_response)
@@ -0,0 +1,80 @@
+import os
+from functools import partial
+
+from api import read_cache
+from api.pipeline import fan_out
+from api.user_stats import get_stats
+from models.records import Conversation, Goal, JournalEntry, MoodEntry, serialize
+from utils.pagination import fetch_page
+
+# Seconds each dashboard section may take before it is left out of the response
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv('DASHBOARD_SECTION_TIMEOUT', '3'))
+
+# Items per section, matching what the dashboard requests from the list endpoints
+RECENT_MOODS = 5
+RECENT_JOURNALS = 3
+RECENT_CONVERSATIONS = 3
+
+
+def recent_moods(db, user_id):
+    moods, _ = fetch_page(db.collection('moods').document(user_id).collection('entries'),
+                          'timestamp', limit=RECENT_MOODS)
+    return serialize(map(MoodEntry.from_snapshot, moods))
+
+
+def recent_journals(db, user_id):
+    journals, _ = fetch_page(db.collection('journals').document(user_id).collection('entries'),
+                             'created_at', limit=RECENT_JOURNALS)
+    return serialize(map(JournalEntry.from_snapshot, journals))
+
+
+def recent_conversations(db, user_id):
+    conversations, _ = fetch_page(db.collection('conversations').document(user_id).collection('chats'),
+                                  'updated_at', limit=RECENT_CONVERSATIONS)
+    return serialize(map(Conversation.from_snapshot, conversations))
+
+
+def goals(db, user_id):
+    items, _ = fetch_page(db.collection('goals').document(user_id).collection('items'),
+                          'target_date', direction='ASCENDING')
+    return serialize(map(Goal.from_snapshot, items))
+
+
+# Section name to (read cache resource, loader)
+SECTIONS = {
+    'moods': ('moods', recent_moods),
+    'journals': ('journals', recent_journals),
+    'conversations': ('conversations', recent_conversations),
+    'goals': ('goals', goals),
+    'stats': ('stats', get_stats)
+}
+
+
+def _load_section(db, user_id, resource, load):
+    # Stats share their cache entry with /api/user/stats
+    key = 'stats' if resource == 'stats' else 'dashboard'
+    return read_cache.get_or_load(user_id, resource, key, partial(load, db, user_id))
+
+
+def load_dashboard(db, user_id, timeout=DASHBOARD_SECTION_TIMEOUT):
+    """
+    Load every dashboard section concurrently
+
+    Sections are formatted like their list endpoints (/api/mood/recent,
+    /api/journal/entries, /api/chat/conversations, /api/goals and
+    /api/user/stats) and read through the per-user read cache. A section that
+    fails or takes longer than timeout is returned as None and named in 'errors'.
+
+    Returns:
+        dict: One key per section, plus 'partial' and 'errors'
+    """
+    results, errors = fan_out(
+        'dashboard',
+        {section: partial(_load_section, db, user_id, resource, load) for section, (resource, load) in SECTIONS.items()},
+        timeout
+    )
+
+    payload = {section: results.get(section) for section in SECTIONS}
+    payload['partial'] = bool(errors)
+    payload['errors'] = errors
+    return payload
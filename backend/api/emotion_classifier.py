@@ -0,0 +1,120 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ONNX export of SamLowe/roberta-base-go_emotions (includes an int8 quantized variant)
+LOCAL_MODEL_REPO = os.getenv('LOCAL_SENTIMENT_MODEL_REPO', 'SamLowe/roberta-base-go_emotions-onnx')
+LOCAL_MODEL_FILE = os.getenv('LOCAL_SENTIMENT_MODEL_FILE', 'onnx/model_quantized.onnx')
+LOCAL_TOKENIZER_FILE = os.getenv('LOCAL_SENTIMENT_TOKENIZER_FILE', 'onnx/tokenizer.json')
+# Optional directory containing the model and tokenizer files (skips the Hub download)
+LOCAL_MODEL_DIR = os.getenv('LOCAL_SENTIMENT_MODEL_DIR')
+LOCAL_MAX_LENGTH = int(os.getenv('LOCAL_SENTIMENT_MAX_LENGTH', '512'))
+LOCAL_NUM_THREADS = int(os.getenv('LOCAL_SENTIMENT_NUM_THREADS', '1'))
+
+
+class LocalEmotionClassifier:
+    """
+    In-process go_emotions classifier running on the ONNX CPU runtime.
+
+    The model and tokenizer are loaded lazily on first use and shared by every
+    request handled by this worker process.
+    """
+
+    def __init__(self, labels, model_dir=None):
+        self.labels = labels
+        self.model_dir = model_dir
+        self._session = None
+        self._tokenizer = None
+        self._input_names = ()
+        self._lock = threading.Lock()
+
+    def _resolve_file(self, filename):
+        if self.model_dir:
+            return os.path.join(self.model_dir, filename)
+
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(LOCAL_MODEL_REPO, filename)
+
+    def _load(self):
+        """
+        Load the ONNX session and tokenizer once per process
+        """
+        if self._session is not None:
+            return
+
+        with self._lock:
+            if self._session is not None:
+                return
+
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(self._resolve_file(LOCAL_TOKENIZER_FILE))
+            tokenizer.enable_truncation(max_length=LOCAL_MAX_LENGTH)
+            tokenizer.enable_padding()
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = LOCAL_NUM_THREADS
+            options.inter_op_num_threads = 1
+            session = ort.InferenceSession(
+                self._resolve_file(LOCAL_MODEL_FILE),
+                sess_options=options,
+                providers=['CPUExecutionProvider']
+            )
+
+            self._input_names = tuple(i.name for i in session.get_inputs())
+            self._tokenizer = tokenizer
+            self._session = session
+            print(f"Loaded local emotion classifier from {self.model_dir or LOCAL_MODEL_REPO}")
+
+    def classify(self, texts):
+        """
+        Score a batch of texts
+
+        Args:
+            texts (list): Texts to classify
+
+        Returns:
+            list: One list of {'label', 'score'} dicts per text, in the same
+                shape as the Hugging Face Inference API response
+        """
+        self._load()
+
+        encodings = self._tokenizer.encode_batch(list(texts))
+        feeds = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        }
+        if 'token_type_ids' in self._input_names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        logits = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+
+        # go_emotions is multi-label, so each label gets an independent sigmoid
+        scores = 1.0 / (1.0 + np.exp(-logits))
+
+        results = []
+        for row in scores:
+            order = np.argsort(row)[::-1]
+            results.append([{'label': self.labels[i], 'score': float(row[i])} for i in order])
+        return results
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_local_classifier(labels):
+    """
+    Return the process-wide classifier, creating it on first use
+    """
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = LocalEmotionClassifier(labels, model_dir=LOCAL_MODEL_DIR)
+    return _classifier
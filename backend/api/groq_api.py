@@ -1,16 +1,84 @@
 import os
-import requests
 import json
 from dotenv import load_dotenv
 
+from api.history_window import fit_history
+from utils import http_client, async_http_client
+from utils.timing import timed
+
 # Load environment variables
 load_dotenv()
 
 # Get Groq API key from environment variables
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv('GROQ_API_URL', "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = "llama3-8b-8192"
+MAX_TOKENS = 800
+TEMPERATURE = 0.7
+SUMMARY_MAX_TOKENS = 400
+
+class StreamInterruptedError(Exception):
+    """
+    Raised by generate_response_stream when Groq fails after part of the reply was yielded
+    """
 
-def generate_response(message, emotion, conversation_history=None):
+def build_request(message, emotion, conversation_history=None, stream=False, summary=None):
+    """
+    Build the headers and body for a Groq chat completion request
+    
+    Args:
+        message (str): The user's message
+        emotion (str): The detected emotion
+        conversation_history (list): Previous conversation messages
+        stream (bool): Ask Groq to stream the completion
+        summary (str): Running summary of the turns before conversation_history
+        
+    Returns:
+        tuple: (headers, data)
+    """
+    # Get API key from environment variable
+    api_key = os.getenv('GROQ_API_KEY')
+    
+    if not api_key:
+        raise ValueError("GROQ_API_KEY environment variable not set")
+    
+    # Prepare conversation history for the API
+    messages = []
+    
+    # Add system message with context about the user's emotion
+    system_message = f"""You are an empathetic AI therapist. The user's message indicates they may be feeling {emotion}. 
+    Respond with empathy and understanding. Provide supportive guidance without making medical diagnoses or prescribing treatments.
+    Focus on active listening, validation, and suggesting healthy coping strategies."""
+    
+    # Earlier turns are represented by their summary rather than verbatim
+    if summary:
+        system_message += f"\n\nSummary of the earlier conversation:\n{summary}"
+    
+    messages.append({"role": "system", "content": system_message})
+    
+    # Add as much recent history as fits the context window next to the reply
+    if conversation_history:
+        messages.extend(fit_history(conversation_history, system_message, message, MAX_TOKENS))
+    
+    # Add the current user message
+    messages.append({"role": "user", "content": message})
+    
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": GROQ_MODEL,
+        "messages": messages,
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS
+    }
+    if stream:
+        data["stream"] = True
+    
+    return headers, data
+
+def generate_response(message, emotion, conversation_history=None, summary=None):
     """
     Generate a response using the Groq API
     
@@ -18,50 +86,17 @@ def generate_response(message, emotion, conversation_history=None):
         message (str): The user's message
         emotion (str): The detected emotion
         conversation_history (list): Previous conversation messages
+        summary (str): Running summary of earlier turns
         
     Returns:
         str: The AI response
     """
     try:
-        # Get API key from environment variable
-        api_key = os.getenv('GROQ_API_KEY')
-        
-        if not api_key:
-            raise ValueError("GROQ_API_KEY environment variable not set")
-        
-        # Prepare conversation history for the API
-        messages = []
-        
-        # Add system message with context about the user's emotion
-        system_message = f"""You are an empathetic AI therapist. The user's message indicates they may be feeling {emotion}. 
-        Respond with empathy and understanding. Provide supportive guidance without making medical diagnoses or prescribing treatments.
-        Focus on active listening, validation, and suggesting healthy coping strategies."""
+        headers, data = build_request(message, emotion, conversation_history, summary=summary)
         
-        messages.append({"role": "system", "content": system_message})
-        
-        # Add conversation history
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        # Add the current user message
-        messages.append({"role": "user", "content": message})
-        
-        # Prepare the API request
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "llama3-8b-8192",
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 800
-        }
-        
-        # Make the API request
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        # Make the API request through the pooled, retrying client
+        with timed('model'):
+            response = http_client.post(GROQ_API_URL, 'groq', headers=headers, data=json.dumps(data))
         
         # Parse the response
         response_data = response.json()
@@ -70,22 +105,155 @@ def generate_response(message, emotion, conversation_history=None):
         return ai_response
         
     except Exception as e:
-        # If the Groq API is unavailable, use a fallback response
+        # If the Groq API is unavailable (or its circuit is open), use a fallback response
         print(f"Error calling Groq API: {str(e)}")
         print("Using fallback response")
+        return fallback_response(emotion)
+
+async def generate_response_async(message, emotion, conversation_history=None, summary=None):
+    """
+    Generate a response using the Groq API without blocking the event loop
+    
+    Args:
+        message (str): The user's message
+        emotion (str): The detected emotion
+        conversation_history (list): Previous conversation messages
+        summary (str): Running summary of earlier turns
         
-        # Fallback responses based on emotion
-        fallback_responses = {
-            'happy': "I'm glad to hear you're feeling positive! It's wonderful that you're experiencing these good emotions. Would you like to share more about what's contributing to your happiness?",
-            'content': "It sounds like you're in a relatively balanced state. How can I support you today?",
-            'neutral': "Thank you for sharing that with me. I'm here to listen and support you. Would you like to explore this topic further?",
-            'sad': "I'm sorry to hear you're feeling down. It's completely normal to experience sadness, and I'm here to listen. Would you like to talk more about what's troubling you?",
-            'depressed': "I can sense that you're going through a difficult time. Please remember that you're not alone, and it's brave of you to reach out. Would it help to discuss some coping strategies that might provide some relief?",
-            'angry': "I can understand feeling frustrated or angry. These emotions are valid and important. Would it help to explore what triggered these feelings?",
-            'anxious': "It sounds like you might be experiencing some anxiety. This is a common feeling that many people face. Would you like to try some grounding techniques that might help in the moment?"
-        }
+    Returns:
+        str: The AI response
+    """
+    try:
+        headers, data = build_request(message, emotion, conversation_history, summary=summary)
+        response = await async_http_client.post(GROQ_API_URL, 'groq', headers=headers, data=json.dumps(data))
+        return response.json()['choices'][0]['message']['content']
         
-        # Get appropriate fallback response based on emotion
-        response = fallback_responses.get(emotion, fallback_responses['neutral'])
+    except Exception as e:
+        print(f"Error calling Groq API: {str(e)}")
+        print("Using fallback response")
+        return fallback_response(emotion)
+
+def generate_response_stream(message, emotion, conversation_history=None, summary=None):
+    """
+    Stream a response from the Groq API as it is generated
+    
+    Args:
+        message (str): The user's message
+        emotion (str): The detected emotion
+        conversation_history (list): Previous conversation messages
+        summary (str): Running summary of earlier turns
+        
+    Yields:
+        str: Pieces of the AI response, in order. If Groq fails before the
+            first piece arrives, the fallback response is yielded instead.
+    
+    Raises:
+        StreamInterruptedError: If Groq fails, or the stream ends without its
+            [DONE] marker, after some pieces were yielded; what was yielded
+            is not a complete reply
+    """
+    started = False
+    finished = False
+    try:
+        headers, data = build_request(message, emotion, conversation_history, stream=True, summary=summary)
+        # Only the wait for the first byte; tokens arrive after the headers are sent
+        with timed('model'):
+            response = http_client.post(GROQ_API_URL, 'groq', headers=headers, data=json.dumps(data), stream=True)
+        
+        with response:
+            # OpenAI-compatible SSE: "data: {json}" lines, terminated by "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    finished = True
+                    break
+                
+                choices = json.loads(payload).get('choices') or [{}]
+                content = choices[0].get('delta', {}).get('content')
+                if content:
+                    started = True
+                    yield content
+        
+        if not finished:
+            raise StreamInterruptedError("Groq stream ended before [DONE]")
+        
+    except Exception as e:
+        print(f"Error streaming from Groq API: {str(e)}")
+        if started:
+            # Part of the reply was already delivered; the caller must not treat it as complete
+            if isinstance(e, StreamInterruptedError):
+                raise
+            raise StreamInterruptedError(str(e)) from e
+        print("Using fallback response")
+        yield fallback_response(emotion)
+
+def summarize_conversation(previous_summary, messages):
+    """
+    Fold conversation messages into a running summary with the Groq API
+    
+    Args:
+        previous_summary (str): The summary so far, or None
+        messages (list): Messages in Groq chat format, oldest first
+        
+    Returns:
+        str: The updated summary, or None if Groq is unavailable
+    """
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key:
+        return None
+    
+    transcript = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Therapist'}: {m['content']}" for m in messages
+    )
+    prompt = (
+        "Update the summary of a supportive therapy conversation with the new messages below. "
+        "Keep the user's main concerns, feelings, important facts and any coping strategies discussed. "
+        f"Write at most {SUMMARY_MAX_TOKENS // 2} words in the third person. Reply with the summary only.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    )
+    
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": GROQ_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.2,
+        "max_tokens": SUMMARY_MAX_TOKENS
+    }
+    
+    try:
+        response = http_client.post(GROQ_API_URL, 'groq', headers=headers, data=json.dumps(data))
+        return response.json()['choices'][0]['message']['content'].strip() or None
+    except Exception as e:
+        print(f"Error summarizing conversation: {str(e)}")
+        return None
+
+def fallback_response(emotion):
+    """
+    Canned response used when the Groq API is unavailable
+    
+    Args:
+        emotion (str): The detected emotion
         
-        return response + "\n\n(Note: This is a fallback response due to a temporary issue connecting to our AI system. Your message will be processed properly once the connection is restored.)"
+    Returns:
+        str: The fallback response
+    """
+    # Fallback responses based on emotion
+    fallback_responses = {
+        'happy': "I'm glad to hear you're feeling positive! It's wonderful that you're experiencing these good emotions. Would you like to share more about what's contributing to your happiness?",
+        'content': "It sounds like you're in a relatively balanced state. How can I support you today?",
+        'neutral': "Thank you for sharing that with me. I'm here to listen and support you. Would you like to explore this topic further?",
+        'sad': "I'm sorry to hear you're feeling down. It's completely normal to experience sadness, and I'm here to listen. Would you like to talk more about what's troubling you?",
+        'depressed': "I can sense that you're going through a difficult time. Please remember that you're not alone, and it's brave of you to reach out. Would it help to discuss some coping strategies that might provide some relief?",
+        'angry': "I can understand feeling frustrated or angry. These emotions are valid and important. Would it help to explore what triggered these feelings?",
+        'anxious': "It sounds like you might be experiencing some anxiety. This is a common feeling that many people face. Would you like to try some grounding techniques that might help in the moment?"
+    }
+    
+    # Get appropriate fallback response based on emotion
+    response = fallback_responses.get(emotion, fallback_responses['neutral'])
+    
+    return response + "\n\n(Note: This is a fallback response due to a temporary issue connecting to our AI system. Your message will be processed properly once the connection is restored.)"
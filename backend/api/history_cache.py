@@ -0,0 +1,90 @@
+import os
+
+from api.history_window import HISTORY_FETCH_LIMIT
+from utils.cache import make_cache
+
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', '2048'))
+HISTORY_CACHE_TTL = float(os.getenv('HISTORY_CACHE_TTL', '3600'))
+# 'memory' (per worker) or 'sqlite' (shared by the workers on a host)
+HISTORY_CACHE_BACKEND = os.getenv('HISTORY_CACHE_BACKEND', 'memory')
+
+# Conversation field bumped by every stored turn; a cached window is only
+# used while its version matches the document's
+VERSION_FIELD = 'history_version'
+
+history_cache = make_cache(
+    'history',
+    maxsize=HISTORY_CACHE_SIZE,
+    ttl=HISTORY_CACHE_TTL,
+    backend=HISTORY_CACHE_BACKEND
+)
+
+
+def _key(user_id, conversation_id):
+    return f'{user_id}/{conversation_id}'
+
+
+def _marker(summary_until):
+    # summary_until changes whenever older messages are folded into the summary
+    return summary_until.isoformat() if summary_until is not None else None
+
+
+def get_window(user_id, conversation_id, version, summary_until):
+    """
+    Return the cached recent messages of a conversation if they are current
+
+    Args:
+        version (int): The conversation document's history_version
+        summary_until (datetime): The conversation's summary_until
+
+    Returns:
+        list: Messages in Groq chat format, or None on a miss or stale entry
+    """
+    if version is None:
+        return None
+    entry = history_cache.get(_key(user_id, conversation_id))
+    if entry is None or entry['version'] != version or entry['summary_until'] != _marker(summary_until):
+        return None
+    return list(entry['history'])
+
+
+def put_window(user_id, conversation_id, version, summary_until, history):
+    """
+    Cache the recent messages read from Firestore at a given version
+    """
+    if version is None:
+        return
+    history_cache.set(_key(user_id, conversation_id), {
+        'version': version,
+        'summary_until': _marker(summary_until),
+        'history': list(history[-HISTORY_FETCH_LIMIT:])
+    })
+
+
+def append_turn(user_id, conversation_id, previous_version, message, ai_response, is_new=False):
+    """
+    Add a stored turn to the cached window, so the next turn needs no history read
+
+    The entry is only extended if it was current at previous_version;
+    otherwise it is dropped and the next turn reloads from Firestore.
+    """
+    key = _key(user_id, conversation_id)
+    turn = [
+        {'role': 'user', 'content': message},
+        {'role': 'assistant', 'content': ai_response}
+    ]
+
+    if is_new:
+        history_cache.set(key, {'version': 2, 'summary_until': None, 'history': turn})
+        return
+
+    entry = history_cache.get(key)
+    if entry is None or previous_version is None or entry['version'] != previous_version:
+        history_cache.delete(key)
+        return
+
+    history_cache.set(key, {
+        'version': previous_version + 2,
+        'summary_until': entry['summary_until'],
+        'history': (entry['history'] + turn)[-HISTORY_FETCH_LIMIT:]
+    })
@@ -0,0 +1,86 @@
+import math
+import os
+import threading
+
+from utils import metrics
+
+# llama3-8b-8192 context window, in tokens
+CONTEXT_WINDOW = int(os.getenv('GROQ_CONTEXT_WINDOW', '8192'))
+# Newest messages fetched from Firestore before trimming to the budget
+HISTORY_FETCH_LIMIT = int(os.getenv('HISTORY_FETCH_LIMIT', '40'))
+# Extra tokens kept free to absorb estimation error
+PROMPT_SAFETY_MARGIN = int(os.getenv('PROMPT_SAFETY_MARGIN', '256'))
+# Optional tokenizer.json of the Groq model for exact counts; otherwise tokens are estimated
+PROMPT_TOKENIZER_FILE = os.getenv('PROMPT_TOKENIZER_FILE')
+
+# Chat template tokens around each message (role header and end-of-turn markers)
+MESSAGE_OVERHEAD = 4
+# Llama 3's tokenizer averages a little under four characters per token on English text
+CHARS_PER_TOKEN = 3.5
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def _get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None and PROMPT_TOKENIZER_FILE:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    from tokenizers import Tokenizer
+                    _tokenizer = Tokenizer.from_file(PROMPT_TOKENIZER_FILE)
+                except Exception as e:
+                    print(f"Error loading prompt tokenizer, estimating instead: {str(e)}")
+                    _tokenizer = False
+    return _tokenizer or None
+
+
+def count_tokens(text):
+    """
+    Count (or, without a tokenizer file, estimate) the tokens in a text
+    """
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(message):
+    return count_tokens(message.get('content', '')) + MESSAGE_OVERHEAD
+
+
+def fit_history(history, system_message, message, max_tokens):
+    """
+    Keep the newest history messages that fit the model's context window
+
+    The budget is the context window minus the reply's max_tokens, the system
+    prompt, the current message and a safety margin. Messages are dropped
+    oldest first; a message that doesn't fit ends the window so no gaps
+    appear in the conversation.
+
+    Args:
+        history (list): Prior messages in chronological order
+        system_message (str): The system prompt
+        message (str): The current user message
+        max_tokens (int): Tokens reserved for the reply
+
+    Returns:
+        list: The most recent messages that fit, in chronological order
+    """
+    budget = (CONTEXT_WINDOW - max_tokens - PROMPT_SAFETY_MARGIN
+              - message_tokens({'content': system_message}) - message_tokens({'content': message}))
+
+    window = []
+    for item in reversed(history or []):
+        cost = message_tokens(item)
+        if cost > budget:
+            break
+        budget -= cost
+        window.append(item)
+    window.reverse()
+
+    metrics.counter('prompt.history_messages_dropped').inc(len(history or []) - len(window))
+    return window
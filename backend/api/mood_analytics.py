@@ -0,0 +1,281 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from firebase_admin import firestore
+
+# Weight of the newest mood in the exponentially weighted trend
+MOOD_EWMA_ALPHA = float(os.getenv('MOOD_EWMA_ALPHA', '0.3'))
+
+ANALYTICS_COLLECTION = 'mood_analytics'
+GRANULARITIES = ('day', 'week')
+
+# Entries per vectorized EWMA block; keeps (1 - alpha) ** n well inside float range
+EWMA_BLOCK = 64
+# Firestore allows 500 writes per batch
+BATCH_LIMIT = 500
+# Rebuilds to try before leaving the summary unseeded during a burst of new moods
+REBUILD_ATTEMPTS = 3
+
+_DAY = 86400
+
+
+def analytics_document(db, user_id):
+    """
+    Reference a user's mood analytics summary (current trend and last update)
+    """
+    return db.collection(ANALYTICS_COLLECTION).document(user_id)
+
+
+def buckets_collection(db, user_id, granularity):
+    return analytics_document(db, user_id).collection('daily' if granularity == 'day' else 'weekly')
+
+
+def bucket_start(moment, granularity):
+    """
+    Return the UTC start of the day or ISO week (Monday) containing moment
+    """
+    day = datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def bucket_id(start, granularity):
+    if granularity == 'week':
+        year, week, _ = start.isocalendar()
+        return f'{year}-W{week:02d}'
+    return start.strftime('%Y-%m-%d')
+
+
+def mood_value(mood):
+    # Only numeric moods are aggregated
+    if isinstance(mood, (int, float)) and not isinstance(mood, bool):
+        return float(mood)
+    return None
+
+
+def add_mood(transaction, db, user_id, mood, recorded_at=None):
+    """
+    Fold one mood entry into a user's buckets and trend inside a transaction
+
+    Count and sum are server-side increments and min/max server-side
+    minimum/maximum transforms, so only the summary document (for the
+    previous trend) is read. Call before any writes in the transaction.
+
+    Args:
+        transaction: The Firestore transaction recording the entry
+        db: Firestore client
+        user_id (str): The user's ID
+        mood: The mood value; non-numeric values are ignored
+        recorded_at (datetime): When the entry was recorded (defaults to now)
+    """
+    value = mood_value(mood)
+    if value is None:
+        return
+
+    recorded_at = recorded_at or datetime.now(timezone.utc)
+    summary_ref = analytics_document(db, user_id)
+    summary = summary_ref.get(transaction=transaction)
+    previous = summary.to_dict().get('trend') if summary.exists else None
+    trend = value if previous is None else MOOD_EWMA_ALPHA * value + (1 - MOOD_EWMA_ALPHA) * previous
+
+    for granularity in GRANULARITIES:
+        start = bucket_start(recorded_at, granularity)
+        transaction.set(buckets_collection(db, user_id, granularity).document(bucket_id(start, granularity)), {
+            'start': start,
+            'count': firestore.Increment(1),
+            'sum': firestore.Increment(value),
+            'min': firestore.Minimum(value),
+            'max': firestore.Maximum(value),
+            'trend': trend
+        }, merge=True)
+
+    transaction.set(summary_ref, {
+        'trend': trend,
+        'updated_at': firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+
+def get_series(db, user_id, start, end, granularity='day'):
+    """
+    Return pre-aggregated mood buckets in [start, end)
+
+    Reads one document per bucket in the range, however many entries it holds.
+
+    Returns:
+        list: {'period', 'start', 'count', 'mean', 'min', 'max', 'trend'} per
+            bucket that has entries, oldest first
+    """
+    buckets_ref = buckets_collection(db, user_id, granularity)
+    query = buckets_ref.where('start', '>=', bucket_start(start, granularity)).where('start', '<', end).order_by('start')
+
+    series = []
+    for bucket in query.stream():
+        data = bucket.to_dict()
+        count = data.get('count', 0)
+        series.append({
+            'period': bucket.id,
+            'start': data['start'].isoformat(),
+            'count': count,
+            'mean': round(data.get('sum', 0) / count, 2) if count else None,
+            'min': data.get('min'),
+            'max': data.get('max'),
+            'trend': round(data['trend'], 2) if data.get('trend') is not None else None
+        })
+    return series
+
+
+def get_summary(db, user_id):
+    """
+    Return the user's analytics summary, or None until rebuild() has seeded it
+
+    add_mood() creates the summary of a user who records a mood before it was
+    ever rebuilt, but that summary only covers the new entries, so it isn't
+    trusted until it is marked as seeded. A seeded summary may hold no trend
+    (a user without numeric moods).
+    """
+    summary = analytics_document(db, user_id).get()
+    data = summary.to_dict() if summary.exists else None
+    return data if data and data.get('seeded') else None
+
+
+def ewma(values, alpha=MOOD_EWMA_ALPHA, initial=None):
+    """
+    Exponentially weighted moving average of values, computed blockwise with NumPy
+
+    Within a block, trend[j] = d[j] * (previous + alpha * cumsum(x / d)[j])
+    with d[j] = (1 - alpha) ** (j + 1), which equals the recurrence
+    trend[j] = alpha * x[j] + (1 - alpha) * trend[j - 1].
+
+    Args:
+        values (np.ndarray): Values in time order
+        initial (float): Trend before the first value (defaults to the first value)
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    if not len(values):
+        return out
+
+    previous = values[0] if initial is None else initial
+    for offset in range(0, len(values), EWMA_BLOCK):
+        block = values[offset:offset + EWMA_BLOCK]
+        decay = (1 - alpha) ** np.arange(1, len(block) + 1)
+        out[offset:offset + len(block)] = decay * (previous + alpha * np.cumsum(block / decay))
+        previous = out[offset + len(block) - 1]
+    return out
+
+
+def aggregate(timestamps, values, granularity, alpha=MOOD_EWMA_ALPHA):
+    """
+    Bucket time-ordered mood entries with NumPy
+
+    Args:
+        timestamps (np.ndarray): Entry times as UTC epoch seconds, ascending
+        values (np.ndarray): Mood values
+        granularity (str): 'day' or 'week'
+
+    Returns:
+        dict: Bucket start (datetime) to {'count', 'sum', 'min', 'max', 'trend'}
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {}
+
+    days = np.floor_divide(timestamps, _DAY).astype(np.int64)
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        keys = (days + 3) // 7 * 7 - 3
+    else:
+        keys = days
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(values)] - 1
+    trend = ewma(values, alpha)
+
+    counts = np.diff(np.r_[starts, len(values)])
+    sums = np.add.reduceat(values, starts)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+
+    return {
+        datetime.fromtimestamp(int(keys[i]) * _DAY, tz=timezone.utc): {
+            'count': int(counts[n]),
+            'sum': float(sums[n]),
+            'min': float(mins[n]),
+            'max': float(maxs[n]),
+            'trend': float(trend[ends[n]])
+        }
+        for n, i in enumerate(starts)
+    }
+
+
+def _load_moods(db, user_id):
+    # Numeric mood entries as (epoch seconds, values), oldest first
+    entries_ref = db.collection('moods').document(user_id).collection('entries')
+    timestamps, values = [], []
+    for entry in entries_ref.select(['mood', 'timestamp']).order_by('timestamp').stream():
+        data = entry.to_dict()
+        value = mood_value(data.get('mood'))
+        if value is not None and data.get('timestamp') is not None:
+            timestamps.append(data['timestamp'].timestamp())
+            values.append(value)
+    return timestamps, values
+
+
+def _write_buckets(db, user_id, timestamps, values):
+    batch = db.batch()
+    pending = 0
+    for granularity in GRANULARITIES:
+        for start, bucket in aggregate(timestamps, values, granularity).items():
+            ref = buckets_collection(db, user_id, granularity).document(bucket_id(start, granularity))
+            batch.set(ref, dict(bucket, start=start))
+            pending += 1
+            if pending == BATCH_LIMIT:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+    if pending:
+        batch.commit()
+
+
+def _seed_summary(db, summary_ref, trend, update_time):
+    # Every add_mood() writes the summary, so an unchanged update time means
+    # no mood was added while the buckets were rebuilt
+    @firestore.transactional
+    def seed(transaction):
+        current = summary_ref.get(transaction=transaction)
+        if (current.update_time if current.exists else None) != update_time:
+            return False
+        transaction.set(summary_ref, {
+            'trend': trend,
+            'seeded': True,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        })
+        return True
+
+    return seed(db.transaction())
+
+
+def rebuild(db, user_id):
+    """
+    Recompute a user's buckets and trend from their raw mood entries
+
+    Used to backfill users whose entries predate the analytics module. Existing
+    buckets are overwritten, which would drop the increments of a mood added
+    concurrently; the summary is only marked as seeded if no mood was added
+    since the entries were read, otherwise the rebuild starts over.
+
+    Returns:
+        int: Number of numeric entries aggregated
+    """
+    summary_ref = analytics_document(db, user_id)
+    for _ in range(REBUILD_ATTEMPTS):
+        before = summary_ref.get()
+        timestamps, values = _load_moods(db, user_id)
+        _write_buckets(db, user_id, timestamps, values)
+        trend = float(ewma(values)[-1]) if values else None
+        if _seed_summary(db, summary_ref, trend, before.update_time if before.exists else None):
+            break
+    return len(values)
@@ -0,0 +1,154 @@
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+from utils import metrics
+from utils.lazy import PerProcess
+
+# Threads shared by all requests in a worker for running chat pipeline stages
+PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', '8'))
+# Threads per worker for fan_out tasks; kept apart from the stage threads so
+# tasks that overrun their time limit can't starve the chat pipeline
+FAN_OUT_MAX_WORKERS = int(os.getenv('FAN_OUT_MAX_WORKERS', '16'))
+
+# Threads do not survive fork, so each worker process creates its own pools
+_executor = PerProcess(lambda: ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix='pipeline'))
+_fan_out_executor = PerProcess(lambda: ThreadPoolExecutor(max_workers=FAN_OUT_MAX_WORKERS, thread_name_prefix='fan-out'))
+
+
+def get_executor():
+    """
+    Return this worker process's bounded stage executor
+    """
+    return _executor.get()
+
+
+def get_fan_out_executor():
+    """
+    Return this worker process's bounded executor for fan_out tasks
+    """
+    return _fan_out_executor.get()
+
+
+def _submit(executor, name, stage, fn, args):
+    # Stages run in the caller's context, so they add to its request timings
+    return executor.submit(contextvars.copy_context().run, _timed, name, stage, fn, args)
+
+
+def _timed(name, stage, fn, args):
+    started = time.monotonic()
+    try:
+        return fn(*args)
+    finally:
+        metrics.histogram(f'{name}.{stage}_ms').observe((time.monotonic() - started) * 1000.0)
+
+
+class StageGraph:
+    """
+    Runs a small graph of dependent stages, each as soon as its inputs are ready
+
+    Every stage is called with the results of its dependencies as positional
+    arguments, in the order they were listed. Stages with no pending
+    dependencies run concurrently on the shared executor, so a graph takes
+    roughly as long as its longest path rather than the sum of its stages.
+
+    Args:
+        name (str): Prefix for the per-stage latency histograms
+    """
+
+    def __init__(self, name='pipeline'):
+        self.name = name
+        self._stages = {}
+
+    def add(self, stage, fn, *deps):
+        """
+        Register a stage
+
+        Args:
+            stage (str): Name of the stage, used to look up its result
+            fn (callable): Called with the results of deps
+            deps (str): Names of previously added stages this one needs
+        """
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {stage!r} depends on unknown stage {dep!r}")
+        self._stages[stage] = (fn, deps)
+        return self
+
+    def run(self):
+        """
+        Run every stage and return their results
+
+        Returns:
+            dict: Stage name to result
+
+        Raises:
+            Exception: The first exception raised by a stage; stages that
+                depend on it are not started
+        """
+        executor = get_executor()
+        results = {}
+        pending = dict(self._stages)
+        running = {}
+
+        while pending or running:
+            for stage, (fn, deps) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    args = [results[dep] for dep in deps]
+                    running[_submit(executor, self.name, stage, fn, args)] = stage
+                    del pending[stage]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    # Let stages already in flight finish before surfacing the error
+                    wait(running)
+                    raise error
+                results[stage] = future.result()
+
+        return results
+
+
+def fan_out(name, tasks, timeout):
+    """
+    Run independent tasks concurrently, each with its own time limit
+
+    Unlike StageGraph, a failing or slow task doesn't fail the others: its
+    result is left out and the reason reported instead. Tasks run on their own
+    executor, not the StageGraph one. A task still queued when its time is up
+    is cancelled; one that already started keeps running in the background,
+    but nobody waits for it.
+
+    Args:
+        name (str): Prefix for the per-task latency histograms and counters
+        tasks (dict): Task name to a callable taking no arguments
+        timeout (float): Seconds each task may take, counted from submission
+
+    Returns:
+        tuple: (dict of task name to result, dict of task name to 'timeout' or 'error')
+    """
+    executor = get_fan_out_executor()
+    deadline = time.monotonic() + timeout
+    futures = {
+        task: _submit(executor, name, task, fn, ())
+        for task, fn in tasks.items()
+    }
+
+    results = {}
+    errors = {}
+    for task, future in futures.items():
+        try:
+            results[task] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Frees the slot if the task never got a thread
+            future.cancel()
+            errors[task] = 'timeout'
+            metrics.counter(f'{name}.{task}.timeouts').inc()
+        except Exception as e:
+            errors[task] = 'error'
+            metrics.counter(f'{name}.{task}.errors').inc()
+            print(f"Error in {name} task {task}: {str(e)}")
+    return results, errors
@@ -0,0 +1,171 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from utils import metrics
+from utils.static_files import IMMUTABLE_CACHE_CONTROL
+
+# Square sizes, in pixels, each uploaded profile image is stored at
+PROFILE_IMAGE_SIZES = tuple(int(size) for size in os.getenv('PROFILE_IMAGE_SIZES', '64,256,512').split(','))
+# Size used for the profile's photoURL (the header avatar and profile page)
+PROFILE_IMAGE_DEFAULT_SIZE = int(os.getenv('PROFILE_IMAGE_DEFAULT_SIZE', '256'))
+PROFILE_IMAGE_QUALITY = int(os.getenv('PROFILE_IMAGE_QUALITY', '80'))
+# Uploads larger than this (in pixels) are rejected before decoding
+PROFILE_IMAGE_MAX_PIXELS = int(os.getenv('PROFILE_IMAGE_MAX_PIXELS', '40000000'))
+
+# Bytes read from the upload stream at a time
+CHUNK_SIZE = 64 * 1024
+# Hex digits of the content hash used in file names
+HASH_LENGTH = 16
+
+if features.check('webp'):
+    IMAGE_FORMAT, IMAGE_EXTENSION, IMAGE_CONTENT_TYPE = 'WEBP', 'webp', 'image/webp'
+else:
+    IMAGE_FORMAT, IMAGE_EXTENSION, IMAGE_CONTENT_TYPE = 'JPEG', 'jpg', 'image/jpeg'
+
+Image.MAX_IMAGE_PIXELS = PROFILE_IMAGE_MAX_PIXELS
+
+
+class InvalidImageError(ValueError):
+    """
+    Raised when an upload can't be decoded as an image
+    """
+
+
+def variant_name(content_hash, size):
+    return f'{content_hash}-{size}.{IMAGE_EXTENSION}'
+
+
+def _spool(stream):
+    # Copy the upload to a temporary file in chunks, hashing it on the way,
+    # so the raw bytes are never held in memory as a whole
+    hasher = hashlib.sha256()
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled, hasher.hexdigest()[:HASH_LENGTH]
+
+
+def _encode(image, size):
+    variant = ImageOps.fit(image, (size, size), method=Image.LANCZOS)
+    buffer = io.BytesIO()
+    if IMAGE_FORMAT == 'WEBP':
+        variant.save(buffer, IMAGE_FORMAT, quality=PROFILE_IMAGE_QUALITY, method=4)
+    else:
+        variant.save(buffer, IMAGE_FORMAT, quality=PROFILE_IMAGE_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_variants(spooled):
+    """
+    Decode an uploaded image and encode it at every PROFILE_IMAGE_SIZES size
+
+    Returns:
+        dict: Size to encoded bytes
+
+    Raises:
+        InvalidImageError: If the upload isn't a decodable image
+    """
+    try:
+        with Image.open(spooled) as image:
+            # JPEG can decode straight at a reduced scale, which is much faster
+            # for camera photos than decoding full size and shrinking
+            image.draft('RGB', (max(PROFILE_IMAGE_SIZES),) * 2)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') and IMAGE_FORMAT == 'WEBP' else 'RGB')
+            return {size: _encode(image, size) for size in PROFILE_IMAGE_SIZES}
+    except Image.DecompressionBombError:
+        raise InvalidImageError('Image dimensions are too large')
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise InvalidImageError('Uploaded file is not a valid image')
+
+
+def store_profile_image(stream, storage, prefix):
+    """
+    Store an uploaded profile image as resized variants named by content hash
+
+    An upload identical to one already stored for the user is not decoded
+    again; its existing variants are reused.
+
+    Args:
+        stream: Readable binary stream of the upload
+        storage: Upload storage backend (utils.storage)
+        prefix (str): The user's key prefix, ending in '/'
+
+    Returns:
+        tuple: (content hash, dict of size to object key)
+
+    Raises:
+        InvalidImageError: If the upload isn't a decodable image
+    """
+    spooled, content_hash = _spool(stream)
+    keys = {size: prefix + variant_name(content_hash, size) for size in PROFILE_IMAGE_SIZES}
+
+    with spooled:
+        if all(storage.exists(key) for key in keys.values()):
+            metrics.counter('profile_images.deduplicated').inc()
+            return content_hash, keys
+
+        for size, data in render_variants(spooled).items():
+            storage.put(keys[size], data, content_type=IMAGE_CONTENT_TYPE, cache_control=IMMUTABLE_CACHE_CONTROL)
+            metrics.counter('profile_images.bytes_written').inc(len(data))
+
+    metrics.counter('profile_images.stored').inc()
+    return content_hash, keys
+
+
+def referenced_keys(profile, prefix):
+    """
+    Return the keys under prefix that a profile's photoURL and photoVariants point at
+
+    Args:
+        profile (dict): The user's profile document, possibly empty
+        prefix (str): The user's key prefix, ending in '/'
+    """
+    urls = [profile.get('photoURL')] + list((profile.get('photoVariants') or {}).values())
+    keys = set()
+    for url in urls:
+        # Uploads are served from <SERVER_BASE_URL>/uploads/<key>
+        if isinstance(url, str) and '/uploads/' in url:
+            key = url.split('/uploads/', 1)[1]
+            if key.startswith(prefix):
+                keys.add(key)
+    return keys
+
+
+def collect_garbage(storage, prefix, previous, keep_hash):
+    """
+    Delete the images a profile update replaced, including pre-variant uploads
+
+    Only what the previous profile pointed at is removed, never every other
+    file under the prefix: another upload for the same user may have stored
+    its variants and not yet written them to the profile.
+
+    Args:
+        storage: Upload storage backend (utils.storage)
+        prefix (str): The user's key prefix, ending in '/'
+        previous (dict): The profile as it was just before the update
+        keep_hash (str): Content hash the update stored
+
+    Returns:
+        int: Number of objects removed
+    """
+    removed = 0
+    for key in referenced_keys(previous, prefix):
+        if key[len(prefix):].startswith(f'{keep_hash}-'):
+            continue
+        try:
+            storage.delete(key)
+            removed += 1
+        except Exception as e:
+            print(f"Error removing old profile image {key}: {str(e)}")
+    metrics.counter('profile_images.collected').inc(removed)
+    return removed
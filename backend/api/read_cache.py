@@ -0,0 +1,87 @@
+import os
+import uuid
+
+from utils import metrics
+from utils.cache import make_cache
+
+READ_CACHE_SIZE = int(os.getenv('READ_CACHE_SIZE', '4096'))
+READ_CACHE_TTL = float(os.getenv('READ_CACHE_TTL', '300'))
+
+
+def default_backend():
+    """
+    Return the configured read cache backend
+
+    'memory' keeps one cache per worker, 'sqlite' one shared by the workers on
+    a host. Without READ_CACHE_BACKEND, sqlite is used when WEB_CONCURRENCY
+    (read by gunicorn and uvicorn) asks for more than one worker: a write
+    served by one worker only invalidates that worker's in-process cache, so
+    the others would keep serving stale reads until the TTL runs out.
+    """
+    backend = os.getenv('READ_CACHE_BACKEND')
+    if backend:
+        return backend
+    return 'sqlite' if int(os.getenv('WEB_CONCURRENCY', '1')) > 1 else 'memory'
+
+
+READ_CACHE_BACKEND = default_backend()
+
+# Resources cached per user; a write names the ones it changes
+RESOURCES = ('moods', 'journals', 'goals', 'conversations', 'profile', 'stats')
+
+read_cache = make_cache(
+    'reads',
+    maxsize=READ_CACHE_SIZE,
+    ttl=READ_CACHE_TTL,
+    backend=READ_CACHE_BACKEND
+)
+
+
+def _generation(user_id, resource):
+    # Every cached read of a resource is keyed by the resource's current
+    # generation, so invalidating all of its pages and projections at once is
+    # a single write. A missing generation starts a fresh one, which also
+    # covers an evicted generation entry.
+    key = f'gen/{user_id}/{resource}'
+    generation = read_cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        read_cache.set(key, generation, ttl=READ_CACHE_TTL * 2)
+    return generation
+
+
+def get_or_load(user_id, resource, key, load):
+    """
+    Return a cached read of one of the user's resources, loading it on a miss
+
+    Args:
+        user_id (str): Owner of the data
+        resource (str): One of RESOURCES
+        key (str): What distinguishes this read, e.g. the request path and query
+        load (callable): Called with no arguments on a miss; its result must be
+            JSON-serializable so it can be stored in the SQLite backend
+
+    Returns:
+        The cached or freshly loaded value
+    """
+    cache_key = f'{user_id}/{resource}/{_generation(user_id, resource)}/{key}'
+    value = read_cache.get(cache_key)
+    if value is not None:
+        metrics.counter(f'read_cache.{resource}.hits').inc()
+        return value
+
+    metrics.counter(f'read_cache.{resource}.misses').inc()
+    value = load()
+    read_cache.set(cache_key, value)
+    return value
+
+
+def invalidate(user_id, *resources):
+    """
+    Drop every cached read of the given resources for a user
+
+    Call after the write is committed, so a concurrent read can't cache the
+    old data under the new generation.
+    """
+    for resource in resources:
+        read_cache.set(f'gen/{user_id}/{resource}', uuid.uuid4().hex, ttl=READ_CACHE_TTL * 2)
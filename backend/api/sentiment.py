@@ -1,8 +1,17 @@
 import os
-import requests
+import asyncio
+import copy
+import hashlib
+import threading
+import unicodedata
 import numpy as np
 from dotenv import load_dotenv
 
+from api.batching import MicroBatcher
+from utils.cache import make_cache
+from utils import http_client, async_http_client
+from utils.timing import timed
+
 # Load environment variables
 load_dotenv()
 
@@ -27,10 +36,101 @@ EMOTION_SENTIMENT_MAP = {
 
 HF_API_KEY = os.getenv('HUGGINGFACE_API_KEY')
 MODEL_NAME = 'SamLowe/roberta-base-go_emotions'
+HF_API_URL = os.getenv('HUGGINGFACE_API_URL', 'https://api-inference.huggingface.co/models')
+
+# Which engine scores messages: 'remote' (Hugging Face Inference API),
+# 'local' (in-process ONNX model) or 'fallback' (keyword matcher only)
+SENTIMENT_BACKEND = os.getenv('SENTIMENT_BACKEND', 'remote').lower()
+
+# Micro-batching of concurrent analyze_sentiment calls (worth enabling with
+# threaded workers, where several requests are in flight per process)
+SENTIMENT_BATCHING = os.getenv('SENTIMENT_BATCHING', 'false').lower() == 'true'
+SENTIMENT_BATCH_MAX_SIZE = int(os.getenv('SENTIMENT_BATCH_MAX_SIZE', '16'))
+SENTIMENT_BATCH_MAX_WAIT_MS = float(os.getenv('SENTIMENT_BATCH_MAX_WAIT_MS', '10'))
+SENTIMENT_BATCH_TIMEOUT = float(os.getenv('SENTIMENT_BATCH_TIMEOUT', '30'))
+
+# Cache of model results keyed by normalized text; 'sqlite' shares it across workers
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', '4096'))
+SENTIMENT_CACHE_TTL = float(os.getenv('SENTIMENT_CACHE_TTL', '86400'))
+SENTIMENT_CACHE_BACKEND = os.getenv('SENTIMENT_CACHE_BACKEND', 'memory')
+
+FALLBACK_NOTE = 'Fallback sentiment analysis used'
 
-def analyze_sentiment(text):
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+sentiment_cache = make_cache(
+    'sentiment',
+    maxsize=SENTIMENT_CACHE_SIZE,
+    ttl=SENTIMENT_CACHE_TTL,
+    backend=SENTIMENT_CACHE_BACKEND
+)
+
+def analyze_sentiment(text, backend=None):
     """
-    Analyze text using Hugging Face Inference API
+    Analyze text with the configured sentiment backend
+
+    Args:
+        text (str): The text to analyze
+        backend (str): Override for SENTIMENT_BACKEND
+
+    Returns:
+        dict: sentiment_score, emotion, emotions and confidence
+    """
+    backend = (backend or SENTIMENT_BACKEND).lower()
+
+    if backend == 'fallback':
+        return fallback_sentiment_analysis(text)
+
+    key = cache_key(text, backend)
+    cached = sentiment_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    with timed('model'):
+        if SENTIMENT_BATCHING:
+            try:
+                result = get_batcher(backend).submit(text).result(timeout=SENTIMENT_BATCH_TIMEOUT)
+            except Exception as e:
+                print(f"Error in batched sentiment analysis: {str(e)}")
+                return fallback_sentiment_analysis(text)
+        else:
+            result = analyze_sentiment_batch([text], backend)[0]
+
+    # Never cache the keyword matcher's answer as if the model had produced it
+    if not is_fallback_result(result):
+        sentiment_cache.set(key, copy.deepcopy(result))
+    return result
+
+async def analyze_sentiment_async(text, backend=None):
+    """
+    Async variant of analyze_sentiment for the ASGI serving mode
+
+    The remote backend awaits the Hugging Face API on the event loop; the
+    local model is CPU-bound, so it runs in a worker thread.
+    """
+    backend = (backend or SENTIMENT_BACKEND).lower()
+
+    if backend == 'fallback':
+        return fallback_sentiment_analysis(text)
+
+    key = cache_key(text, backend)
+    cached = sentiment_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    if backend == 'remote':
+        result = await analyze_remote_async(text)
+    else:
+        result = await asyncio.to_thread(analyze_sentiment, text, backend)
+
+    if not is_fallback_result(result):
+        sentiment_cache.set(key, copy.deepcopy(result))
+    return result
+
+async def analyze_remote_async(text):
+    """
+    Analyze text using Hugging Face Inference API without blocking the event loop
     """
     headers = {
         'Authorization': f'Bearer {HF_API_KEY}',
@@ -38,23 +138,115 @@ def analyze_sentiment(text):
     }
     
     payload = {
-        'inputs': text,
+        'inputs': [text],
         'parameters': {'truncation': True}
     }
     
     try:
-        response = requests.post(
-            f'https://api-inference.huggingface.co/models/{MODEL_NAME}',
+        response = await async_http_client.post(
+            f'{HF_API_URL}/{MODEL_NAME}',
+            'huggingface',
             headers=headers,
             json=payload
         )
-        response.raise_for_status()
-        return process_api_response(response.json())
+        return process_api_response(response.json(), text)
     except Exception as e:
         print(f"Error calling Hugging Face API: {str(e)}")
         return fallback_sentiment_analysis(text)
 
-def process_api_response(api_response):
+def cache_key(text, backend):
+    """
+    Build the content-addressed cache key for a text scored by a backend
+    """
+    normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+    model = MODEL_NAME if backend == 'remote' else f'{backend}:{MODEL_NAME}'
+    return hashlib.sha256(f'{model}\0{normalized}'.encode('utf-8')).hexdigest()
+
+def is_fallback_result(result):
+    """
+    Check whether a sentiment dict came from fallback_sentiment_analysis
+    """
+    return result.get('note') == FALLBACK_NOTE
+
+def analyze_sentiment_batch(texts, backend=None):
+    """
+    Analyze several texts with one model invocation
+
+    Args:
+        texts (list): The texts to analyze
+        backend (str): Override for SENTIMENT_BACKEND
+
+    Returns:
+        list: One sentiment dict per text, in the same order
+    """
+    backend = (backend or SENTIMENT_BACKEND).lower()
+
+    if backend == 'local':
+        return analyze_batch_local(texts)
+    if backend == 'fallback':
+        return [fallback_sentiment_analysis(text) for text in texts]
+    return analyze_batch_remote(texts)
+
+def get_batcher(backend):
+    """
+    Return the micro-batcher feeding the given backend, creating it on first use
+    """
+    batcher = _batchers.get(backend)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(backend)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    lambda texts: analyze_sentiment_batch(texts, backend),
+                    max_batch_size=SENTIMENT_BATCH_MAX_SIZE,
+                    max_wait_ms=SENTIMENT_BATCH_MAX_WAIT_MS,
+                    name=f'sentiment.{backend}'
+                )
+                _batchers[backend] = batcher
+    return batcher
+
+def analyze_batch_remote(texts):
+    """
+    Analyze texts using Hugging Face Inference API
+    """
+    headers = {
+        'Authorization': f'Bearer {HF_API_KEY}',
+        'Content-Type': 'application/json'
+    }
+    
+    payload = {
+        'inputs': list(texts),
+        'parameters': {'truncation': True}
+    }
+    
+    try:
+        response = http_client.post(
+            f'{HF_API_URL}/{MODEL_NAME}',
+            'huggingface',
+            headers=headers,
+            json=payload
+        )
+        rows = response.json()
+        if not isinstance(rows, list) or len(rows) != len(texts):
+            raise ValueError(f"Expected {len(texts)} results, got {type(rows).__name__}")
+        return [process_api_response([row], text) for row, text in zip(rows, texts)]
+    except Exception as e:
+        print(f"Error calling Hugging Face API: {str(e)}")
+        return [fallback_sentiment_analysis(text) for text in texts]
+
+def analyze_batch_local(texts):
+    """
+    Analyze texts using the in-process ONNX go_emotions model
+    """
+    try:
+        from api.emotion_classifier import get_local_classifier
+        rows = get_local_classifier(EMOTIONS).classify(texts)
+        return [process_api_response([row], text) for row, text in zip(rows, texts)]
+    except Exception as e:
+        print(f"Error running local emotion classifier: {str(e)}")
+        return [fallback_sentiment_analysis(text) for text in texts]
+
+def process_api_response(api_response, text=''):
     """
     Process raw API response into standardized format
     """
@@ -154,5 +346,5 @@ def fallback_sentiment_analysis(text):
         'emotion': emotion,
         'emotions': emotions_dict,
         'confidence': confidence,
-        'note': 'Fallback sentiment analysis used'
+        'note': FALLBACK_NOTE
     }
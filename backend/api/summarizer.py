@@ -0,0 +1,113 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api.groq_api import summarize_conversation
+from api.history_window import HISTORY_FETCH_LIMIT
+from utils import metrics
+
+# Fold older turns into the conversation summary once this many turns are unsummarized
+SUMMARY_EVERY_TURNS = int(os.getenv('SUMMARY_EVERY_TURNS', '10'))
+# Newest messages always left out of the summary and sent verbatim
+SUMMARY_KEEP_RECENT = int(os.getenv('SUMMARY_KEEP_RECENT', '6'))
+# Most messages folded into the summary per Groq call
+SUMMARY_CHUNK = int(os.getenv('SUMMARY_CHUNK', '40'))
+
+_executor = None
+_executor_pid = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    # Threads do not survive fork, so create one executor per worker process
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summarizer')
+            _executor_pid = os.getpid()
+            _pending.clear()
+        return _executor
+
+
+def needs_summary(unsummarized):
+    """
+    Whether a conversation with this many unsummarized messages should be summarized
+
+    Callers count the messages they loaded, at most HISTORY_FETCH_LIMIT, so the
+    threshold is capped there; settings above the cap would otherwise never
+    trigger a summary.
+    """
+    return unsummarized >= min(2 * SUMMARY_EVERY_TURNS + SUMMARY_KEEP_RECENT, HISTORY_FETCH_LIMIT)
+
+
+def schedule_summary(db, user_id, conversation_id):
+    """
+    Queue a background summary refresh, unless one is already queued for the conversation
+    """
+    executor = _get_executor()
+    key = (user_id, conversation_id)
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    executor.submit(_run, db, key)
+
+
+def _run(db, key):
+    try:
+        summarize(db, *key)
+    except Exception as e:
+        metrics.counter('summary.errors').inc()
+        print(f"Error summarizing conversation {key[1]}: {str(e)}")
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def summarize(db, user_id, conversation_id):
+    """
+    Fold all but the newest messages of a conversation into its running summary
+
+    The summary and the timestamp of the last message it covers are stored on
+    the conversation document as 'summary' and 'summary_until'.
+
+    Returns:
+        int: Number of messages folded into the summary
+    """
+    conversation_ref = db.collection('conversations').document(user_id).collection('chats').document(conversation_id)
+    data = conversation_ref.get().to_dict() or {}
+    summary = data.get('summary')
+    summary_until = data.get('summary_until')
+
+    query = conversation_ref.collection('messages')
+    if summary_until is not None:
+        query = query.where('timestamp', '>', summary_until)
+    messages = [msg.to_dict() for msg in query.order_by('timestamp').stream()]
+    to_fold = messages[:-SUMMARY_KEEP_RECENT] if SUMMARY_KEEP_RECENT else messages
+
+    folded = 0
+    for start in range(0, len(to_fold), SUMMARY_CHUNK):
+        chunk = to_fold[start:start + SUMMARY_CHUNK]
+        updated = summarize_conversation(summary, [
+            {
+                'role': 'user' if msg.get('sender') == 'user' else 'assistant',
+                'content': msg.get('content', '')
+            }
+            for msg in chunk
+        ])
+        if updated is None:
+            # Keep whatever was folded so far; the next trigger retries the rest
+            break
+        summary = updated
+        summary_until = chunk[-1].get('timestamp')
+        folded += len(chunk)
+
+    if folded:
+        conversation_ref.update({
+            'summary': summary,
+            'summary_until': summary_until
+        })
+        metrics.counter('summary.messages_folded').inc(folded)
+    return folded
@@ -0,0 +1,164 @@
+import os
+
+from utils.lazy import LazyModule
+from utils.timing import timed
+
+firestore = LazyModule('firebase_admin.firestore')
+
+# Keep a per-user summary document up to date on every write, so
+# /api/user/stats is a single document read
+USER_STATS_SUMMARY = os.getenv('USER_STATS_SUMMARY', 'false').lower() == 'true'
+
+STATS_COLLECTION = 'user_stats'
+# Aggregations to try before giving up on seeding during a burst of writes
+SEED_ATTEMPTS = 3
+
+def stats_document(db, user_id):
+    """
+    Reference a user's stats summary document
+    """
+    return db.collection(STATS_COLLECTION).document(user_id)
+
+
+def mood_increments(mood):
+    """
+    Counter increments for recording one mood entry
+
+    Like Firestore's sum aggregation, only numeric moods count towards the average.
+    """
+    increments = {'moodCount': 1}
+    if isinstance(mood, (int, float)) and not isinstance(mood, bool):
+        increments['moodSum'] = mood
+        increments['moodScoredCount'] = 1
+    return increments
+
+
+def add_increments(batch, stats_ref, **increments):
+    """
+    Add counter increments to a write batch or transaction
+
+    Does nothing unless USER_STATS_SUMMARY is enabled. Committing the
+    increments with the write they count keeps the summary exact once it is
+    seeded; before that get_stats recomputes it.
+    """
+    if not USER_STATS_SUMMARY or not increments:
+        return
+    update = {field: firestore.Increment(amount) for field, amount in increments.items()}
+    update['updated_at'] = firestore.SERVER_TIMESTAMP
+    batch.set(stats_ref, update, merge=True)
+
+
+def format_stats(counters):
+    """
+    Build the /api/user/stats response from counter values
+    """
+    scored = counters.get('moodScoredCount') or 0
+    return {
+        'conversationCount': int(counters.get('conversationCount') or 0),
+        'journalCount': int(counters.get('journalCount') or 0),
+        'moodCount': int(counters.get('moodCount') or 0),
+        'goalCount': int(counters.get('goalCount') or 0),
+        'completedGoalCount': int(counters.get('completedGoalCount') or 0),
+        'averageMood': round(counters.get('moodSum', 0) / scored, 1) if scored else None
+    }
+
+
+def _aggregate(query, **aggregations):
+    # Run one aggregation query and return {alias: value}
+    aggregation_query = None
+    for alias, (kind, field) in aggregations.items():
+        source = aggregation_query or query
+        if kind == 'count':
+            aggregation_query = source.count(alias=alias)
+        else:
+            aggregation_query = getattr(source, kind)(field, alias=alias)
+
+    values = {}
+    for row in aggregation_query.get():
+        for result in row:
+            values[result.alias] = result.value
+    return values
+
+
+def aggregate_counters(db, user_id):
+    """
+    Compute a user's counters with server-side aggregation queries
+
+    Aggregations are billed per 1000 index entries scanned and return one
+    row, instead of streaming every document to the worker.
+    """
+    goals_ref = db.collection('goals').document(user_id).collection('items')
+    moods_ref = db.collection('moods').document(user_id).collection('entries')
+
+    counters = {}
+    counters.update(_aggregate(
+        db.collection('conversations').document(user_id).collection('chats'),
+        conversationCount=('count', None)
+    ))
+    counters.update(_aggregate(
+        db.collection('journals').document(user_id).collection('entries'),
+        journalCount=('count', None)
+    ))
+    counters.update(_aggregate(goals_ref, goalCount=('count', None)))
+    counters.update(_aggregate(goals_ref.where('completed', '==', True), completedGoalCount=('count', None)))
+    counters.update(_aggregate(moods_ref, moodCount=('count', None)))
+    # The range filter only matches entries whose mood is a number
+    counters.update(_aggregate(
+        moods_ref.where('mood', '>=', float('-inf')),
+        moodScoredCount=('count', None),
+        moodSum=('sum', 'mood')
+    ))
+    return counters
+
+
+def get_stats(db, user_id):
+    """
+    Return a user's activity statistics
+
+    With USER_STATS_SUMMARY enabled this reads the summary document, seeding
+    it from aggregation queries until it is marked as seeded; otherwise the
+    aggregation queries are run on every call.
+    """
+    with timed('firestore'):
+        if not USER_STATS_SUMMARY:
+            return format_stats(aggregate_counters(db, user_id))
+
+        stats_ref = stats_document(db, user_id)
+        for _ in range(SEED_ATTEMPTS):
+            snapshot = stats_ref.get()
+            summary = snapshot.to_dict() if snapshot.exists else None
+            if summary and summary.get('seeded'):
+                return format_stats(summary)
+
+            counters = aggregate_counters(db, user_id)
+            if seed_summary(db, stats_ref, counters, snapshot.update_time if snapshot.exists else None):
+                return format_stats(counters)
+
+        # Writes kept landing while seeding; the aggregation is still current
+        return format_stats(counters)
+
+
+def seed_summary(db, stats_ref, counters, update_time):
+    """
+    Replace an unseeded summary with counters from aggregation queries
+
+    Writes made before the first stats read leave a document holding only
+    their increments. The aggregation already counts those, so it replaces
+    the document, but only if nothing was written since update_time (the
+    document's update time when the aggregation started): a later write
+    isn't in the aggregation and would be lost.
+
+    Returns:
+        bool: Whether the summary is now seeded
+    """
+    @firestore.transactional
+    def seed(transaction):
+        current = stats_ref.get(transaction=transaction)
+        if current.exists and (current.to_dict() or {}).get('seeded'):
+            return True
+        if (current.update_time if current.exists else None) != update_time:
+            return False
+        transaction.set(stats_ref, dict(counters, seeded=True, updated_at=firestore.SERVER_TIMESTAMP))
+        return True
+
+    return seed(db.transaction())
@@ -1,39 +1,68 @@
+import hmac
 import os
 import sys
 import logging
 import time
-import uuid
-from flask import Flask, request, jsonify, send_from_directory
+import json
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
-from google.cloud import storage
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 # Add the current directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from api.sentiment import analyze_sentiment
-from api.groq_api import generate_response
-from utils.auth import verify_firebase_token
+from api.chat_turns import load_conversation_history, save_chat_turn
+from api.groq_api import StreamInterruptedError, generate_response, generate_response_stream
+from api.pipeline import StageGraph
+from api.summarizer import needs_summary, schedule_summary
+from api import read_cache
+from api.dashboard import load_dashboard
+from api.user_stats import add_increments, get_stats, mood_increments, stats_document
+from models.records import Conversation, Goal, JournalEntry, Message, MoodEntry, serialize
+from models.serialization import json_response
+from utils.clients import db, get_firebase_app, storage_client
+from utils.compression import compress_response
+from utils.lazy import LazyModule, PerProcess
+from utils.static_files import configure_offload, send_stored, send_upload
+from utils.storage import LocalStorage, make_storage
+from utils.http_cache import is_fresh, not_modified, page_etag, value_etag, with_etag
+from utils import metrics
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, PaginationError, fetch_page, parse_fields
+from utils import request_context
+from utils.request_context import authenticated
+from utils.timing import timed
+
+# Slow to import (the Firestore and Auth SDKs, numpy, Pillow); loaded by the
+# first request that needs them, or up front by warm_up()
+firestore = LazyModule('firebase_admin.firestore')
+auth = LazyModule('firebase_admin.auth')
+sentiment_api = LazyModule('api.sentiment')
+mood_analytics = LazyModule('api.mood_analytics')
+profile_images = LazyModule('api.profile_images')
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000"]}}, supports_credentials=True)
+# Import heavy modules in create_app() instead of on first use; set together
+# with gunicorn --preload so forked workers start with them already loaded
+APP_PRELOAD = os.getenv('APP_PRELOAD', 'false').lower() == 'true'
+
+# Bearer token required by /api/metrics; the endpoint is off (404) while unset
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+routes = Blueprint('routes', __name__)
 
 # Handle CORS pre-flight requests
-@app.before_request
+@routes.before_app_request
 def handle_preflight():
     if request.method == "OPTIONS":
-        response = app.make_default_options_response()
+        response = current_app.make_default_options_response()
         response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
         response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
@@ -41,7 +70,7 @@ def handle_preflight():
         return response
 
 # Handle any errors with CORS headers
-@app.errorhandler(Exception)
+@routes.app_errorhandler(Exception)
 def handle_error(e):
     response = jsonify({"error": str(e)})
     response.status_code = 500
@@ -51,58 +80,51 @@ def handle_error(e):
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     return response
 
-# Create uploads directory if it doesn't exist
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'profile_images')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB limit
-
-# Initialize Firebase Admin SDK
-cred_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-if not os.path.exists(cred_path):
-    print(f"Warning: Firebase credentials file not found at {cred_path}. Some features may not work properly.")
-    # Initialize Firebase app with default config for testing
-    try:
-        firebase_admin.initialize_app()
-    except ValueError:
-        # App already initialized
-        pass
-else:
-    cred = credentials.Certificate(cred_path)
-    try:
-        default_app = firebase_admin.initialize_app(cred)
-    except ValueError:
-        # App already initialized
-        default_app = firebase_admin.get_app()
-        pass
-
-# Get Firebase project details from environment if available
-firebase_storage_bucket = os.getenv('VITE_FIREBASE_STORAGE_BUCKET')
-firebase_project_id = os.getenv('VITE_FIREBASE_PROJECT_ID')
 
-logger.info(f"Firebase Storage Bucket from ENV: {firebase_storage_bucket}")
-logger.info(f"Firebase Project ID from ENV: {firebase_project_id}")
-
-# Initialize Firestore client    
-db = firestore.client()
-
-# Initialize Storage client
-try:
-    if os.path.exists(cred_path):
-        storage_client = storage.Client.from_service_account_json(cred_path)
-        logger.info(f"Storage client initialized with project: {storage_client.project}")
-    else:
-        storage_client = None
-        logger.warning("Firebase credentials file not found. Storage client not initialized. File uploads will not work.")
-except Exception as e:
-    storage_client = None
-    logger.error(f"Error initializing storage client: {str(e)}", exc_info=True)
-    logger.warning("File uploads will not work due to storage client initialization failure.")
+# Storage for uploaded files: the local uploads directory or a GCS bucket
+upload_storage = PerProcess(lambda: make_storage(os.path.dirname(UPLOAD_FOLDER), storage_client.get))
 
 # Base URL for the server
 SERVER_BASE_URL = os.getenv('SERVER_BASE_URL', 'http://localhost:5000')
 
-@app.route('/', methods=['GET'])
+def warm_up():
+    """
+    Import the lazily loaded modules now instead of on first use
+    
+    Only imports code: Firebase, Firestore and Storage clients are still
+    created per worker on first use, so this is safe before forking.
+    """
+    for module in (firestore, auth, sentiment_api, mood_analytics, profile_images):
+        module.load()
+
+def create_app():
+    """
+    Create and configure the Flask application
+    
+    Cheap by design: no Firebase initialization, network clients or model
+    imports happen here (unless APP_PRELOAD is set), so a cold start can
+    serve its first request sooner.
+    """
+    app = Flask(__name__)
+    CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000"]}}, supports_credentials=True, expose_headers=[NEXT_CURSOR_HEADER, 'ETag', 'Server-Timing'])
+    # Installed first so its after_request hook runs last, with compression included in the total
+    request_context.install(app)
+    app.after_request(compress_response)
+    
+    # Create uploads directory if it doesn't exist
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB limit
+    configure_offload(app)
+    
+    app.register_blueprint(routes)
+    
+    if APP_PRELOAD:
+        warm_up()
+    return app
+
+@routes.route('/', methods=['GET'])
 def index():
     """
     Test endpoint to check if the API is working
@@ -112,7 +134,24 @@ def index():
         'message': 'Mental Wellness API is running'
     })
 
-@app.route('/api/test_sentiment', methods=['POST'])
+@routes.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Endpoint to expose in-process performance metrics for this worker
+    
+    Only served when METRICS_TOKEN is set, to requests presenting it as a
+    bearer token.
+    """
+    if not METRICS_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    
+    auth_header = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(auth_header.encode('utf-8'), f'Bearer {METRICS_TOKEN}'.encode('utf-8')):
+        return jsonify({'error': 'Invalid metrics token'}), 401
+    
+    return jsonify(metrics.snapshot())
+
+@routes.route('/api/test_sentiment', methods=['POST'])
 def test_sentiment():
     """
     Test endpoint to analyze sentiment without authentication
@@ -122,14 +161,14 @@ def test_sentiment():
         return jsonify({'error': 'No message provided'}), 400
     
     message = data['message']
-    result = analyze_sentiment(message)
+    result = sentiment_api.analyze_sentiment(message)
     
     return jsonify({
         'message': message,
         'sentiment': result
     })
 
-@app.route('/api/test_chat', methods=['POST'])
+@routes.route('/api/test_chat', methods=['POST'])
 def test_chat():
     """
     Test endpoint to generate AI response without authentication
@@ -141,7 +180,7 @@ def test_chat():
     message = data['message']
     
     # Analyze sentiment
-    sentiment = analyze_sentiment(message)
+    sentiment = sentiment_api.analyze_sentiment(message)
     
     # Generate response
     conversation_history = data.get('conversation_history', [])
@@ -153,20 +192,12 @@ def test_chat():
         'response': response
     })
 
-@app.route('/api/analyze_sentiment', methods=['POST'])
-def sentiment_analysis():
+@routes.route('/api/analyze_sentiment', methods=['POST'])
+@authenticated
+def sentiment_analysis(ctx):
     """
     Endpoint to analyze sentiment of user message using BERT model
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get message from request
     data = request.get_json()
     if not data or 'message' not in data:
@@ -176,13 +207,14 @@ def sentiment_analysis():
     
     try:
         # Analyze sentiment
-        sentiment_result = analyze_sentiment(message)
+        sentiment_result = sentiment_api.analyze_sentiment(message)
         return jsonify(sentiment_result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/generate_response', methods=['POST'])
-def generate_response_api():
+@routes.route('/api/generate_response', methods=['POST'])
+@authenticated
+def generate_response_api(ctx):
     try:
         logger.debug("Received request to /api/generate_response")
         # Get request data
@@ -190,181 +222,187 @@ def generate_response_api():
         logger.debug(f"Request data: {data}")
         
         message = data.get('message', '')
-        sentiment = data.get('sentiment', {})
+        sentiment = data.get('sentiment') or {}
         conversation_id = data.get('conversation_id')
         
-        # Get user ID from auth token
-        auth_header = request.headers.get('Authorization')
-        user_id = verify_firebase_token(auth_header)
+        sent_at = datetime.now(timezone.utc)
         
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
+        # History and sentiment are independent; the whole turn is then stored
+        # in a single batch once the reply is ready
+        graph = StageGraph('chat')
+        graph.add('history', lambda: load_conversation_history(db, ctx.user_id, conversation_id))
+        graph.add('sentiment', lambda: sentiment if sentiment.get('emotion') else sentiment_api.analyze_sentiment(message))
+        graph.add('reply', lambda loaded, scored: generate_response(message, scored.get('emotion', 'neutral'), loaded[0], loaded[1]), 'history', 'sentiment')
+        graph.add('save', lambda reply, scored, loaded: save_chat_turn(db, ctx.user_id, conversation_id, message, reply, scored, sent_at, loaded[2]), 'reply', 'sentiment', 'history')
+        results = graph.run()
         
-        # Get conversation history
-        conversation_history = []
-        if conversation_id:
-            try:
-                messages_ref = db.collection('conversations').document(user_id).collection('chats').document(conversation_id).collection('messages').order_by('timestamp').limit(20)
-                messages = messages_ref.stream()
-                
-                for msg in messages:
-                    msg_data = msg.to_dict()
-                    conversation_history.append({
-                        'role': 'user' if msg_data.get('sender') == 'user' else 'assistant',
-                        'content': msg_data.get('content', '')
-                    })
-            except Exception as e:
-                print(f"Error getting conversation history: {str(e)}")
-        
-        # Extract emotion from sentiment
-        emotion = sentiment.get('emotion', 'neutral')
-        
-        # Generate AI response
-        from api.groq_api import generate_response
-        ai_response = generate_response(message, emotion, conversation_history)
-        
-        # Create new conversation if needed
-        if not conversation_id:
-            conversation_ref = db.collection('conversations').document(user_id).collection('chats').document()
-            conversation_ref.set({
-                'title': message[:30] + '...' if len(message) > 30 else message,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'updated_at': firestore.SERVER_TIMESTAMP,
-                'last_message': message
-            })
-            conversation_id = conversation_ref.id
-        else:
-            # Update existing conversation
-            conversation_ref = db.collection('conversations').document(user_id).collection('chats').document(conversation_id)
-            conversation_ref.update({
-                'updated_at': firestore.SERVER_TIMESTAMP,
-                'last_message': message
-            })
-        
-        # Add user message
-        messages_ref = conversation_ref.collection('messages')
-        messages_ref.add({
-            'content': message,
-            'sender': 'user',
-            'timestamp': firestore.SERVER_TIMESTAMP
-        })
-        
-        # Add AI response
-        messages_ref.add({
-            'content': ai_response,
-            'sender': 'ai',
-            'timestamp': firestore.SERVER_TIMESTAMP
-        })
+        # Fold older turns into the summary off the request path
+        if conversation_id and needs_summary(len(results['history'][0]) + 2):
+            schedule_summary(db, ctx.user_id, conversation_id)
         
         return jsonify({
-            'response': ai_response,
-            'conversation_id': conversation_id
+            'response': results['reply'],
+            'conversation_id': results['save']
         }), 200
     
     except Exception as e:
         logger.error(f"Error in generate_response_api: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/conversations', methods=['GET'])
-def get_conversations():
+def sse_event(event, data):
     """
-    Endpoint to get all conversations for a user
+    Format a Server-Sent Event with a JSON payload
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@routes.route('/api/generate_response/stream', methods=['POST'])
+@authenticated
+def generate_response_stream_api(ctx):
+    """
+    Endpoint to stream the AI response as Server-Sent Events
+
+    Emits 'token' events ({"content": ...}) while Groq generates, then a
+    'done' event ({"conversation_id": ...}) once both messages are stored.
+    If Groq fails mid-reply, an 'error' event with "incomplete": true ends
+    the stream and nothing is stored.
+    """
+    data = request.get_json()
+    if not data or 'message' not in data:
+        return jsonify({'error': 'No message provided'}), 400
     
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
+    message = data.get('message', '')
+    sentiment = data.get('sentiment', {})
+    conversation_id = data.get('conversation_id')
     
-    try:
-        # Get all conversations for the user
-        conversations_ref = db.collection('conversations').document(user_id).collection('chats').order_by('updated_at', direction=firestore.Query.DESCENDING)
-        conversations = conversations_ref.stream()
-        
-        result = []
-        for conv in conversations:
-            conv_data = conv.to_dict()
-            result.append({
-                'id': conv.id,
-                'title': conv_data.get('title', 'Untitled Conversation'),
-                'created_at': conv_data.get('created_at'),
-                'updated_at': conv_data.get('updated_at')
-            })
-        
-        return jsonify(result), 200
+    sent_at = datetime.now(timezone.utc)
+    conversation_history, summary, version = load_conversation_history(db, ctx.user_id, conversation_id)
+    emotion = sentiment.get('emotion', 'neutral')
     
+    def event_stream():
+        chunks = []
+        try:
+            for chunk in generate_response_stream(message, emotion, conversation_history, summary):
+                chunks.append(chunk)
+                yield sse_event('token', {'content': chunk})
+            
+            # Persist the assembled reply once the stream has completed
+            saved_id = save_chat_turn(db, ctx.user_id, conversation_id, message, ''.join(chunks), sentiment, sent_at, version)
+            if conversation_id and needs_summary(len(conversation_history) + 2):
+                schedule_summary(db, ctx.user_id, conversation_id)
+            yield sse_event('done', {'conversation_id': saved_id})
+        except StreamInterruptedError as e:
+            # A cut-off reply is not stored, so it never feeds later history
+            logger.warning(f"Groq stream interrupted after {len(chunks)} chunks: {str(e)}")
+            yield sse_event('error', {'error': 'Response interrupted', 'incomplete': True})
+        except Exception as e:
+            logger.error(f"Error in generate_response_stream_api: {str(e)}", exc_info=True)
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx-style proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+CONVERSATION_FIELDS = ('title', 'last_message', 'created_at', 'updated_at')
+JOURNAL_FIELDS = ('title', 'content', 'share_with_ai', 'created_at', 'updated_at')
+GOAL_FIELDS = ('title', 'description', 'target_date', 'completed', 'created_at', 'updated_at')
+
+def page_response(items, next_cursor, etag=None):
+    """
+    Return a page of list items, with the next page's cursor in a response header
+    """
+    response = json_response(items)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if etag:
+        with_etag(response, etag)
+    return response, 200
+
+def cached_page(user_id, resource, record, fetch, fields=None):
+    """
+    Return a page of one of the user's resources, through the per-user read cache
+    
+    Args:
+        resource (str): Read cache resource the page belongs to
+        record (type): Record type the documents are serialized with
+        fetch (callable): Returns (snapshots, next_cursor) on a cache miss
+        fields (list): Response fields to keep; None for all
+    """
+    def load():
+        snapshots, next_cursor = fetch()
+        return {
+            'items': serialize(map(record.from_snapshot, snapshots), fields),
+            'next_cursor': next_cursor,
+            'etag': page_etag(user_id, snapshots, next_cursor)
+        }
+    
+    page = read_cache.get_or_load(user_id, resource, request.full_path, load)
+    if is_fresh(page['etag']):
+        return not_modified(page['etag'])
+    return page_response(page['items'], page['next_cursor'], page['etag'])
+
+@routes.route('/api/conversations', methods=['GET'])
+@authenticated
+def get_conversations(ctx):
+    """
+    Endpoint to get all conversations for a user
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), CONVERSATION_FIELDS)
+        
+        # Get a page of the user's conversations, most recent first
+        conversations_ref = ctx.collection('conversations')
+        return cached_page(ctx.user_id, 'conversations', Conversation, lambda: fetch_page(
+            conversations_ref, 'updated_at',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            fields=fields or ['title', 'created_at', 'updated_at']
+        ), fields or ['title', 'created_at', 'updated_at'])
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/conversation/<conversation_id>', methods=['GET'])
-def get_conversation(conversation_id):
+@routes.route('/api/conversation/<conversation_id>', methods=['GET'])
+@authenticated
+def get_conversation(ctx, conversation_id):
     """
     Endpoint to get a specific conversation with all messages
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     try:
         # Get conversation details
-        conversation_ref = db.collection('conversations').document(user_id).collection('chats').document(conversation_id)
-        conversation = conversation_ref.get()
+        conversation_ref = ctx.collection('conversations').document(conversation_id)
+        with ctx.timed('firestore'):
+            conversation = conversation_ref.get()
         
         if not conversation.exists:
             return jsonify({'error': 'Conversation not found'}), 404
         
-        conv_data = conversation.to_dict()
-        
         # Get all messages in the conversation
         messages_ref = conversation_ref.collection('messages').order_by('timestamp')
-        messages = messages_ref.stream()
+        with ctx.timed('firestore'):
+            messages = list(messages_ref.stream())
         
-        messages_list = []
-        for msg in messages:
-            msg_data = msg.to_dict()
-            messages_list.append({
-                'id': msg.id,
-                'content': msg_data.get('content'),
-                'sender': msg_data.get('sender'),
-                'timestamp': msg_data.get('timestamp'),
-                'sentiment': msg_data.get('sentiment', None)
-            })
-        
-        result = {
-            'id': conversation_id,
-            'title': conv_data.get('title', 'Untitled Conversation'),
-            'created_at': conv_data.get('created_at'),
-            'updated_at': conv_data.get('updated_at'),
-            'messages': messages_list
-        }
+        result = Conversation.from_snapshot(conversation).to_dict(('title', 'created_at', 'updated_at'))
+        result['messages'] = serialize(map(Message.from_snapshot, messages))
         
-        return jsonify(result), 200
+        return json_response(result)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/mood', methods=['POST'])
-def record_mood():
+@routes.route('/api/mood', methods=['POST'])
+@authenticated
+def record_mood(ctx):
     """
     Endpoint to record user's mood
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get mood data from request
     data = request.get_json()
     if not data or 'mood' not in data or 'note' not in data:
@@ -375,74 +413,55 @@ def record_mood():
     
     try:
         # Store mood in Firestore
-        mood_ref = db.collection('moods').document(user_id).collection('entries').document()
-        mood_ref.set({
-            'mood': mood,
-            'note': note,
-            'timestamp': firestore.SERVER_TIMESTAMP
-        })
+        mood_ref = ctx.collection('moods').document()
+        
+        # The entry, its stats counters and the analytics buckets are committed together
+        @firestore.transactional
+        def store_mood(transaction):
+            mood_analytics.add_mood(transaction, db, ctx.user_id, mood)
+            transaction.set(mood_ref, {
+                'mood': mood,
+                'note': note,
+                'timestamp': firestore.SERVER_TIMESTAMP
+            })
+            add_increments(transaction, stats_document(db, ctx.user_id), **mood_increments(mood))
+        
+        with ctx.timed('firestore'):
+            store_mood(db.transaction())
+        read_cache.invalidate(ctx.user_id, 'moods', 'stats')
         
         return jsonify({'success': True, 'id': mood_ref.id}), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/mood/recent', methods=['GET'])
-def get_recent_moods():
+@routes.route('/api/mood/recent', methods=['GET'])
+@authenticated
+def get_recent_moods(ctx):
     """
     Endpoint to get recent mood entries for a user
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
-    # Get limit from query parameters
-    limit = request.args.get('limit', default=5, type=int)
-    
     try:
         # Get recent mood entries
-        moods_ref = db.collection('moods').document(user_id).collection('entries')
-        moods_ref = moods_ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit)
-        moods = moods_ref.stream()
-        
-        result = []
-        for mood in moods:
-            mood_data = mood.to_dict()
-            timestamp = mood_data.get('timestamp')
-            result.append({
-                'id': mood.id,
-                'score': mood_data.get('mood'),
-                'note': mood_data.get('note'),
-                'timestamp': {
-                    '_seconds': timestamp.timestamp() if timestamp else None,
-                    '_nanoseconds': 0
-                }
-            })
-        
-        return jsonify(result), 200
-    
+        moods_ref = ctx.collection('moods')
+        return cached_page(ctx.user_id, 'moods', MoodEntry, lambda: fetch_page(
+            moods_ref, 'timestamp',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            default_limit=5
+        ))
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/moods', methods=['GET'])
-def get_moods():
+@routes.route('/api/moods', methods=['GET'])
+@authenticated
+def get_moods(ctx):
     """
     Endpoint to get mood history for a user
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get time range from query parameters
     days = request.args.get('days', default=30, type=int)
     
@@ -451,43 +470,62 @@ def get_moods():
         import datetime
         from_date = datetime.datetime.now() - datetime.timedelta(days=days)
         
-        moods_ref = db.collection('moods').document(user_id).collection('entries')
-        moods_ref = moods_ref.where('timestamp', '>=', from_date).order_by('timestamp')
-        moods = moods_ref.stream()
-        
-        result = []
-        for mood in moods:
-            mood_data = mood.to_dict()
-            timestamp = mood_data.get('timestamp')
-            result.append({
-                'id': mood.id,
-                'score': mood_data.get('mood'),
-                'note': mood_data.get('note'),
-                'timestamp': {
-                    '_seconds': timestamp.timestamp() if timestamp else None,
-                    '_nanoseconds': 0
-                }
-            })
+        moods_ref = ctx.collection('moods').where('timestamp', '>=', from_date)
+        return cached_page(ctx.user_id, 'moods', MoodEntry, lambda: fetch_page(
+            moods_ref, 'timestamp',
+            direction=firestore.Query.ASCENDING,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            default_limit=MAX_PAGE_SIZE
+        ))
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@routes.route('/api/moods/analytics', methods=['GET'])
+@authenticated
+def get_mood_analytics(ctx):
+    """
+    Endpoint to get pre-aggregated mood series for a user
+    
+    Query parameters: granularity ('day' or 'week', default 'day') and days
+    (range ending now, default 30).
+    """
+    granularity = request.args.get('granularity', default='day')
+    if granularity not in mood_analytics.GRANULARITIES:
+        return jsonify({'error': 'granularity must be day or week'}), 400
+    days = request.args.get('days', default=30, type=int)
+    
+    try:
+        with ctx.timed('firestore'):
+            summary = mood_analytics.get_summary(db, ctx.user_id)
+            if summary is None:
+                # First request for a user whose analytics were never rebuilt
+                # from their entries; rebuild() seeds a summary even with no moods
+                mood_analytics.rebuild(db, ctx.user_id)
+                summary = mood_analytics.get_summary(db, ctx.user_id) or {}
+            trend = summary.get('trend')
+            
+            end = datetime.now(timezone.utc)
+            series = mood_analytics.get_series(db, ctx.user_id, end - timedelta(days=days), end + timedelta(seconds=1), granularity)
         
-        return jsonify(result), 200
+        return jsonify({
+            'granularity': granularity,
+            'series': series,
+            'trend': round(trend, 2) if trend is not None else None
+        }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/journal', methods=['POST'])
-def create_journal():
+@routes.route('/api/journal', methods=['POST'])
+@authenticated
+def create_journal(ctx):
     """
     Endpoint to create a journal entry
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get journal data from request
     data = request.get_json()
     if not data or 'title' not in data or 'content' not in data:
@@ -499,138 +537,95 @@ def create_journal():
     
     try:
         # Store journal in Firestore
-        journal_ref = db.collection('journals').document(user_id).collection('entries').document()
-        journal_ref.set({
+        journal_ref = ctx.collection('journals').document()
+        batch = db.batch()
+        batch.set(journal_ref, {
             'title': title,
             'content': content,
             'share_with_ai': share_with_ai,
             'created_at': firestore.SERVER_TIMESTAMP,
             'updated_at': firestore.SERVER_TIMESTAMP
         })
+        add_increments(batch, stats_document(db, ctx.user_id), journalCount=1)
+        with ctx.timed('firestore'):
+            batch.commit()
+        read_cache.invalidate(ctx.user_id, 'journals', 'stats')
         
         return jsonify({'success': True, 'id': journal_ref.id}), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/journal/entries', methods=['GET'])
-def get_journal_entries():
+@routes.route('/api/journal/<entry_id>', methods=['GET'])
+@authenticated
+def get_journal(ctx, entry_id):
     """
-    Endpoint to get journal entries for a user
+    Endpoint to get a single journal entry, including its content
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
-    # Get limit from query parameters
-    limit = request.args.get('limit', default=3, type=int)
-    
     try:
-        # Get journal entries
-        journals_ref = db.collection('journals').document(user_id).collection('entries')
-        journals_ref = journals_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(limit)
-        journals = journals_ref.stream()
+        with ctx.timed('firestore'):
+            journal = ctx.collection('journals').document(entry_id).get()
+        if not journal.exists:
+            return jsonify({'error': 'Journal entry not found'}), 404
         
-        result = []
-        for journal in journals:
-            journal_data = journal.to_dict()
-            created_at = journal_data.get('created_at')
-            updated_at = journal_data.get('updated_at')
-            
-            # Format timestamps consistently
-            created_at_dict = {
-                '_seconds': created_at.timestamp() if created_at else None,
-                '_nanoseconds': 0
-            }
-            
-            updated_at_dict = {
-                '_seconds': updated_at.timestamp() if updated_at else None,
-                '_nanoseconds': 0
-            }
-            
-            result.append({
-                'id': journal.id,
-                'title': journal_data.get('title'),
-                'content': journal_data.get('content'),
-                'share_with_ai': journal_data.get('share_with_ai', False),
-                'created_at': created_at_dict,
-                'updated_at': updated_at_dict
-            })
-        
-        return jsonify(result), 200
+        return json_response(JournalEntry.from_snapshot(journal).to_dict())
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/journals', methods=['GET'])
-def get_journals():
+@routes.route('/api/journal/entries', methods=['GET'])
+@authenticated
+def get_journal_entries(ctx):
     """
     Endpoint to get journal entries for a user
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     try:
-        # Get journal entries
-        journals_ref = db.collection('journals').document(user_id).collection('entries').order_by('created_at', direction=firestore.Query.DESCENDING)
-        journals = journals_ref.stream()
-        
-        result = []
-        for journal in journals:
-            journal_data = journal.to_dict()
-            created_at = journal_data.get('created_at')
-            updated_at = journal_data.get('updated_at')
-            
-            # Format timestamps consistently
-            created_at_dict = {
-                '_seconds': created_at.timestamp() if created_at else None,
-                '_nanoseconds': 0
-            }
-            
-            updated_at_dict = {
-                '_seconds': updated_at.timestamp() if updated_at else None,
-                '_nanoseconds': 0
-            }
-            
-            result.append({
-                'id': journal.id,
-                'title': journal_data.get('title'),
-                'content': journal_data.get('content'),
-                'share_with_ai': journal_data.get('share_with_ai', False),
-                'created_at': created_at_dict,
-                'updated_at': updated_at_dict
-            })
-        
-        return jsonify(result), 200
-    
+        fields = parse_fields(request.args.get('fields'), JOURNAL_FIELDS)
+        
+        # Get the user's most recent journal entries
+        journals_ref = ctx.collection('journals')
+        return cached_page(ctx.user_id, 'journals', JournalEntry, lambda: fetch_page(
+            journals_ref, 'created_at',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            fields=fields,
+            default_limit=3
+        ), fields)
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals', methods=['POST'])
-def create_goal():
+@routes.route('/api/journals', methods=['GET'])
+@authenticated
+def get_journals(ctx):
+    """
+    Endpoint to get journal entries for a user
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), JOURNAL_FIELDS)
+        
+        # Get a page of journal entries, newest first
+        journals_ref = ctx.collection('journals')
+        return cached_page(ctx.user_id, 'journals', JournalEntry, lambda: fetch_page(
+            journals_ref, 'created_at',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            fields=fields
+        ), fields)
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@routes.route('/api/goals', methods=['POST'])
+@authenticated
+def create_goal(ctx):
     """
     Endpoint to create a mental health goal
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get goal data from request
     data = request.get_json()
     if not data:
@@ -655,8 +650,9 @@ def create_goal():
     
     try:
         # Store goal in Firestore
-        goal_ref = db.collection('goals').document(user_id).collection('items').document()
-        goal_ref.set({
+        goal_ref = ctx.collection('goals').document()
+        batch = db.batch()
+        batch.set(goal_ref, {
             'title': title,
             'description': description,
             'category': category,
@@ -665,6 +661,10 @@ def create_goal():
             'created_at': firestore.SERVER_TIMESTAMP,
             'updated_at': firestore.SERVER_TIMESTAMP
         })
+        add_increments(batch, stats_document(db, ctx.user_id), goalCount=1)
+        with ctx.timed('firestore'):
+            batch.commit()
+        read_cache.invalidate(ctx.user_id, 'goals', 'stats')
         
         return jsonify({'success': True, 'id': goal_ref.id}), 200
     
@@ -672,57 +672,36 @@ def create_goal():
         logger.error(f"Error creating goal: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals', methods=['GET'])
-def get_goals():
+@routes.route('/api/goals', methods=['GET'])
+@authenticated
+def get_goals(ctx):
     """
     Endpoint to get mental health goals for a user
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     try:
-        # Get goals
-        goals_ref = db.collection('goals').document(user_id).collection('items').order_by('target_date')
-        goals = goals_ref.stream()
-        
-        result = []
-        for goal in goals:
-            goal_data = goal.to_dict()
-            result.append({
-                'id': goal.id,
-                'title': goal_data.get('title'),
-                'description': goal_data.get('description'),
-                'target_date': goal_data.get('target_date'),
-                'completed': goal_data.get('completed', False),
-                'created_at': goal_data.get('created_at'),
-                'updated_at': goal_data.get('updated_at')
-            })
-        
-        return jsonify(result), 200
-    
+        fields = parse_fields(request.args.get('fields'), GOAL_FIELDS)
+        
+        # Get a page of goals, soonest target date first
+        goals_ref = ctx.collection('goals')
+        return cached_page(ctx.user_id, 'goals', Goal, lambda: fetch_page(
+            goals_ref, 'target_date',
+            direction=firestore.Query.ASCENDING,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            fields=fields
+        ), fields)
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goal/<goal_id>', methods=['PUT'])
-def update_goal(goal_id):
+@routes.route('/api/goal/<goal_id>', methods=['PUT'])
+@authenticated
+def update_goal(ctx, goal_id):
     """
     Endpoint to update a mental health goal
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get goal data from request
     data = request.get_json()
     if not data:
@@ -730,11 +709,7 @@ def update_goal(goal_id):
     
     try:
         # Update goal in Firestore
-        goal_ref = db.collection('goals').document(user_id).collection('items').document(goal_id)
-        goal = goal_ref.get()
-        
-        if not goal.exists:
-            return jsonify({'error': 'Goal not found'}), 404
+        goal_ref = ctx.collection('goals').document(goal_id)
         
         update_data = {}
         
@@ -771,7 +746,24 @@ def update_goal(goal_id):
         # Log the update data for debugging
         logger.debug(f"Updating goal {goal_id} with data: {update_data}")
         
-        goal_ref.update(update_data)
+        # Read and write in one transaction so a completion toggle is counted exactly once
+        @firestore.transactional
+        def apply_update(transaction):
+            goal = goal_ref.get(transaction=transaction)
+            if not goal.exists:
+                return False
+            
+            was_completed = goal.to_dict().get('completed', False)
+            transaction.update(goal_ref, update_data)
+            if 'completed' in update_data and update_data['completed'] != was_completed:
+                add_increments(transaction, stats_document(db, ctx.user_id), completedGoalCount=1 if update_data['completed'] else -1)
+            return True
+        
+        with ctx.timed('firestore'):
+            updated = apply_update(db.transaction())
+        if not updated:
+            return jsonify({'error': 'Goal not found'}), 404
+        read_cache.invalidate(ctx.user_id, 'goals', 'stats')
         
         return jsonify({'success': True}), 200
     
@@ -779,64 +771,57 @@ def update_goal(goal_id):
         logger.error(f"Error updating goal: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/user/profile', methods=['GET'])
-def get_user_profile():
+def load_user_profile(user_id):
     """
-    Endpoint to get user profile information
+    Read a user's profile from Firebase Auth and Firestore
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
+    # Get user data from Firebase Auth
+    with timed('auth'):
+        user = auth.get_user(user_id, app=get_firebase_app())
     
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
+    # Get additional user data from Firestore
+    user_ref = db.collection('users').document(user_id)
+    with timed('firestore'):
+        user_doc = user_ref.get()
+    
+    user_data = {
+        'uid': user.uid,
+        'email': user.email,
+        'displayName': user.display_name,
+        'photoURL': user.photo_url,
+        'emailVerified': user.email_verified,
+        'createdAt': user.user_metadata.creation_timestamp
+    }
+    
+    # Add additional data from Firestore if it exists
+    if user_doc.exists:
+        firestore_data = user_doc.to_dict()
+        user_data.update({
+            'bio': firestore_data.get('bio', ''),
+            'preferences': firestore_data.get('preferences', {})
+        })
     
+    return user_data
+
+@routes.route('/api/user/profile', methods=['GET'])
+@authenticated
+def get_user_profile(ctx):
+    """
+    Endpoint to get user profile information
+    """
     try:
-        # Get user data from Firebase Auth
-        user = auth.get_user(user_id)
-        
-        # Get additional user data from Firestore
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
-        
-        user_data = {
-            'uid': user.uid,
-            'email': user.email,
-            'displayName': user.display_name,
-            'photoURL': user.photo_url,
-            'emailVerified': user.email_verified,
-            'createdAt': user.user_metadata.creation_timestamp
-        }
-        
-        # Add additional data from Firestore if it exists
-        if user_doc.exists:
-            firestore_data = user_doc.to_dict()
-            user_data.update({
-                'bio': firestore_data.get('bio', ''),
-                'preferences': firestore_data.get('preferences', {})
-            })
-        
+        user_data = read_cache.get_or_load(ctx.user_id, 'profile', 'profile', lambda: load_user_profile(ctx.user_id))
         return jsonify(user_data), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/user/profile', methods=['PUT'])
-def update_user_profile():
+@routes.route('/api/user/profile', methods=['PUT'])
+@authenticated
+def update_user_profile(ctx):
     """
     Endpoint to update user profile information
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     # Get data from request
     data = request.get_json()
     if not data:
@@ -844,7 +829,7 @@ def update_user_profile():
     
     try:
         # Update user data in Firestore
-        user_ref = db.collection('users').document(user_id)
+        user_ref = ctx.profile
         
         # Only allow certain fields to be updated
         allowed_fields = ['displayName', 'bio', 'preferences']
@@ -852,84 +837,42 @@ def update_user_profile():
         
         # Update display name in Firebase Auth if provided
         if 'displayName' in update_data:
-            auth.update_user(
-                user_id,
-                display_name=update_data['displayName']
-            )
+            with ctx.timed('auth'):
+                auth.update_user(
+                    ctx.user_id,
+                    display_name=update_data['displayName'],
+                    app=get_firebase_app()
+                )
         
         # Update data in Firestore
-        user_ref.set(update_data, merge=True)
+        with ctx.timed('firestore'):
+            user_ref.set(update_data, merge=True)
+        read_cache.invalidate(ctx.user_id, 'profile')
         
         return jsonify({'message': 'Profile updated successfully'}), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/user/stats', methods=['GET'])
-def get_user_stats():
+@routes.route('/api/user/stats', methods=['GET'])
+@authenticated
+def get_user_stats(ctx):
     """
     Endpoint to get user activity statistics
     """
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     try:
-        logger.info(f"Fetching stats for user: {user_id}")
+        logger.info(f"Fetching stats for user: {ctx.user_id}")
         
         # Ensure Firestore is initialized
         if not db:
             raise ValueError("Firestore client not initialized")
         
-        # Get conversation count
-        conversations_ref = db.collection('conversations').document(user_id).collection('chats')
-        conversation_count = len(list(conversations_ref.stream()))
-        logger.debug(f"Found {conversation_count} conversations")
-        
-        # Get journal entry count
-        journals_ref = db.collection('journals').document(user_id).collection('entries')
-        journal_count = len(list(journals_ref.stream()))
-        
-        # Get mood entry count and calculate average
-        moods_ref = db.collection('moods').document(user_id).collection('entries')
-        mood_entries = list(moods_ref.stream())
-        mood_count = len(mood_entries)
-        
-        average_mood = None
-        if mood_count > 0:
-            total_mood = 0
-            valid_entries = 0
-            for entry in mood_entries:
-                mood_value = entry.to_dict().get('mood', 0)
-                try:
-                    total_mood += float(mood_value)
-                    valid_entries += 1
-                except (ValueError, TypeError):
-                    logger.warning(f"Invalid mood value for entry {entry.id}: {mood_value}")
-            average_mood = round(total_mood / valid_entries, 1) if valid_entries > 0 else None
+        stats = read_cache.get_or_load(ctx.user_id, 'stats', 'stats', lambda: get_stats(db, ctx.user_id))
+        etag = value_etag(ctx.user_id, stats)
+        if is_fresh(etag):
+            return not_modified(etag)
         
-        # Get goal counts
-        goals_ref = db.collection('goals').document(user_id).collection('items')
-        goal_count = len(list(goals_ref.stream()))
-        
-        # Get completed goals count
-        completed_goals_ref = goals_ref.where('completed', '==', True)
-        completed_goal_count = len(list(completed_goals_ref.stream()))
-        
-        stats = {
-            'conversationCount': conversation_count,
-            'journalCount': journal_count,
-            'moodCount': mood_count,
-            'goalCount': goal_count,
-            'completedGoalCount': completed_goal_count,
-            'averageMood': average_mood
-        }
-        
-        return jsonify(stats), 200
+        return with_etag(jsonify(stats), etag), 200
     
     except Exception as e:
         logger.error(f"Error fetching user stats: {str(e)}", exc_info=True)
@@ -939,20 +882,12 @@ def get_user_stats():
             'type': type(e).__name__
         }), 500
     
-@app.route('/api/user/profile/image', methods=['POST'])
-def upload_profile_image():
+@routes.route('/api/user/profile/image', methods=['POST'])
+@authenticated
+def upload_profile_image(ctx):
     """
-    Endpoint to upload user profile image using local file storage
+    Endpoint to upload user profile image to the configured upload storage
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
     try:
         # Check if the request has the file part
         if 'profileImage' not in request.files:
@@ -969,48 +904,71 @@ def upload_profile_image():
         if not file.content_type.startswith('image/'):
             return jsonify({'error': 'Only image files are allowed'}), 400
         
-        # Create user directory if it doesn't exist
-        user_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], user_id)
-        os.makedirs(user_upload_dir, exist_ok=True)
-        
-        # Create a unique filename
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        filepath = os.path.join(user_upload_dir, unique_filename)
-        
-        # Save the file
-        logger.info(f"Saving file to {filepath}")
-        file.save(filepath)
-        
-        # Generate a URL to access the image
-        image_url = f"{SERVER_BASE_URL}/uploads/profile_images/{user_id}/{unique_filename}"
+        # Store resized variants named by the upload's content hash
+        user_prefix = f"profile_images/{ctx.user_id}/"
+        storage = upload_storage.get()
+        try:
+            with ctx.timed('storage'):
+                content_hash, keys = profile_images.store_profile_image(file.stream, storage, user_prefix)
+        except profile_images.InvalidImageError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Generate URLs to access the images
+        variants = {
+            str(size): f"{SERVER_BASE_URL}/uploads/{key}"
+            for size, key in keys.items()
+        }
+        image_url = variants.get(str(profile_images.PROFILE_IMAGE_DEFAULT_SIZE)) or variants[str(max(keys))]
         logger.info(f"Image URL: {image_url}")
         
+        auth_updated = False
         try:
             # Update user profile in Firebase Auth
-            auth.update_user(
-                user_id,
-                photo_url=image_url
-            )
+            with ctx.timed('auth'):
+                auth.update_user(
+                    ctx.user_id,
+                    photo_url=image_url,
+                    app=get_firebase_app()
+                )
             logger.info("Firebase Auth profile updated with new image URL")
+            auth_updated = True
         except Exception as e:
             logger.error(f"Error updating Firebase Auth profile: {str(e)}", exc_info=True)
             # Continue even if this fails, as we still have the image URL
         
+        # Swap the profile's images and read the ones it replaces in one
+        # transaction, so concurrent uploads each replace a different set
+        @firestore.transactional
+        def replace_photo(transaction):
+            snapshot = ctx.profile.get(transaction=transaction)
+            previous = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            transaction.set(ctx.profile, {
+                'photoURL': image_url,
+                'photoVariants': variants
+            }, merge=True)
+            return previous
+        
+        previous = None
         try:
             # Update user profile in Firestore
-            user_ref = db.collection('users').document(user_id)
-            user_ref.set({
-                'photoURL': image_url
-            }, merge=True)
+            with ctx.timed('firestore'):
+                previous = replace_photo(db.transaction())
             logger.info("Firestore profile updated with new image URL")
         except Exception as e:
             logger.error(f"Error updating Firestore profile: {str(e)}", exc_info=True)
             # Continue even if this fails, as we still have the image URL
         
+        read_cache.invalidate(ctx.user_id, 'profile')
+        
+        # Only once both profiles point at the new variants can the old images go
+        if auth_updated and previous is not None:
+            with ctx.timed('storage'):
+                profile_images.collect_garbage(storage, user_prefix, previous, content_hash)
+        
         return jsonify({
             'message': 'Profile image uploaded successfully',
-            'imageUrl': image_url
+            'imageUrl': image_url,
+            'variants': variants
         }), 200
     
     except Exception as e:
@@ -1018,53 +976,58 @@ def upload_profile_image():
         return jsonify({'error': str(e)}), 500
 
 # Add a route to serve the uploaded images
-@app.route('/uploads/<path:filename>', methods=['GET'])
+@routes.route('/uploads/<path:filename>', methods=['GET'])
 def serve_file(filename):
     """
-    Serve uploaded files
+    Serve uploaded files, cacheable for a year when their name is content-hashed
     """
-    upload_folder = os.path.dirname(app.config['UPLOAD_FOLDER'])
-    return send_from_directory(upload_folder, filename)
+    storage = upload_storage.get()
+    if isinstance(storage, LocalStorage):
+        return send_upload(storage.root, filename)
+    return send_stored(storage, filename)
 
-@app.route('/api/chat/conversations', methods=['GET'])
-def get_chat_conversations():
+@routes.route('/api/chat/conversations', methods=['GET'])
+@authenticated
+def get_chat_conversations(ctx):
     """
     Endpoint to get chat conversations for a user
     """
-    # Verify Firebase token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No authorization header provided'}), 401
-    
-    user_id = verify_firebase_token(auth_header)
-    if not user_id:
-        return jsonify({'error': 'Invalid or expired token'}), 401
-    
-    # Get limit from query parameters
-    limit = request.args.get('limit', default=3, type=int)
-    
     try:
-        # Get all conversations for the user
-        conversations_ref = db.collection('conversations').document(user_id).collection('chats')
-        conversations_ref = conversations_ref.order_by('updated_at', direction=firestore.Query.DESCENDING).limit(limit)
-        conversations = conversations_ref.stream()
-        
-        result = []
-        for conv in conversations:
-            conv_data = conv.to_dict()
-            result.append({
-                'id': conv.id,
-                'title': conv_data.get('title', 'Untitled Conversation'),
-                'last_message': conv_data.get('last_message', ''),
-                'created_at': conv_data.get('created_at'),
-                'updated_at': conv_data.get('updated_at')
-            })
-        
-        return jsonify(result), 200
+        fields = parse_fields(request.args.get('fields'), CONVERSATION_FIELDS)
+        
+        # Get the user's most recent conversations
+        conversations_ref = ctx.collection('conversations')
+        return cached_page(ctx.user_id, 'conversations', Conversation, lambda: fetch_page(
+            conversations_ref, 'updated_at',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+            fields=fields,
+            default_limit=3
+        ), fields)
+    
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@routes.route('/api/dashboard', methods=['GET'])
+@authenticated
+def get_dashboard(ctx):
+    """
+    Endpoint to get every dashboard section in one request
+
+    Recent moods, journal entries and conversations, goals and stats are
+    loaded concurrently. Sections that fail or time out come back as null,
+    with 'partial' set and the reason under 'errors'.
+    """
+    try:
+        return json_response(load_dashboard(db, ctx.user_id))
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,185 @@
+"""
+Async (ASGI) serving mode
+
+The chat pipeline endpoints run natively on the event loop with async HTTP and
+Firestore clients, so one process can hold hundreds of in-flight Groq and
+Hugging Face calls. Every other route is served by the Flask app through a
+WSGI adapter.
+
+Run with:
+    WEB_CONCURRENCY=2 uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Set the worker count with WEB_CONCURRENCY rather than --workers, so the read
+cache knows it has to be shared between workers.
+"""
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app import app as flask_app, db, logger, sentiment_api
+from api.chat_turns import load_conversation_history_async, save_chat_turn_async
+from api.groq_api import generate_response_async
+from api.summarizer import needs_summary, schedule_summary
+from utils.auth import verify_firebase_token
+from utils import async_http_client
+from utils.clients import db_async
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def verify_token(request):
+    # Token verification is synchronous (and may fetch public keys), so keep it off the loop
+    return await asyncio.to_thread(verify_firebase_token, request.headers.get('Authorization'))
+
+
+async def score_sentiment(sentiment, message):
+    return sentiment if sentiment.get('emotion') else await sentiment_api.analyze_sentiment_async(message)
+
+
+async def test_sentiment(request):
+    """
+    Test endpoint to analyze sentiment without authentication
+    """
+    data = await read_json(request)
+    if not data or 'message' not in data:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    message = data['message']
+    result = await sentiment_api.analyze_sentiment_async(message)
+
+    return JSONResponse({
+        'message': message,
+        'sentiment': result
+    })
+
+
+async def test_chat(request):
+    """
+    Test endpoint to generate AI response without authentication
+    """
+    data = await read_json(request)
+    if not data or 'message' not in data:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    message = data['message']
+    sentiment = await sentiment_api.analyze_sentiment_async(message)
+
+    conversation_history = data.get('conversation_history', [])
+    response = await generate_response_async(message, sentiment.get('emotion', 'neutral'), conversation_history)
+
+    return JSONResponse({
+        'message': message,
+        'sentiment': sentiment,
+        'response': response
+    })
+
+
+async def sentiment_analysis(request):
+    """
+    Endpoint to analyze sentiment of user message
+    """
+    if not request.headers.get('Authorization'):
+        return JSONResponse({'error': 'No authorization header provided'}, status_code=401)
+
+    user_id = await verify_token(request)
+    if not user_id:
+        return JSONResponse({'error': 'Invalid or expired token'}, status_code=401)
+
+    data = await read_json(request)
+    if not data or 'message' not in data:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    try:
+        return JSONResponse(await sentiment_api.analyze_sentiment_async(data['message']))
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def generate_response_api(request):
+    try:
+        data = await read_json(request) or {}
+
+        message = data.get('message', '')
+        sentiment = data.get('sentiment') or {}
+        conversation_id = data.get('conversation_id')
+
+        user_id = await verify_token(request)
+        if not user_id:
+            return JSONResponse({'error': 'Unauthorized'}, status_code=401)
+
+        sent_at = datetime.now(timezone.utc)
+
+        # Same stages as app.generate_response_api
+        (conversation_history, summary, version), sentiment = await asyncio.gather(
+            load_conversation_history_async(db_async, user_id, conversation_id),
+            score_sentiment(sentiment, message)
+        )
+        ai_response = await generate_response_async(message, sentiment.get('emotion', 'neutral'), conversation_history, summary)
+        saved_id = await save_chat_turn_async(db_async, user_id, conversation_id, message, ai_response, sentiment, sent_at, version)
+
+        # The summary job runs on its own thread, off the event loop
+        if conversation_id and needs_summary(len(conversation_history) + 2):
+            schedule_summary(db, user_id, conversation_id)
+        conversation_id = saved_id
+
+        return JSONResponse({
+            'response': ai_response,
+            'conversation_id': conversation_id
+        })
+
+    except Exception as e:
+        logger.error(f"Error in generate_response_api: {str(e)}", exc_info=True)
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    yield
+    await async_http_client.close_clients()
+
+
+async_routes = [
+    Route('/api/test_sentiment', test_sentiment, methods=['POST']),
+    Route('/api/test_chat', test_chat, methods=['POST']),
+    Route('/api/analyze_sentiment', sentiment_analysis, methods=['POST']),
+    Route('/api/generate_response', generate_response_api, methods=['POST']),
+]
+ASYNC_PATHS = frozenset(route.path for route in async_routes)
+
+async_app = Starlette(
+    routes=async_routes,
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=['http://localhost:3000'],
+            allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization'],
+            allow_credentials=True
+        )
+    ],
+    lifespan=lifespan
+)
+
+wsgi_app = WSGIMiddleware(flask_app)
+
+
+async def app(scope, receive, send):
+    """
+    Dispatch chat pipeline routes to the async app and the rest to Flask
+    """
+    if scope['type'] == 'lifespan' or scope.get('path') in ASYNC_PATHS:
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
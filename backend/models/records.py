@@ -0,0 +1,103 @@
+from models.serialization import http_timestamp, plain, seconds_timestamp
+from utils.timing import timed
+
+
+class Record:
+    """
+    Compact, slotted view of a Firestore document
+
+    Subclasses list their fields in FIELDS as (response key, document field,
+    default, formatter) and name the same keys in __slots__. Rows are built
+    straight from snapshots and serialized in a single pass to plain JSON
+    types, without an intermediate per-row dict.
+    """
+
+    __slots__ = ('id',)
+    FIELDS = ()
+
+    def __init__(self, id, **values):
+        self.id = id
+        for key, _source, default, _formatter in self.FIELDS:
+            setattr(self, key, values.get(key, default))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        record = cls.__new__(cls)
+        record.id = snapshot.id
+        data = snapshot.to_dict() or {}
+        for key, source, default, _formatter in cls.FIELDS:
+            setattr(record, key, data.get(source, default))
+        return record
+
+    def to_dict(self, fields=None):
+        """
+        Serialize to JSON-ready types
+
+        Args:
+            fields (iterable): Response keys to include besides 'id'; None for all
+        """
+        result = {'id': self.id}
+        for key, _source, _default, formatter in self.FIELDS:
+            if fields is None or key in fields:
+                result[key] = formatter(getattr(self, key))
+        return result
+
+
+def serialize(records, fields=None):
+    """
+    Serialize a sequence of records for a list response
+    """
+    with timed('serialization'):
+        return [record.to_dict(fields) for record in records]
+
+
+class Conversation(Record):
+    __slots__ = ('title', 'last_message', 'created_at', 'updated_at')
+    FIELDS = (
+        ('title', 'title', 'Untitled Conversation', plain),
+        ('last_message', 'last_message', '', plain),
+        ('created_at', 'created_at', None, http_timestamp),
+        ('updated_at', 'updated_at', None, http_timestamp),
+    )
+
+
+class Message(Record):
+    __slots__ = ('content', 'sender', 'timestamp', 'sentiment')
+    FIELDS = (
+        ('content', 'content', None, plain),
+        ('sender', 'sender', None, plain),
+        ('timestamp', 'timestamp', None, http_timestamp),
+        ('sentiment', 'sentiment', None, plain),
+    )
+
+
+class MoodEntry(Record):
+    __slots__ = ('score', 'note', 'timestamp')
+    FIELDS = (
+        ('score', 'mood', None, plain),
+        ('note', 'note', None, plain),
+        ('timestamp', 'timestamp', None, seconds_timestamp),
+    )
+
+
+class JournalEntry(Record):
+    __slots__ = ('title', 'content', 'share_with_ai', 'created_at', 'updated_at')
+    FIELDS = (
+        ('title', 'title', None, plain),
+        ('content', 'content', None, plain),
+        ('share_with_ai', 'share_with_ai', False, plain),
+        ('created_at', 'created_at', None, seconds_timestamp),
+        ('updated_at', 'updated_at', None, seconds_timestamp),
+    )
+
+
+class Goal(Record):
+    __slots__ = ('title', 'description', 'target_date', 'completed', 'created_at', 'updated_at')
+    FIELDS = (
+        ('title', 'title', None, plain),
+        ('description', 'description', None, plain),
+        ('target_date', 'target_date', None, plain),
+        ('completed', 'completed', False, plain),
+        ('created_at', 'created_at', None, http_timestamp),
+        ('updated_at', 'updated_at', None, http_timestamp),
+    )
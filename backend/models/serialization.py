@@ -0,0 +1,54 @@
+import json
+from datetime import date
+
+from flask import Response
+from werkzeug.http import http_date
+
+from utils.timing import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # Any datetime a record didn't format renders the way Flask's jsonify does
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """
+    Serialize a response payload to bytes, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200, headers=None):
+    """
+    Build a JSON response without going through Flask's default encoder
+    """
+    with timed('serialization'):
+        body = dumps(payload)
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+
+def http_timestamp(value):
+    # Same format Flask's jsonify gives datetimes
+    return http_date(value) if value is not None else None
+
+
+def seconds_timestamp(value):
+    # Firestore-style {_seconds, _nanoseconds} used by the journal and mood endpoints
+    return {
+        '_seconds': value.timestamp() if value else None,
+        '_nanoseconds': 0
+    }
+
+
+def plain(value):
+    return value
@@ -0,0 +1,30 @@
+"""
+Rebuild the pre-aggregated mood buckets and trend from raw mood entries
+
+Run from backend/ once after deploying the analytics module, so users whose
+entries predate it get complete series:
+    python scripts/backfill_mood_analytics.py [--user UID ...]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import db
+from api import mood_analytics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', action='append', help='Only rebuild these user IDs')
+    args = parser.parse_args()
+
+    user_ids = args.user or [ref.id for ref in db.collection('moods').list_documents()]
+    for user_id in user_ids:
+        count = mood_analytics.rebuild(db, user_id)
+        print(f"{user_id}: {count} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure how long a fresh worker takes to import the app and serve its first request
+
+Each run starts a new interpreter, so nothing is shared with earlier runs
+apart from the OS page cache:
+    python scripts/coldstart.py [--runs 10] [--path /] [--token <ID token>]
+
+To compare with an older revision, check it out next to this one and point
+--backend at its backend/ directory:
+    git worktree add /tmp/before <rev>
+    python scripts/coldstart.py --backend /tmp/before/backend
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the fresh interpreter; prints one JSON line of timings in seconds
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+flask_app = module.app
+headers = {'Authorization': 'Bearer ' + sys.argv[2]} if sys.argv[2] else {}
+response = flask_app.test_client().get(sys.argv[1], headers=headers)
+served = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import': imported - started,
+    'first_response': served - imported,
+    'total': served - started,
+}))
+"""
+
+
+def run_once(backend_dir, path, token):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, path, token or ''],
+        cwd=backend_dir, capture_output=True, text=True, check=True
+    )
+    # The app may print warnings before the timings
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default=BACKEND_DIR, help='backend/ directory to measure')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/', help='Path of the first request')
+    parser.add_argument('--token', help='Firebase ID token for an authenticated path')
+    args = parser.parse_args()
+
+    samples = [run_once(args.backend, args.path, args.token) for _ in range(args.runs)]
+    statuses = sorted({sample['status'] for sample in samples})
+    print(f"{args.backend} GET {args.path} -> {', '.join(map(str, statuses))} ({args.runs} runs)")
+    for key in ('import', 'first_response', 'total'):
+        values = [sample[key] for sample in samples]
+        print(f"  {key:<15} median {statistics.median(values) * 1000:7.0f} ms   min {min(values) * 1000:7.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
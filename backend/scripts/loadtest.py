@@ -0,0 +1,85 @@
+"""
+Closed-loop load generator for the chat endpoints
+
+Example:
+    python scripts/loadtest.py --url http://127.0.0.1:5000/api/test_chat \
+        --concurrency 100 --requests 1000
+"""
+import argparse
+import asyncio
+import collections
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client, url, body, headers, remaining, latencies, errors):
+    while remaining:
+        remaining.pop()
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json=body, headers=headers)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+            else:
+                latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    body = json.loads(args.body)
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    remaining = list(range(args.requests))
+    latencies, errors = [], []
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, args.url, body, headers, remaining, latencies, errors)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    ms = lambda seconds: round(seconds * 1000, 1) if seconds is not None else None
+    return {
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'errors': len(errors),
+        'error_kinds': dict(collections.Counter(str(e) for e in errors)),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(statistics.mean(latencies)) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/test_chat')
+    parser.add_argument('--body', default='{"message": "I have been feeling anxious about work lately"}')
+    parser.add_argument('--token', help='Firebase ID token for authenticated endpoints')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Copy files already in uploads/profile_images to the configured upload storage
+
+Run from backend/ with UPLOAD_STORAGE=gcs (and UPLOAD_BUCKET) set, before
+switching the deployment over, so existing photoURLs keep resolving:
+    python scripts/migrate_uploads.py [--workers 16] [--dry-run] [--delete]
+
+Files already present in the bucket with the same size are skipped, so the
+script can be re-run after an interruption.
+"""
+import argparse
+import mimetypes
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import UPLOAD_FOLDER, upload_storage
+from utils.static_files import IMMUTABLE_CACHE_CONTROL, is_immutable
+from utils.storage import LocalStorage
+
+
+def local_files(root):
+    upload_root = os.path.dirname(root)
+    for directory, _dirs, files in os.walk(root):
+        for name in files:
+            if name.startswith('.tmp-'):
+                continue
+            path = os.path.join(directory, name)
+            yield path, os.path.relpath(path, upload_root).replace(os.sep, '/')
+
+
+def migrate(path, key, dry_run=False, delete=False):
+    size = os.path.getsize(path)
+    if upload_storage.size(key) == size:
+        return 'skipped'
+    if dry_run:
+        return 'would copy'
+
+    with open(path, 'rb') as f:
+        upload_storage.put(
+            key, f,
+            content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            cache_control=IMMUTABLE_CACHE_CONTROL if is_immutable(key) else None
+        )
+    if delete:
+        os.unlink(path)
+    return 'copied'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=16, help='Files uploaded in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be copied')
+    parser.add_argument('--delete', action='store_true', help='Remove local files once copied')
+    args = parser.parse_args()
+
+    if isinstance(upload_storage.get(), LocalStorage):
+        parser.error('UPLOAD_STORAGE is local; set UPLOAD_STORAGE=gcs and UPLOAD_BUCKET to migrate')
+
+    started = time.monotonic()
+    totals = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(migrate, path, key, args.dry_run, args.delete): key
+            for path, key in local_files(UPLOAD_FOLDER)
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = 'failed'
+                print(f"{key}: {str(e)}")
+            totals[outcome] = totals.get(outcome, 0) + 1
+
+    summary = ', '.join(f"{count} {outcome}" for outcome, count in sorted(totals.items())) or 'no files'
+    print(f"{summary} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Fake Groq and Hugging Face endpoints with a fixed latency, for load tests
+
+Run with:
+    MOCK_LATENCY_MS=500 uvicorn scripts.mock_upstream:app --port 8900
+
+Then start the backend with
+    GROQ_API_URL=http://127.0.0.1:8900/openai/v1/chat/completions
+    HUGGINGFACE_API_URL=http://127.0.0.1:8900/models
+"""
+import asyncio
+import os
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+LATENCY = float(os.getenv('MOCK_LATENCY_MS', '500')) / 1000.0
+
+
+async def chat_completions(request):
+    await request.body()
+    await asyncio.sleep(LATENCY)
+    return JSONResponse({
+        'choices': [{'message': {'role': 'assistant', 'content': 'Thank you for sharing that with me.'}}]
+    })
+
+
+async def classify(request):
+    body = await request.json()
+    inputs = body.get('inputs')
+    texts = inputs if isinstance(inputs, list) else [inputs]
+    await asyncio.sleep(LATENCY / 5)
+    return JSONResponse([
+        [{'label': 'neutral', 'score': 0.9}, {'label': 'joy', 'score': 0.05}] for _ in texts
+    ])
+
+
+app = Starlette(routes=[
+    Route('/openai/v1/chat/completions', chat_completions, methods=['POST']),
+    Route('/models/{model:path}', classify, methods=['POST']),
+])
@@ -0,0 +1,299 @@
+"""
+In-memory stand-in for the parts of the Firestore client the backend uses
+
+Documents live in a dict keyed by path. Every write bumps a global clock that
+becomes the document's update_time, so code comparing update times sees the
+same changes it would against Firestore. Batches and transactions buffer
+their writes until commit. Patch a module's `firestore` attribute with
+`FakeFirestoreModule()` so its transforms and `transactional` match.
+"""
+import itertools
+import operator
+import types
+import uuid
+from datetime import datetime, timezone
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class Minimum:
+    def __init__(self, value):
+        self.value = value
+
+
+class Maximum:
+    def __init__(self, value):
+        self.value = value
+
+
+SERVER_TIMESTAMP = object()
+
+
+def transactional(fn):
+    def run(transaction, *args, **kwargs):
+        result = fn(transaction, *args, **kwargs)
+        transaction.commit()
+        return result
+    return run
+
+
+def FakeFirestoreModule():
+    return types.SimpleNamespace(
+        Increment=Increment,
+        Minimum=Minimum,
+        Maximum=Maximum,
+        SERVER_TIMESTAMP=SERVER_TIMESTAMP,
+        transactional=transactional,
+        Query=types.SimpleNamespace(ASCENDING='ASCENDING', DESCENDING='DESCENDING')
+    )
+
+
+def _apply(current, value):
+    if isinstance(value, Increment):
+        return (current or 0) + value.value
+    if isinstance(value, Minimum):
+        return value.value if current is None else min(current, value.value)
+    if isinstance(value, Maximum):
+        return value.value if current is None else max(current, value.value)
+    if value is SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    return value
+
+
+class Snapshot:
+    def __init__(self, reference, data, update_time):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        # Like Firestore, a missing field is an error rather than None
+        return self._data[field]
+
+
+class Query:
+    _OPS = {
+        '==': operator.eq, '<': operator.lt, '<=': operator.le,
+        '>': operator.gt, '>=': operator.ge
+    }
+
+    def __init__(self, collection, filters=(), order=None, limit=None):
+        self._collection = collection
+        self._filters = filters
+        self._order = order
+        self._limit = limit
+
+    def where(self, field, op, value):
+        return Query(self._collection, self._filters + ((field, self._OPS[op], value),), self._order, self._limit)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return Query(self._collection, self._filters, (field, direction == 'DESCENDING'), self._limit)
+
+    def limit(self, count):
+        return Query(self._collection, self._filters, self._order, count)
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        snapshots = [
+            snapshot for snapshot in self._collection.documents()
+            if all(snapshot._data.get(field) is not None and op(snapshot._data[field], value)
+                   for field, op, value in self._filters)
+        ]
+        if self._order:
+            field, descending = self._order
+            snapshots.sort(key=lambda snapshot: snapshot._data.get(field), reverse=descending)
+        return iter(snapshots[:self._limit] if self._limit is not None else snapshots)
+
+    def get(self):
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    def __init__(self, db, path):
+        super().__init__(self)
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        return DocumentReference(self._db, f'{self.path}/{document_id or uuid.uuid4().hex[:20]}')
+
+    def documents(self):
+        prefix = self.path + '/'
+        return [
+            DocumentReference(self._db, path).get()
+            for path in sorted(self._db.documents)
+            if path.startswith(prefix) and '/' not in path[len(prefix):]
+        ]
+
+
+class DocumentReference:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return CollectionReference(self._db, f'{self.path}/{name}')
+
+    def get(self, transaction=None):
+        return Snapshot(self, self._db.documents.get(self.path), self._db.update_times.get(self.path))
+
+    def set(self, data, merge=False):
+        self._db.write(self, data, merge=merge)
+
+    def update(self, data):
+        if self.path not in self._db.documents:
+            raise KeyError(f'No document to update: {self.path}')
+        self._db.write(self, data, merge=True)
+
+    def delete(self):
+        self._db.delete(self)
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+        self.committed = False
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(('set', reference, data, merge))
+
+    def update(self, reference, data):
+        self._writes.append(('update', reference, data, True))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference, None, False))
+
+    def commit(self):
+        for kind, reference, data, merge in self._writes:
+            if kind == 'delete':
+                reference.delete()
+            elif kind == 'update':
+                reference.update(data)
+            else:
+                reference.set(data, merge=merge)
+        self.committed = True
+        self._db.commits.append(list(self._writes))
+        return []
+
+
+class Transaction(WriteBatch):
+    pass
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.documents = {}
+        self.update_times = {}
+        self.commits = []
+        self._clock = itertools.count(1)
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self):
+        return Transaction(self)
+
+    def write(self, reference, data, merge=False):
+        current = dict(self.documents.get(reference.path) or {}) if merge else {}
+        for field, value in data.items():
+            current[field] = _apply(current.get(field), value)
+        self.documents[reference.path] = current
+        self.update_times[reference.path] = next(self._clock)
+
+    def delete(self, reference):
+        self.documents.pop(reference.path, None)
+        self.update_times.pop(reference.path, None)
+
+
+class AsyncDocumentReference:
+    """
+    Async view of a fake document, like google.cloud.firestore.AsyncDocumentReference
+    """
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.id = reference.id
+        self.path = reference.path
+
+    def collection(self, name):
+        return AsyncCollectionReference(self.reference.collection(name))
+
+    async def get(self, transaction=None):
+        return self.reference.get()
+
+    async def set(self, data, merge=False):
+        self.reference.set(data, merge=merge)
+
+    async def update(self, data):
+        self.reference.update(data)
+
+
+class AsyncQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def where(self, *args):
+        return AsyncQuery(self._query.where(*args))
+
+    def order_by(self, *args, **kwargs):
+        return AsyncQuery(self._query.order_by(*args, **kwargs))
+
+    def limit(self, count):
+        return AsyncQuery(self._query.limit(count))
+
+    async def stream(self):
+        for snapshot in self._query.stream():
+            yield snapshot
+
+
+class AsyncCollectionReference(AsyncQuery):
+    def document(self, document_id=None):
+        return AsyncDocumentReference(self._query.document(document_id))
+
+
+class AsyncWriteBatch:
+    def __init__(self, batch):
+        self._batch = batch
+
+    def set(self, reference, data, merge=False):
+        self._batch.set(reference.reference, data, merge=merge)
+
+    def update(self, reference, data):
+        self._batch.update(reference.reference, data)
+
+    async def commit(self):
+        return self._batch.commit()
+
+
+class AsyncFakeFirestore:
+    """
+    Async client over a FakeFirestore, so both serving modes can share one store
+    """
+
+    def __init__(self, db):
+        self.sync = db
+
+    def collection(self, name):
+        return AsyncCollectionReference(self.sync.collection(name))
+
+    def batch(self):
+        return AsyncWriteBatch(self.sync.batch())
@@ -0,0 +1,79 @@
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+from api import chat_turns, history_cache
+from fake_firestore import AsyncFakeFirestore, FakeFirestore, FakeFirestoreModule
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(chat_turns, 'firestore', FakeFirestoreModule())
+    db = FakeFirestore()
+    monkeypatch.setattr(asgi, 'db_async', AsyncFakeFirestore(db))
+    history_cache.history_cache.clear()
+    return db
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    async def verify_token(request):
+        return 'user-1' if request.headers.get('Authorization') == 'Bearer good' else None
+
+    async def generate(message, emotion, conversation_history=None, summary=None):
+        replies.append((message, emotion, list(conversation_history or [])))
+        return f'reply to {message}'
+
+    replies = []
+    monkeypatch.setattr(asgi, 'verify_token', verify_token)
+    monkeypatch.setattr(asgi, 'generate_response_async', generate)
+    client = TestClient(asgi.app)
+    client.replies = replies
+    return client
+
+
+def chat(client, **body):
+    body.setdefault('sentiment', {'emotion': 'joy'})
+    return client.post('/api/generate_response', json=body, headers={'Authorization': 'Bearer good'})
+
+
+def test_dispatch_sends_chat_routes_to_starlette_and_the_rest_to_flask(client):
+    # Only the Flask app answers GET /
+    response = client.get('/')
+    assert response.json()['message'] == 'Mental Wellness API is running'
+
+    # Starlette rejects the method on its own route; Flask would 405 with HTML
+    response = client.get('/api/generate_response')
+    assert response.status_code == 405
+    assert 'text/html' not in response.headers.get('content-type', '')
+
+
+def test_generate_response_stores_turns_and_reuses_the_history(client, db):
+    first = chat(client, message='hello')
+    assert first.status_code == 200
+    conversation_id = first.json()['conversation_id']
+    assert first.json()['response'] == 'reply to hello'
+
+    second = chat(client, message='again', conversation_id=conversation_id)
+    assert second.json()['conversation_id'] == conversation_id
+    assert client.replies[-1] == ('again', 'joy', [
+        {'role': 'user', 'content': 'hello'},
+        {'role': 'assistant', 'content': 'reply to hello'}
+    ])
+
+    conversation = db.collection('conversations').document('user-1').collection('chats').document(conversation_id)
+    assert conversation.get().get(history_cache.VERSION_FIELD) == 4
+    assert [m.get('sender') for m in conversation.collection('messages').order_by('timestamp').stream()] == ['user', 'ai', 'user', 'ai']
+
+
+def test_history_is_read_from_firestore_on_a_cache_miss(client, db):
+    conversation_id = chat(client, message='hello').json()['conversation_id']
+    history_cache.history_cache.clear()
+
+    chat(client, message='again', conversation_id=conversation_id)
+    assert [turn['content'] for turn in client.replies[-1][2]] == ['hello', 'reply to hello']
+
+
+def test_generate_response_requires_a_valid_token(client):
+    response = client.post('/api/generate_response', json={'message': 'hi'}, headers={'Authorization': 'Bearer bad'})
+    assert response.status_code == 401
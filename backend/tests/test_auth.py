@@ -0,0 +1,90 @@
+import pytest
+
+from utils import auth
+from utils import cache as cache_module
+
+
+@pytest.fixture(autouse=True)
+def clean_auth_state(monkeypatch):
+    monkeypatch.setattr(auth, '_revoked_before', {})
+    auth.token_cache.clear()
+    yield
+    auth.token_cache.clear()
+
+
+def test_revocations_are_pruned_once_their_tokens_expired(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(auth.time, 'time', lambda: now[0])
+
+    auth.revoke_cached_tokens(uid='old')
+    now[0] += auth.TOKEN_MAX_LIFETIME
+    auth.revoke_cached_tokens(uid='recent')
+    # Within the lifetime of a token issued just before the revocation
+    assert set(auth._revoked_before) == {'old', 'recent'}
+
+    now[0] += auth.TOKEN_CACHE_SKEW + 1
+    auth.revoke_cached_tokens(uid='new')
+    assert set(auth._revoked_before) == {'recent', 'new'}
+    assert auth.is_revoked('recent', now[0] - auth.TOKEN_MAX_LIFETIME)
+
+
+def test_revocation_applies_to_earlier_seconds_only(monkeypatch):
+    monkeypatch.setattr(auth.time, 'time', lambda: 1_000_000.75)
+    auth.revoke_cached_tokens(uid='alice')
+
+    assert auth.is_revoked('alice', 999_999)
+    # iat is whole seconds, so a token issued right after the revocation shares its second
+    assert not auth.is_revoked('alice', 1_000_000)
+    assert not auth.is_revoked('bob', 999_999)
+
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    now = [1_000_000.0]
+    clock = type('Clock', (), {'monotonic': staticmethod(lambda: now[0]), 'time': staticmethod(lambda: now[0])})
+    monkeypatch.setattr(auth, 'time', clock)
+    monkeypatch.setattr(cache_module, 'time', clock)
+
+    calls = []
+
+    def decode(token):
+        calls.append(token)
+        return {'uid': 'alice', 'iat': int(now[0]) - 10, 'exp': now[0] + 600}
+
+    monkeypatch.setattr(auth, 'decode_token', decode)
+    return now, calls
+
+
+def test_verified_tokens_are_served_from_the_cache(decode_calls):
+    _, calls = decode_calls
+    assert auth.verify_firebase_token('Bearer token-1') == 'alice'
+    assert auth.verify_firebase_token('Bearer token-1') == 'alice'
+    assert calls == ['token-1']
+
+    assert auth.verify_firebase_token('Bearer token-2') == 'alice'
+    assert calls == ['token-1', 'token-2']
+
+
+def test_cached_tokens_expire_before_the_token_does(decode_calls):
+    now, calls = decode_calls
+    assert auth.verify_firebase_token('Bearer token-1') == 'alice'
+
+    # Still cached just inside exp minus the skew
+    now[0] += 600 - auth.TOKEN_CACHE_SKEW - 1
+    assert auth.verify_firebase_token('Bearer token-1') == 'alice'
+    assert calls == ['token-1']
+
+    now[0] += 2
+    assert auth.verify_firebase_token('Bearer token-1') == 'alice'
+    assert calls == ['token-1', 'token-1']
+
+
+def test_revoked_user_is_verified_again_on_a_cache_hit(decode_calls):
+    now, calls = decode_calls
+    assert auth.verify_firebase_token('Bearer token-1') == 'alice'
+    auth.revoke_cached_tokens(uid='alice')
+
+    # The fake issues tokens 10 seconds old, so the re-verified token is rejected too
+    assert auth.verify_firebase_token('Bearer token-1') is None
+    assert calls == ['token-1', 'token-1']
+    assert auth.token_cache.get(auth.token_key('token-1')) is None
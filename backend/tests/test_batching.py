@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from api.batching import MicroBatcher
+
+
+def make_batcher(process_batch=None, **kwargs):
+    batches = []
+
+    def record(items):
+        batches.append(list(items))
+        return process_batch(items) if process_batch else [item * 2 for item in items]
+
+    return MicroBatcher(record, **kwargs), batches
+
+
+def test_flushes_when_batch_is_full():
+    batcher, batches = make_batcher(max_batch_size=3, max_wait_ms=10000)
+
+    started = time.monotonic()
+    futures = [batcher.submit(i) for i in range(3)]
+
+    # A full batch goes out without waiting for max_wait_ms
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4]
+    assert time.monotonic() - started < 5
+    assert batches == [[0, 1, 2]]
+
+
+def test_flushes_after_max_wait():
+    batcher, batches = make_batcher(max_batch_size=100, max_wait_ms=50)
+
+    started = time.monotonic()
+    futures = [batcher.submit(i) for i in range(3)]
+    results = [f.result(timeout=5) for f in futures]
+
+    assert results == [0, 2, 4]
+    assert time.monotonic() - started >= 0.04
+    assert sum(len(batch) for batch in batches) == 3
+    assert len(batches) == 1
+
+
+def test_exception_reaches_every_future():
+    def fail(items):
+        raise ValueError('model unavailable')
+
+    batcher, _ = make_batcher(fail, max_batch_size=100, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(3)]
+
+    for future in futures:
+        with pytest.raises(ValueError, match='model unavailable'):
+            future.result(timeout=5)
+
+
+def test_wrong_result_count_fails_the_batch():
+    batcher, _ = make_batcher(lambda items: items[:-1], max_batch_size=100, max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(2)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_dead_worker_restarts_on_the_same_queue():
+    threads = []
+
+    def process(items):
+        threads.append(threading.current_thread())
+        if 'die' in items:
+            # Not an Exception, so it ends the worker thread instead of failing the batch
+            raise SystemExit
+        return [item * 2 for item in items]
+
+    batcher, _ = make_batcher(process, max_batch_size=100, max_wait_ms=10)
+    assert batcher.submit(1).result(timeout=5) == 2
+    original = batcher._worker
+    queue_before = batcher._queue
+
+    batcher.submit('die')
+    original.join(timeout=5)
+    assert not original.is_alive()
+
+    # An item left on the queue by the dead worker is picked up by its replacement
+    orphan = Future()
+    queue_before.put((5, orphan, time.monotonic()))
+    assert batcher.submit(3).result(timeout=5) == 6
+    assert orphan.result(timeout=5) == 10
+    assert batcher._queue is queue_before
+    assert batcher._worker is not original
+    assert threads[-1] is batcher._worker
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api import chat_turns, history_cache
+from fake_firestore import FakeFirestore, FakeFirestoreModule
+
+# Replies are stamped with the current time, so earlier turns must be older
+SENT_AT = datetime.now(timezone.utc) - timedelta(hours=1)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(chat_turns, 'firestore', FakeFirestoreModule())
+    history_cache.history_cache.clear()
+    return FakeFirestore()
+
+
+def messages(db, conversation_id):
+    conversation = chat_turns.conversation_document(db, 'u1', conversation_id)
+    return [m.to_dict() for m in conversation.collection('messages').order_by('timestamp').stream()]
+
+
+def test_new_conversation_is_created_with_its_first_turn_in_one_commit(db):
+    conversation_id = chat_turns.save_chat_turn(db, 'u1', None, 'hello', 'hi there', {'emotion': 'joy'}, SENT_AT)
+
+    assert len(db.commits) == 1
+    assert [kind for kind, *_ in db.commits[0]] == ['set', 'set', 'set']
+    conversation = chat_turns.conversation_document(db, 'u1', conversation_id).get().to_dict()
+    assert (conversation['title'], conversation['last_message'], conversation[history_cache.VERSION_FIELD]) == ('hello', 'hello', 2)
+    assert [(m['sender'], m['content']) for m in messages(db, conversation_id)] == [('user', 'hello'), ('ai', 'hi there')]
+    assert messages(db, conversation_id)[0]['sentiment'] == {'emotion': 'joy'}
+
+
+def test_turn_writes_the_message_pair_and_conversation_update_in_one_commit(db):
+    conversation_id = chat_turns.save_chat_turn(db, 'u1', None, 'hello', 'hi there', sent_at=SENT_AT)
+    db.commits.clear()
+
+    chat_turns.save_chat_turn(db, 'u1', conversation_id, 'again', 'still here', version=2)
+
+    assert len(db.commits) == 1
+    (update, user_message, reply) = db.commits[0]
+    assert update[0] == 'update' and update[1].id == conversation_id
+    assert (user_message[2]['sender'], reply[2]['sender']) == ('user', 'ai')
+
+    conversation = chat_turns.conversation_document(db, 'u1', conversation_id).get().to_dict()
+    assert (conversation['last_message'], conversation[history_cache.VERSION_FIELD]) == ('again', 4)
+    assert [m['content'] for m in messages(db, conversation_id)] == ['hello', 'hi there', 'again', 'still here']
+
+
+def test_failed_commit_stores_nothing_and_keeps_the_cache(db, monkeypatch):
+    conversation_id = chat_turns.save_chat_turn(db, 'u1', None, 'hello', 'hi there', sent_at=SENT_AT)
+    stored = dict(db.documents)
+
+    def fail(self):
+        raise RuntimeError('unavailable')
+
+    monkeypatch.setattr(type(db.batch()), 'commit', fail)
+    with pytest.raises(RuntimeError):
+        chat_turns.save_chat_turn(db, 'u1', conversation_id, 'again', 'lost', version=2)
+
+    assert db.documents == stored
+    assert history_cache.get_window('u1', conversation_id, 2, None) is not None
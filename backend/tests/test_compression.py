@@ -0,0 +1,93 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from utils import compression
+from utils.compression import compress_response
+from utils.http_cache import is_fresh, not_modified, with_etag
+from utils.static_files import send_upload
+
+LARGE = {'items': ['entry %d' % i for i in range(500)]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route('/large')
+    def large():
+        etag = 'abc123'
+        if is_fresh(etag):
+            return not_modified(etag)
+        return with_etag(jsonify(LARGE), etag)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    return app.test_client()
+
+
+def test_large_json_is_gzipped_with_an_encoded_etag(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == LARGE
+    assert response.headers['ETag'] == '"abc123-gzip"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_identity_is_sent_without_accept_encoding(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == LARGE
+    assert response.headers['ETag'] == '"abc123"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_small_responses_are_not_compressed_but_still_vary(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+@pytest.mark.parametrize('cached_etag', ['"abc123-gzip"', '"abc123"'])
+def test_revalidation_returns_304_for_the_cached_representation(client, cached_etag):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip', 'If-None-Match': cached_etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == cached_etag
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_stale_etag_gets_the_full_response(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"old-gzip"'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_brotli_is_preferred_when_available(client, monkeypatch):
+    class FakeBrotli:
+        @staticmethod
+        def compress(data, quality):
+            return b'br:' + data[:10]
+
+    monkeypatch.setattr(compression, 'brotli', FakeBrotli)
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['ETag'] == '"abc123-br"'
+
+
+def test_uploaded_file_304s_are_left_alone(tmp_path):
+    (tmp_path / '0123456789abcdef-64.webp').write_bytes(b'image')
+    app = Flask(__name__)
+    app.after_request(compress_response)
+    app.add_url_rule('/uploads/<path:filename>', 'uploads', lambda filename: send_upload(str(tmp_path), filename))
+
+    response = app.test_client().get('/uploads/0123456789abcdef-64.webp', headers={'If-None-Match': '"0123456789abcdef-64.webp"'})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == '"0123456789abcdef-64.webp"'
+    assert 'Vary' not in response.headers
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from api import groq_api
+from api.groq_api import StreamInterruptedError
+
+
+class FakeStream:
+    def __init__(self, lines, error=None):
+        self.lines = lines
+        self.error = error
+
+    def iter_lines(self, decode_unicode=True):
+        for line in self.lines:
+            yield line
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def token(content):
+    return 'data: ' + json.dumps({'choices': [{'delta': {'content': content}}]})
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test-key')
+
+    def install(response=None, error=None):
+        def post(*args, **kwargs):
+            if error:
+                raise error
+            return response
+        monkeypatch.setattr(groq_api.http_client, 'post', post)
+    return install
+
+
+def test_complete_stream_yields_every_piece(groq):
+    groq(FakeStream([token('Hello'), '', token(' there'), 'data: [DONE]']))
+    assert list(groq_api.generate_response_stream('hi', 'joy')) == ['Hello', ' there']
+
+
+def test_failure_before_first_piece_yields_fallback(groq):
+    groq(error=ConnectionError('refused'))
+    assert list(groq_api.generate_response_stream('hi', 'joy')) == [groq_api.fallback_response('joy')]
+
+
+def test_failure_mid_stream_raises(groq):
+    groq(FakeStream([token('Hello')], error=ConnectionError('reset')))
+    stream = groq_api.generate_response_stream('hi', 'joy')
+    assert next(stream) == 'Hello'
+    with pytest.raises(StreamInterruptedError):
+        next(stream)
+
+
+def test_stream_ending_without_done_raises(groq):
+    groq(FakeStream([token('Hello')]))
+    with pytest.raises(StreamInterruptedError):
+        list(groq_api.generate_response_stream('hi', 'joy'))
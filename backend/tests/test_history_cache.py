@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from api import history_cache
+from api.history_window import HISTORY_FETCH_LIMIT
+
+HISTORY = [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'hello'}]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    history_cache.history_cache.clear()
+    yield
+    history_cache.history_cache.clear()
+
+
+def test_window_is_served_at_the_version_it_was_read():
+    history_cache.put_window('u1', 'c1', 4, None, HISTORY)
+    assert history_cache.get_window('u1', 'c1', 4, None) == HISTORY
+
+
+def test_stale_version_or_summary_is_a_miss():
+    summarized = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    history_cache.put_window('u1', 'c1', 4, summarized, HISTORY)
+
+    # Another worker stored a turn, or the summary job folded older messages
+    assert history_cache.get_window('u1', 'c1', 6, summarized) is None
+    assert history_cache.get_window('u1', 'c1', 4, datetime(2024, 1, 2, tzinfo=timezone.utc)) is None
+    # Conversations from before history_version are never cached
+    assert history_cache.get_window('u1', 'c1', None, summarized) is None
+
+
+def test_append_turn_extends_a_current_window():
+    history_cache.put_window('u1', 'c1', 4, None, HISTORY)
+    history_cache.append_turn('u1', 'c1', 4, 'again', 'reply')
+
+    assert history_cache.get_window('u1', 'c1', 6, None) == HISTORY + [
+        {'role': 'user', 'content': 'again'},
+        {'role': 'assistant', 'content': 'reply'}
+    ]
+
+
+def test_append_turn_drops_a_window_read_at_another_version():
+    history_cache.put_window('u1', 'c1', 4, None, HISTORY)
+    # The turn's history was loaded at version 6, so the entry missed a turn
+    history_cache.append_turn('u1', 'c1', 6, 'again', 'reply')
+
+    assert history_cache.history_cache.get('u1/c1') is None
+    assert history_cache.get_window('u1', 'c1', 8, None) is None
+
+
+def test_new_conversation_starts_a_window_at_version_two():
+    history_cache.append_turn('u1', 'new', None, 'hi', 'hello', is_new=True)
+    assert history_cache.get_window('u1', 'new', 2, None) == HISTORY
+
+
+def test_window_is_capped_at_the_fetch_limit():
+    long_history = [{'role': 'user', 'content': str(i)} for i in range(HISTORY_FETCH_LIMIT)]
+    history_cache.put_window('u1', 'c1', 4, None, long_history)
+    history_cache.append_turn('u1', 'c1', 4, 'again', 'reply')
+
+    window = history_cache.get_window('u1', 'c1', 6, None)
+    assert len(window) == HISTORY_FETCH_LIMIT
+    assert window[-1] == {'role': 'assistant', 'content': 'reply'}
@@ -0,0 +1,79 @@
+import pytest
+
+from api import groq_api, history_window
+from api.history_window import count_tokens, fit_history, message_tokens
+
+
+@pytest.fixture(autouse=True)
+def small_context(monkeypatch):
+    monkeypatch.setattr(history_window, 'PROMPT_TOKENIZER_FILE', None)
+    monkeypatch.setattr(history_window, '_tokenizer', None)
+    monkeypatch.setattr(history_window, 'CONTEXT_WINDOW', 400)
+    monkeypatch.setattr(history_window, 'PROMPT_SAFETY_MARGIN', 20)
+
+
+def turns(count, length=70):
+    history = []
+    for i in range(count):
+        history.append({'role': 'user', 'content': f'q{i} ' + 'x' * length})
+        history.append({'role': 'assistant', 'content': f'a{i} ' + 'y' * length})
+    return history
+
+
+def budget(system_message, message, max_tokens):
+    return (history_window.CONTEXT_WINDOW - max_tokens - history_window.PROMPT_SAFETY_MARGIN
+            - message_tokens({'content': system_message}) - message_tokens({'content': message}))
+
+
+def test_short_history_is_kept_whole():
+    history = turns(2, length=10)
+    assert fit_history(history, 'system', 'hello', 100) == history
+
+
+def test_history_is_trimmed_to_the_token_budget_oldest_first():
+    history = turns(10)
+    window = fit_history(history, 'system', 'hello', 100)
+
+    assert 0 < len(window) < len(history)
+    assert window == history[-len(window):]
+    assert sum(map(message_tokens, window)) <= budget('system', 'hello', 100)
+    # One more message would not have fit
+    assert sum(map(message_tokens, history[-len(window) - 1:])) > budget('system', 'hello', 100)
+
+
+def test_newest_turn_is_kept_when_older_turns_are_dropped():
+    history = turns(10)
+    window = fit_history(history, 'system', 'hello', 100)
+    assert window[-2:] == history[-2:]
+
+
+def test_reply_reservation_shrinks_the_window():
+    history = turns(10)
+    assert len(fit_history(history, 'system', 'hello', 200)) < len(fit_history(history, 'system', 'hello', 100))
+
+
+def test_message_that_does_not_fit_ends_the_window():
+    history = turns(3, length=10)
+    history[2]['content'] = 'z' * 2000
+    # Older messages behind the oversized one are dropped too, so no gap appears
+    assert fit_history(history, 'system', 'hello', 100) == history[3:]
+
+
+def test_summary_counts_against_the_budget(monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test-key')
+    # Room for the 800-token reply, the system prompt and part of the history
+    monkeypatch.setattr(history_window, 'CONTEXT_WINDOW', 1300)
+    history = turns(10)
+
+    _, without_summary = groq_api.build_request('hello', 'calm', history)
+    _, with_summary = groq_api.build_request('hello', 'calm', history, summary='s' * 350)
+
+    assert with_summary['messages'][0]['content'].endswith('s' * 350)
+    assert len(with_summary['messages']) < len(without_summary['messages'])
+    prompt = sum(message_tokens(m) for m in with_summary['messages'])
+    assert prompt + groq_api.MAX_TOKENS <= history_window.CONTEXT_WINDOW
+
+
+def test_tokens_are_estimated_without_a_tokenizer():
+    assert count_tokens('') == 0
+    assert count_tokens('x' * 7) == 2
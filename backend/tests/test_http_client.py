@@ -0,0 +1,123 @@
+import pytest
+import requests
+
+from utils import http_client
+from utils.http_client import CircuitBreaker, CircuitOpenError
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}', response=self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Install a fake session and return a function that sets its outcomes
+    """
+    state = {}
+    monkeypatch.setattr(http_client.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(http_client, 'get_session', lambda url: state['session'])
+    monkeypatch.setattr(http_client, '_breakers', {})
+
+    def install(*outcomes):
+        state['session'] = FakeSession(outcomes)
+        return state['session']
+    return install
+
+
+def test_sessions_are_pooled_per_host():
+    first = http_client.get_session('https://api.example.com/v1/a')
+    assert http_client.get_session('https://api.example.com/v1/b') is first
+    assert http_client.get_session('https://other.example.com/') is not first
+
+
+def test_retries_retryable_statuses_and_connection_errors(upstream):
+    session = upstream(503, requests.ConnectionError('reset'), 200)
+    response = http_client.post('https://api.example.com', 'test', max_retries=2)
+    assert response.status_code == 200
+    assert session.calls == 3
+
+
+def test_gives_up_after_max_retries(upstream):
+    session = upstream(503, 503, 503)
+    with pytest.raises(requests.HTTPError):
+        http_client.post('https://api.example.com', 'test', max_retries=2)
+    assert session.calls == 3
+
+
+def test_client_errors_are_not_retried(upstream):
+    session = upstream(400, 200)
+    with pytest.raises(requests.HTTPError):
+        http_client.post('https://api.example.com', 'test')
+    assert session.calls == 1
+    assert not http_client.get_breaker('test').is_open
+
+
+def test_open_circuit_rejects_calls(upstream):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    http_client._breakers['test'] = breaker
+    session = upstream(503, 503, 200)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            http_client.post('https://api.example.com', 'test', max_retries=0)
+    with pytest.raises(CircuitOpenError):
+        http_client.post('https://api.example.com', 'test', max_retries=0)
+    assert session.calls == 2
+
+
+def test_probe_after_reset_timeout_closes_the_circuit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker('probe', failure_threshold=1, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow_request()
+
+    now[0] += 30
+    assert breaker.allow_request()
+    # Only one probe at a time
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow_request()
+
+
+def test_failed_probe_reopens_the_circuit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker('probe', failure_threshold=1, reset_timeout=30)
+
+    breaker.record_failure()
+    now[0] += 30
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+
+def test_retry_after_is_honoured_up_to_the_backoff_cap():
+    assert http_client.backoff_delay(1, FakeResponse(429, {'Retry-After': '1'})) == 1.0
+    assert http_client.backoff_delay(1, FakeResponse(429, {'Retry-After': '600'})) == http_client.BACKOFF_MAX
+    assert 0 <= http_client.backoff_delay(3) <= http_client.BACKOFF_MAX
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+import app as backend
+from api import mood_analytics
+from fake_firestore import FakeFirestore, FakeFirestoreModule
+from utils import request_context
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(request_context, 'verify_firebase_token', lambda header: 'user-1')
+    monkeypatch.setattr(mood_analytics, 'get_series', lambda *args: [])
+    return backend.app.test_client()
+
+
+def get_analytics(client):
+    return client.get('/api/moods/analytics', headers={'Authorization': 'Bearer token'})
+
+
+def test_summary_without_trend_is_not_rebuilt(client, monkeypatch):
+    # A user without numeric moods has a summary whose trend is None
+    monkeypatch.setattr(mood_analytics, 'get_summary', lambda db, user_id: {'trend': None})
+    rebuild = mock.Mock()
+    monkeypatch.setattr(mood_analytics, 'rebuild', rebuild)
+
+    response = get_analytics(client)
+    assert response.status_code == 200
+    assert response.get_json()['trend'] is None
+    rebuild.assert_not_called()
+
+
+def test_missing_summary_is_rebuilt_once(client, monkeypatch):
+    summaries = iter([None, {'trend': 3.456}])
+    monkeypatch.setattr(mood_analytics, 'get_summary', lambda db, user_id: next(summaries))
+    rebuild = mock.Mock(return_value=4)
+    monkeypatch.setattr(mood_analytics, 'rebuild', rebuild)
+
+    response = get_analytics(client)
+    assert response.get_json()['trend'] == 3.46
+    rebuild.assert_called_once()
+
+
+def test_ewma_matches_the_recurrence():
+    values = [float(v % 7) for v in range(200)]
+    expected = []
+    trend = values[0]
+    for value in values:
+        trend = mood_analytics.MOOD_EWMA_ALPHA * value + (1 - mood_analytics.MOOD_EWMA_ALPHA) * trend
+        expected.append(trend)
+    assert mood_analytics.ewma(values) == pytest.approx(expected)
+
+
+def test_aggregate_buckets_by_utc_day_and_week():
+    day = 86400
+    # Monday 2024-01-01 twice, Tuesday once, then the following Monday
+    monday = 1704067200
+    timestamps = [monday, monday + 3600, monday + day, monday + 7 * day]
+    values = [2.0, 4.0, 5.0, 1.0]
+
+    days = mood_analytics.aggregate(timestamps, values, 'day')
+    assert [bucket['count'] for bucket in days.values()] == [2, 1, 1]
+    first = next(iter(days.values()))
+    assert (first['sum'], first['min'], first['max']) == (6.0, 2.0, 4.0)
+
+    weeks = mood_analytics.aggregate(timestamps, values, 'week')
+    assert [start.weekday() for start in weeks] == [0, 0]
+    assert [bucket['count'] for bucket in weeks.values()] == [3, 1]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(mood_analytics, 'firestore', FakeFirestoreModule())
+    return FakeFirestore()
+
+
+def record_mood(db, user_id, mood, recorded_at):
+    # What POST /api/mood commits: the entry and its analytics in one transaction
+    transaction = db.transaction()
+    mood_analytics.add_mood(transaction, db, user_id, mood, recorded_at)
+    transaction.set(db.collection('moods').document(user_id).collection('entries').document(), {
+        'mood': mood,
+        'timestamp': recorded_at
+    })
+    transaction.commit()
+
+
+def day_counts(db, user_id):
+    return {
+        bucket.id: bucket.get('count')
+        for bucket in mood_analytics.buckets_collection(db, user_id, 'day').stream()
+    }
+
+
+def test_mood_added_before_first_view_does_not_hide_older_entries(db):
+    old = datetime(2024, 1, 1, 9, tzinfo=timezone.utc)
+    for hour, mood in enumerate((2, 4)):
+        db.collection('moods').document('u1').collection('entries').document().set({
+            'mood': mood,
+            'timestamp': old + timedelta(hours=hour)
+        })
+    new = datetime(2024, 1, 2, 9, tzinfo=timezone.utc)
+    record_mood(db, 'u1', 5, new)
+
+    # The increment created a summary that only knows the new mood
+    assert mood_analytics.get_summary(db, 'u1') is None
+
+    assert mood_analytics.rebuild(db, 'u1') == 3
+    summary = mood_analytics.get_summary(db, 'u1')
+    assert summary['trend'] == pytest.approx(float(mood_analytics.ewma([2, 4, 5])[-1]))
+    assert day_counts(db, 'u1') == {'2024-01-01': 2, '2024-01-02': 1}
+
+    # Later moods add to the seeded summary without another rebuild
+    record_mood(db, 'u1', 3, new + timedelta(hours=1))
+    assert mood_analytics.get_summary(db, 'u1')['seeded']
+    assert day_counts(db, 'u1') == {'2024-01-01': 2, '2024-01-02': 2}
+
+
+def test_mood_added_during_rebuild_is_not_lost(db, monkeypatch):
+    day = datetime(2024, 1, 1, 9, tzinfo=timezone.utc)
+    db.collection('moods').document('u1').collection('entries').document().set({'mood': 2, 'timestamp': day})
+    load_moods = mood_analytics._load_moods
+    loads = []
+
+    def load_then_record(db, user_id):
+        moods = load_moods(db, user_id)
+        if not loads:
+            # Lands after the entries were read, before the buckets are overwritten
+            record_mood(db, user_id, 4, day + timedelta(hours=1))
+        loads.append(moods)
+        return moods
+
+    monkeypatch.setattr(mood_analytics, '_load_moods', load_then_record)
+    assert mood_analytics.rebuild(db, 'u1') == 2
+    assert len(loads) == 2
+    assert day_counts(db, 'u1') == {'2024-01-01': 2}
+    assert mood_analytics.get_summary(db, 'u1')['trend'] == pytest.approx(float(mood_analytics.ewma([2, 4])[-1]))
@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from models.records import Goal
+from utils import pagination
+from utils.pagination import PaginationError, decode_cursor, encode_cursor, fetch_page, page_size, parse_fields
+
+
+class FakeSnapshot:
+    def __init__(self, id, data):
+        self.id = id
+        self._data = data
+
+    def get(self, field):
+        return self._data.get(field)
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """
+    Records the calls fetch_page makes and serves documents from a list
+    """
+
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+        self.calls = []
+
+    def _record(self, name, *args, **kwargs):
+        self.calls.append((name, args, kwargs))
+        return self
+
+    def order_by(self, *args, **kwargs):
+        return self._record('order_by', *args, **kwargs)
+
+    def select(self, *args):
+        return self._record('select', *args)
+
+    def start_after(self, *args):
+        return self._record('start_after', *args)
+
+    def limit(self, size):
+        self._limit = size
+        return self._record('limit', size)
+
+    def stream(self):
+        return iter(self.snapshots[:self._limit])
+
+
+def test_cursor_round_trips_datetimes_and_ids():
+    moment = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(FakeSnapshot('doc-1', {'created_at': moment}), 'created_at')
+    assert decode_cursor(cursor, 'created_at') == {'created_at': moment, '__name__': 'doc-1'}
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(PaginationError):
+        decode_cursor('not a cursor', 'created_at')
+
+
+def test_page_size_is_clamped():
+    assert page_size(None, default=10) == 10
+    assert page_size(10_000) == pagination.MAX_PAGE_SIZE
+    with pytest.raises(PaginationError):
+        page_size(0)
+
+
+def test_fields_are_validated():
+    assert parse_fields(None, ('title',)) is None
+    assert parse_fields('title, content', ('title', 'content')) == ['title', 'content']
+    with pytest.raises(PaginationError):
+        parse_fields('title,password', ('title',))
+
+
+def test_fetch_page_returns_a_cursor_only_when_more_documents_exist():
+    snapshots = [FakeSnapshot(f'doc-{i}', {'created_at': i}) for i in range(3)]
+
+    page, cursor = fetch_page(FakeQuery(snapshots), 'created_at', limit=2)
+    assert [s.id for s in page] == ['doc-0', 'doc-1']
+    assert decode_cursor(cursor, 'created_at') == {'created_at': 1, '__name__': 'doc-1'}
+
+    page, cursor = fetch_page(FakeQuery(snapshots), 'created_at', limit=3)
+    assert len(page) == 3 and cursor is None
+
+
+def test_fetch_page_selects_requested_fields_plus_the_order_field():
+    query = FakeQuery([])
+    fetch_page(query, 'target_date', fields=['title'], cursor=encode_cursor(FakeSnapshot('g', {'target_date': 'x'}), 'target_date'))
+    calls = {name: args for name, args, _ in query.calls}
+    assert calls['select'] == (['target_date', 'title'],)
+    assert calls['start_after'] == ({'target_date': 'x', '__name__': 'g'},)
+
+
+def test_records_project_to_requested_fields():
+    goal = Goal.from_snapshot(FakeSnapshot('g1', {'title': 'Walk', 'description': 'daily', 'completed': True}))
+    assert goal.to_dict(['title']) == {'id': 'g1', 'title': 'Walk'}
+    assert set(goal.to_dict()) >= {'id', 'title', 'description', 'completed'}
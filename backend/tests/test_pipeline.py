@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api import pipeline
+from api.pipeline import StageGraph, fan_out
+from utils.lazy import PerProcess
+
+
+@pytest.fixture
+def single_fan_out_thread(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pipeline, '_fan_out_executor', PerProcess(lambda: executor))
+    yield executor
+    executor.shutdown(wait=False)
+
+
+def test_stage_graph_passes_dependency_results():
+    graph = StageGraph('test').add('a', lambda: 2).add('b', lambda: 3).add('sum', lambda a, b: a + b, 'a', 'b')
+    assert graph.run()['sum'] == 5
+
+
+def test_fan_out_reports_timeouts_and_errors_separately():
+    release = threading.Event()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    results, errors = fan_out('test', {'ok': lambda: 1, 'slow': release.wait, 'bad': fail}, timeout=0.1)
+    release.set()
+    assert results == {'ok': 1}
+    assert errors == {'slow': 'timeout', 'bad': 'error'}
+
+
+def test_timed_out_fan_out_tasks_do_not_starve_stage_graph(single_fan_out_thread):
+    release = threading.Event()
+    try:
+        fan_out('test', {'stuck': release.wait}, timeout=0.05)
+        # The stuck task still holds the only fan_out thread
+        results = StageGraph('test').add('a', lambda: 'ran').run()
+        assert results == {'a': 'ran'}
+    finally:
+        release.set()
+
+
+def test_queued_fan_out_tasks_are_cancelled_on_timeout(single_fan_out_thread):
+    release = threading.Event()
+    started = []
+    _, errors = fan_out('test', {
+        'stuck': release.wait,
+        'queued': lambda: started.append(True)
+    }, timeout=0.05)
+    release.set()
+    single_fan_out_thread.shutdown(wait=True)
+    assert errors == {'stuck': 'timeout', 'queued': 'timeout'}
+    assert started == []
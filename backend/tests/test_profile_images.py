@@ -0,0 +1,54 @@
+from api import profile_images
+from api.profile_images import collect_garbage, referenced_keys, variant_name
+
+PREFIX = 'profile_images/u1/'
+BASE = 'http://localhost:5000/uploads/'
+
+
+class FakeStorage:
+    def __init__(self, keys):
+        self.keys = set(keys)
+
+    def delete(self, key):
+        self.keys.discard(key)
+
+
+def variants_of(content_hash):
+    return {size: PREFIX + variant_name(content_hash, size) for size in profile_images.PROFILE_IMAGE_SIZES}
+
+
+def profile_for(content_hash):
+    keys = variants_of(content_hash)
+    return {
+        'photoURL': BASE + keys[profile_images.PROFILE_IMAGE_DEFAULT_SIZE],
+        'photoVariants': {str(size): BASE + key for size, key in keys.items()}
+    }
+
+
+def test_referenced_keys_include_pre_variant_uploads_and_skip_other_users():
+    profile = {
+        'photoURL': BASE + PREFIX + 'legacy.jpeg',
+        'photoVariants': {'64': BASE + 'profile_images/u2/x-64.webp'}
+    }
+    assert referenced_keys(profile, PREFIX) == {PREFIX + 'legacy.jpeg'}
+    assert referenced_keys({}, PREFIX) == set()
+
+
+def test_concurrent_uploads_keep_each_others_variants():
+    old, first, second = 'a' * 16, 'b' * 16, 'c' * 16
+    storage = FakeStorage([*variants_of(old).values(), *variants_of(first).values(), *variants_of(second).values()])
+
+    # Both uploads stored their variants; the first write replaced the old
+    # picture, the second one replaced the first
+    collect_garbage(storage, PREFIX, profile_for(old), first)
+    assert set(variants_of(second).values()) <= storage.keys
+
+    collect_garbage(storage, PREFIX, profile_for(first), second)
+    assert storage.keys == set(variants_of(second).values())
+
+
+def test_reuploading_the_same_picture_keeps_it():
+    current = 'd' * 16
+    storage = FakeStorage(variants_of(current).values())
+    assert collect_garbage(storage, PREFIX, profile_for(current), current) == 0
+    assert storage.keys == set(variants_of(current).values())
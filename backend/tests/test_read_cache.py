@@ -0,0 +1,33 @@
+from api import read_cache
+from utils.cache import SQLiteCache
+
+
+def test_backend_defaults_to_sqlite_with_several_workers(monkeypatch):
+    monkeypatch.delenv('READ_CACHE_BACKEND', raising=False)
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    assert read_cache.default_backend() == 'memory'
+
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert read_cache.default_backend() == 'sqlite'
+
+    monkeypatch.setenv('READ_CACHE_BACKEND', 'memory')
+    assert read_cache.default_backend() == 'memory'
+
+
+def test_invalidation_in_one_worker_reaches_the_others(monkeypatch, tmp_path):
+    path = str(tmp_path / 'reads.sqlite3')
+    workers = [SQLiteCache('reads_test', maxsize=100, ttl=60, path=path) for _ in range(2)]
+    loads = []
+
+    def read(worker):
+        monkeypatch.setattr(read_cache, 'read_cache', workers[worker])
+        return read_cache.get_or_load('u1', 'moods', '/api/moods', lambda: loads.append(worker) or len(loads))
+
+    assert read(0) == 1
+    assert read(1) == 1
+
+    monkeypatch.setattr(read_cache, 'read_cache', workers[0])
+    read_cache.invalidate('u1', 'moods')
+
+    assert read(1) == 2
+    assert loads == [0, 1]
@@ -0,0 +1,69 @@
+import json
+import logging
+import re
+from datetime import datetime, timezone
+
+import pytest
+
+import app as backend
+from fake_firestore import FakeFirestore
+from utils import request_context
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeFirestore()
+    monkeypatch.setattr(request_context, 'db', db)
+    monkeypatch.setattr(request_context, 'verify_firebase_token', lambda header: 'user-1' if header == 'Bearer good' else None)
+    db.collection('journals').document('user-1').collection('entries').document('j1').set({
+        'title': 'Day one',
+        'content': 'Felt better',
+        'created_at': datetime(2024, 1, 1, tzinfo=timezone.utc)
+    })
+    return db
+
+
+@pytest.fixture
+def client(db):
+    return backend.app.test_client()
+
+
+def server_timing(response):
+    return {
+        match.group(1): float(match.group(2))
+        for match in re.finditer(r'(\w+);dur=([\d.]+)', response.headers['Server-Timing'])
+    }
+
+
+def test_server_timing_reports_each_stage(client):
+    response = client.get('/api/journal/j1', headers={'Authorization': 'Bearer good'})
+    assert response.status_code == 200
+    assert response.get_json()['title'] == 'Day one'
+
+    stages = server_timing(response)
+    assert {'auth', 'firestore', 'serialization', 'total'} <= set(stages)
+    assert stages['total'] >= max(stages['auth'], stages['firestore'], stages['serialization'])
+
+
+def test_missing_or_invalid_token_is_rejected_before_the_view(client, db, monkeypatch):
+    monkeypatch.setattr(request_context.UserContext, 'collection', lambda *args: pytest.fail('view ran'))
+
+    response = client.get('/api/journal/j1')
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'No authorization header provided'}
+
+    response = client.get('/api/journal/j1', headers={'Authorization': 'Bearer bad'})
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'Invalid or expired token'}
+    # Verifying the token is still timed
+    assert set(server_timing(response)) == {'auth', 'total'}
+
+
+def test_timing_log_line(client, monkeypatch, caplog):
+    monkeypatch.setattr(request_context, 'REQUEST_TIMING_LOG', True)
+    with caplog.at_level(logging.INFO, logger='request_timing'):
+        client.get('/api/journal/j1', headers={'Authorization': 'Bearer good'})
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert (record['route'], record['status'], record['user']) == ('/api/journal/<entry_id>', 200, 'user-1')
+    assert 'firestore' in record['stages']
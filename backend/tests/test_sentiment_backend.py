@@ -0,0 +1,113 @@
+import asyncio
+import importlib
+
+import pytest
+
+from api import sentiment
+from utils.cache import LRUCache
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """
+    Reload api.sentiment with SENTIMENT_BACKEND set (or unset, for None)
+    """
+    def load(value):
+        if value is None:
+            monkeypatch.delenv('SENTIMENT_BACKEND', raising=False)
+        else:
+            monkeypatch.setenv('SENTIMENT_BACKEND', value)
+        monkeypatch.delenv('SENTIMENT_BATCHING', raising=False)
+        importlib.reload(sentiment)
+        monkeypatch.setattr(sentiment, 'sentiment_cache', LRUCache('sentiment-test', maxsize=16))
+        return engine_calls(monkeypatch)
+
+    yield load
+    monkeypatch.undo()
+    importlib.reload(sentiment)
+
+
+def engine_calls(monkeypatch):
+    calls = []
+
+    def model_result():
+        return {'sentiment_score': 0.9, 'emotion': 'joy', 'emotions': {'joy': 0.9}, 'confidence': 0.9}
+
+    def engine(name):
+        def run(texts):
+            calls.append(name)
+            return [model_result() for _ in texts]
+        return run
+
+    def fallback(text):
+        calls.append('fallback')
+        return {'sentiment_score': 0, 'emotion': 'sadness', 'emotions': {}, 'confidence': 0.5, 'note': sentiment.FALLBACK_NOTE}
+
+    async def remote_async(text):
+        calls.append('remote_async')
+        return model_result()
+
+    monkeypatch.setattr(sentiment, 'analyze_batch_remote', engine('remote'))
+    monkeypatch.setattr(sentiment, 'analyze_batch_local', engine('local'))
+    monkeypatch.setattr(sentiment, 'fallback_sentiment_analysis', fallback)
+    monkeypatch.setattr(sentiment, 'analyze_remote_async', remote_async)
+    return calls
+
+
+def test_remote_is_the_default(configure):
+    calls = configure(None)
+    assert sentiment.SENTIMENT_BACKEND == 'remote'
+
+    sentiment.analyze_sentiment('hello')
+    assert calls == ['remote']
+
+
+@pytest.mark.parametrize('value, backend', [
+    ('remote', 'remote'),
+    ('local', 'local'),
+    ('fallback', 'fallback'),
+    ('LOCAL', 'local'),
+])
+def test_configured_backend_scores_messages(configure, value, backend):
+    calls = configure(value)
+    assert sentiment.SENTIMENT_BACKEND == backend
+
+    sentiment.analyze_sentiment('hello')
+    assert calls == [backend]
+
+
+def test_argument_overrides_the_configured_backend(configure):
+    calls = configure('remote')
+
+    sentiment.analyze_sentiment('hello', 'local')
+    sentiment.analyze_sentiment('hello', 'fallback')
+    assert calls == ['local', 'fallback']
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, ['remote_async']),
+    ('remote', ['remote_async']),
+    ('local', ['local']),
+    ('fallback', ['fallback']),
+])
+def test_async_variant_follows_the_configured_backend(configure, value, expected):
+    calls = configure(value)
+
+    asyncio.run(sentiment.analyze_sentiment_async('hello'))
+    assert calls == expected
+
+
+def test_local_backend_maps_classifier_rows_to_the_remote_format(monkeypatch):
+    from api import emotion_classifier
+
+    class Classifier:
+        def classify(self, texts):
+            return [[{'label': 'gratitude', 'score': 0.8}, {'label': 'neutral', 'score': 0.2}] for _ in texts]
+
+    monkeypatch.setattr(emotion_classifier, 'get_local_classifier', lambda labels: Classifier())
+    assert sentiment.analyze_batch_local(['thanks']) == [{
+        'sentiment_score': sentiment.EMOTION_SENTIMENT_MAP['gratitude'],
+        'emotion': 'gratitude',
+        'emotions': {'gratitude': 0.8, 'neutral': 0.2},
+        'confidence': 0.8
+    }]
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from api import sentiment
+from utils.cache import LRUCache, SQLiteCache, make_cache
+
+
+def model_result(emotion='joy', score=0.9):
+    return {
+        'sentiment_score': score,
+        'emotion': emotion,
+        'emotions': {emotion: score, 'neutral': 1 - score},
+        'confidence': score
+    }
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    calls = []
+
+    def fake_batch(texts, backend=None):
+        calls.append(list(texts))
+        return [model_result() for _ in texts]
+
+    monkeypatch.setattr(sentiment, 'analyze_sentiment_batch', fake_batch)
+    monkeypatch.setattr(sentiment, 'SENTIMENT_BATCHING', False)
+    monkeypatch.setattr(sentiment, 'sentiment_cache', LRUCache('sentiment-test', maxsize=16))
+    return calls
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache('test-lru', maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_entries_expire_after_ttl():
+    cache = LRUCache('test-ttl', ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.06)
+    assert cache.get('a') is None
+
+
+def test_sqlite_cache_round_trips_json(tmp_path):
+    cache = make_cache('test-sqlite', backend='sqlite', path=str(tmp_path / 'cache.sqlite3'))
+    assert isinstance(cache, SQLiteCache)
+    cache.set('a', model_result())
+    assert cache.get('a') == model_result()
+    cache.delete('a')
+    assert cache.get('a') is None
+
+
+def test_equivalent_texts_share_a_key():
+    assert sentiment.cache_key('I feel  great\n', 'remote') == sentiment.cache_key('I feel great', 'remote')
+    assert sentiment.cache_key('I feel great', 'remote') != sentiment.cache_key('I feel great', 'local')
+
+
+def test_repeated_text_is_scored_once(scored):
+    assert sentiment.analyze_sentiment('hello there', 'remote') == model_result()
+    assert sentiment.analyze_sentiment('hello   there', 'remote') == model_result()
+    assert len(scored) == 1
+
+
+def test_callers_cannot_corrupt_cached_results(scored):
+    first = sentiment.analyze_sentiment('hello', 'remote')
+    first['emotions']['joy'] = -1
+
+    second = sentiment.analyze_sentiment('hello', 'remote')
+    second['emotions']['neutral'] = 42
+
+    assert sentiment.analyze_sentiment('hello', 'remote')['emotions'] == model_result()['emotions']
+    assert len(scored) == 1
+
+
+def test_fallback_results_are_not_cached(monkeypatch, scored):
+    monkeypatch.setattr(sentiment, 'analyze_sentiment_batch',
+                        lambda texts, backend=None: [sentiment.fallback_sentiment_analysis(t) for t in texts])
+    sentiment.analyze_sentiment('hello', 'remote')
+    assert len(sentiment.sentiment_cache) == 0
@@ -0,0 +1,183 @@
+import io
+
+import pytest
+from flask import Flask
+from google.api_core.exceptions import NotFound
+
+from utils import static_files
+from utils.static_files import IMMUTABLE_CACHE_CONTROL, send_stored, send_upload
+from utils.storage import GCSStorage, LocalStorage, make_storage
+
+HASHED = 'profile_images/u1/0123456789abcdef-256.webp'
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control = None
+        self.content_type = None
+
+    @property
+    def size(self):
+        return len(self.bucket.objects[self.name]['data'])
+
+    def upload_from_file(self, file, size=None, content_type=None):
+        data = file.read() if size is None else file.read(size)
+        self.bucket.objects[self.name] = {'data': data, 'content_type': content_type, 'cache_control': self.cache_control}
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def delete(self):
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        del self.bucket.objects[self.name]
+
+    def open(self, mode):
+        return io.BytesIO(self.bucket.objects[self.name]['data'])
+
+    def generate_signed_url(self, version, expiration, method):
+        if not self.bucket.can_sign:
+            raise AttributeError('you need a private key to sign credentials')
+        return f'https://storage.example/{self.name}?expires={int(expiration.total_seconds())}'
+
+
+class FakeBucket:
+    def __init__(self, can_sign=True):
+        self.objects = {}
+        self.can_sign = can_sign
+
+    def blob(self, name, chunk_size=None):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        return FakeBlob(self, name) if name in self.objects else None
+
+
+class FakeClient:
+    def __init__(self, bucket):
+        self._bucket = bucket
+
+    def bucket(self, name):
+        return self._bucket
+
+    def list_blobs(self, bucket, prefix, delimiter):
+        return [
+            FakeBlob(bucket, name) for name in sorted(bucket.objects)
+            if name.startswith(prefix) and delimiter not in name[len(prefix):]
+        ]
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_local_storage_round_trip(tmp_path):
+    local = LocalStorage(str(tmp_path))
+    local.put('profile_images/u1/a.webp', b'abc')
+    local.put('profile_images/u1/b.webp', io.BytesIO(b'streamed'))
+    local.put('profile_images/u1/nested/c.webp', b'x')
+
+    assert local.exists('profile_images/u1/a.webp')
+    assert local.size('profile_images/u1/b.webp') == 8
+    assert sorted(local.list('profile_images/u1/')) == ['profile_images/u1/a.webp', 'profile_images/u1/b.webp']
+    with local.open('profile_images/u1/b.webp') as f:
+        assert f.read() == b'streamed'
+
+    local.delete('profile_images/u1/a.webp')
+    local.delete('profile_images/u1/a.webp')
+    assert not local.exists('profile_images/u1/a.webp')
+    assert local.open('profile_images/u1/a.webp') is None
+    assert local.list('profile_images/none/') == []
+
+
+def test_gcs_storage_against_a_fake_bucket():
+    bucket = FakeBucket()
+    gcs = GCSStorage(FakeClient(bucket), 'uploads', signed_url_ttl=600)
+    gcs.put(HASHED, b'image', content_type='image/webp', cache_control=IMMUTABLE_CACHE_CONTROL)
+    gcs.put('profile_images/u1/other.jpeg', io.BytesIO(b'streamed'))
+
+    assert bucket.objects[HASHED]['cache_control'] == IMMUTABLE_CACHE_CONTROL
+    assert gcs.exists(HASHED) and gcs.size(HASHED) == 5
+    assert gcs.size('missing') is None and gcs.open('missing') is None
+    assert sorted(gcs.list('profile_images/u1/')) == [HASHED, 'profile_images/u1/other.jpeg']
+    assert gcs.open('profile_images/u1/other.jpeg').read() == b'streamed'
+    assert gcs.signed_url(HASHED) == f'https://storage.example/{HASHED}?expires=600'
+
+    gcs.delete(HASHED)
+    gcs.delete(HASHED)
+    assert not gcs.exists(HASHED)
+
+
+def test_gcs_storage_stops_signing_after_a_failure():
+    gcs = GCSStorage(FakeClient(FakeBucket(can_sign=False)), 'uploads')
+    assert gcs.signed_url(HASHED) is None
+    assert gcs._can_sign is False
+
+
+def test_local_backend_never_creates_the_gcs_client(tmp_path):
+    def get_client():
+        raise AssertionError('GCS client created for local storage')
+
+    assert isinstance(make_storage(str(tmp_path), get_client, backend='local'), LocalStorage)
+    assert isinstance(make_storage(str(tmp_path), lambda: FakeClient(FakeBucket()), backend='gcs', bucket_name='b'), GCSStorage)
+    # Without a bucket the gcs backend falls back to local files
+    assert isinstance(make_storage(str(tmp_path), lambda: FakeClient(FakeBucket()), backend='gcs', bucket_name=None), LocalStorage)
+
+
+def test_send_stored_redirects_to_a_signed_url(app):
+    gcs = GCSStorage(FakeClient(FakeBucket()), 'uploads', signed_url_ttl=600)
+    with app.test_request_context():
+        response = send_stored(gcs, HASHED)
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith(f'https://storage.example/{HASHED}')
+    assert response.headers['Cache-Control'] == 'private, max-age=300'
+
+
+def test_send_stored_streams_through_the_worker_without_signing(app):
+    bucket = FakeBucket(can_sign=False)
+    gcs = GCSStorage(FakeClient(bucket), 'uploads')
+    gcs.put(HASHED, b'image bytes')
+
+    with app.test_request_context():
+        response = send_stored(gcs, HASHED)
+        response.direct_passthrough = False
+        assert response.status_code == 200
+        assert response.get_data() == b'image bytes'
+        assert response.mimetype == 'image/webp'
+        assert response.headers['ETag'] == '"0123456789abcdef-256.webp"'
+        assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+    with app.test_request_context(headers={'If-None-Match': '"0123456789abcdef-256.webp"'}):
+        assert send_stored(gcs, HASHED).status_code == 304
+
+    with app.test_request_context():
+        assert send_stored(gcs, 'profile_images/u1/missing.webp').status_code == 404
+        assert send_stored(gcs, 'profile_images/../secrets').status_code == 404
+
+
+def test_send_upload_leaves_the_bytes_to_nginx_in_accel_mode(app, tmp_path, monkeypatch):
+    LocalStorage(str(tmp_path)).put(HASHED, b'image bytes')
+    monkeypatch.setattr(static_files, 'UPLOADS_OFFLOAD', 'accel')
+
+    with app.test_request_context():
+        response = send_upload(str(tmp_path), HASHED)
+    assert response.headers['X-Accel-Redirect'] == '/protected-uploads/' + HASHED
+    assert response.get_data() == b''
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_send_upload_serves_the_file_directly_by_default(app, tmp_path):
+    LocalStorage(str(tmp_path)).put(HASHED, b'image bytes')
+
+    with app.test_request_context():
+        response = send_upload(str(tmp_path), HASHED)
+        response.direct_passthrough = False
+        assert response.get_data() == b'image bytes'
+        assert 'X-Accel-Redirect' not in response.headers
+        assert response.headers['ETag'] == '"0123456789abcdef-256.webp"'
+
+    with app.test_request_context():
+        assert send_upload(str(tmp_path), 'profile_images/u1/missing.webp').status_code == 404
@@ -0,0 +1,23 @@
+from api import summarizer
+from api.summarizer import needs_summary
+
+
+def test_summary_fires_every_k_turns_past_the_kept_messages(monkeypatch):
+    monkeypatch.setattr(summarizer, 'SUMMARY_EVERY_TURNS', 5)
+    monkeypatch.setattr(summarizer, 'SUMMARY_KEEP_RECENT', 6)
+    monkeypatch.setattr(summarizer, 'HISTORY_FETCH_LIMIT', 40)
+
+    assert not needs_summary(15)
+    assert needs_summary(16)
+
+
+def test_threshold_above_the_fetch_limit_is_capped(monkeypatch):
+    # 2 * 20 + 6 = 46 messages, but callers never load more than 40
+    monkeypatch.setattr(summarizer, 'SUMMARY_EVERY_TURNS', 20)
+    monkeypatch.setattr(summarizer, 'SUMMARY_KEEP_RECENT', 6)
+    monkeypatch.setattr(summarizer, 'HISTORY_FETCH_LIMIT', 40)
+
+    assert not needs_summary(39)
+    assert needs_summary(40)
+    # What the chat endpoints pass with a full history window
+    assert needs_summary(40 + 2)
@@ -0,0 +1,127 @@
+import os
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from utils import auth
+from utils.token_verifier import LocalTokenVerifier, StaticKeySource
+
+PROJECT_ID = 'test-project'
+ISSUER = f'https://securetoken.google.com/{PROJECT_ID}'
+
+
+@pytest.fixture(scope='module')
+def signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def issue(signing_key):
+    """
+    Sign ID tokens the way Firebase does, with claims overridable per test
+    """
+    def sign(uid='user-1', kid='test-kid', key=None, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': ISSUER,
+            'aud': PROJECT_ID,
+            'sub': uid,
+            'iat': now - 10,
+            'auth_time': now - 10,
+            'exp': now + 3600
+        }
+        payload.update(claims)
+        return jwt.encode(payload, key or signing_key, algorithm='RS256', headers={'kid': kid})
+    return sign
+
+
+@pytest.fixture
+def verifier(signing_key, monkeypatch):
+    source = StaticKeySource({'test-kid': signing_key.public_key()})
+    verifier = LocalTokenVerifier(PROJECT_ID, source)
+    # Keys come from the static source; no background refresh timer
+    monkeypatch.setattr(verifier, '_schedule', lambda delay: None)
+    verifier.refresh()
+    verifier._timer_pid = os.getpid()
+
+    monkeypatch.setattr(auth, 'TOKEN_VERIFIER', 'local')
+    monkeypatch.setattr(auth, '_revoked_before', {})
+    auth.set_local_verifier(verifier)
+    auth.token_cache.clear()
+    yield verifier
+    auth.token_cache.clear()
+    auth.set_local_verifier(None)
+
+
+def bearer(token):
+    return f'Bearer {token}'
+
+
+def test_valid_token_resolves_to_uid(verifier, issue):
+    assert auth.verify_firebase_token(bearer(issue(uid='alice'))) == 'alice'
+
+
+@pytest.mark.parametrize('claims', [
+    {'exp': int(time.time()) - 3600, 'iat': int(time.time()) - 7200},
+    {'aud': 'other-project'},
+    {'iss': 'https://securetoken.google.com/other-project'},
+])
+def test_invalid_claims_are_rejected(verifier, issue, claims):
+    assert auth.verify_firebase_token(bearer(issue(**claims))) is None
+
+
+def test_unknown_kid_is_rejected(verifier, issue):
+    assert auth.verify_firebase_token(bearer(issue(kid='unknown-kid'))) is None
+
+
+def test_wrong_signing_key_is_rejected(verifier, issue):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    assert auth.verify_firebase_token(bearer(issue(key=other_key))) is None
+
+
+def test_malformed_header_is_rejected(verifier, issue):
+    assert auth.verify_firebase_token(issue()) is None
+    assert auth.verify_firebase_token('Bearer not-a-jwt') is None
+
+
+def test_cache_hit_skips_verification(verifier, issue, monkeypatch):
+    token = issue(uid='alice')
+    assert auth.verify_firebase_token(bearer(token)) == 'alice'
+
+    calls = []
+    monkeypatch.setattr(verifier, 'verify', lambda token: calls.append(token))
+    assert auth.verify_firebase_token(bearer(token)) == 'alice'
+    assert calls == []
+
+
+def test_revoking_a_uid_forces_reverification(verifier, issue, monkeypatch):
+    token = issue(uid='alice')
+    assert auth.verify_firebase_token(bearer(token)) == 'alice'
+
+    verify = verifier.verify
+    calls = []
+
+    def counting_verify(token):
+        calls.append(token)
+        return verify(token)
+
+    monkeypatch.setattr(verifier, 'verify', counting_verify)
+    auth.revoke_cached_tokens(uid='alice')
+
+    # Issued before the revocation: verified again and rejected
+    assert auth.verify_firebase_token(bearer(token)) is None
+    assert calls == [token]
+
+    # A token issued afterwards is accepted, even within the same second
+    fresh = issue(uid='alice', iat=int(time.time()))
+    assert auth.verify_firebase_token(bearer(fresh)) == 'alice'
+
+
+def test_revoking_a_single_token(verifier, issue, monkeypatch):
+    token = issue(uid='alice')
+    assert auth.verify_firebase_token(bearer(token)) == 'alice'
+
+    auth.revoke_cached_tokens(token=token)
+    assert auth.token_cache.get(auth.token_key(token)) is None
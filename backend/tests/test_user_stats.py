@@ -0,0 +1,70 @@
+import pytest
+
+from api import user_stats
+from fake_firestore import FakeFirestore, FakeFirestoreModule
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(user_stats, 'USER_STATS_SUMMARY', True)
+    monkeypatch.setattr(user_stats, 'firestore', FakeFirestoreModule())
+    db = FakeFirestore()
+    # Count moods straight from the fake instead of running aggregation queries
+    monkeypatch.setattr(user_stats, 'aggregate_counters', lambda db, user_id: count_moods(db, user_id))
+    return db
+
+
+def count_moods(db, user_id):
+    moods = [entry.get('mood') for entry in db.collection('moods').document(user_id).collection('entries').stream()]
+    return {'moodCount': len(moods), 'moodSum': sum(moods), 'moodScoredCount': len(moods)}
+
+
+def add_mood(db, user_id, mood):
+    batch = db.batch()
+    batch.set(db.collection('moods').document(user_id).collection('entries').document(), {'mood': mood})
+    user_stats.add_increments(batch, user_stats.stats_document(db, user_id), **user_stats.mood_increments(mood))
+    batch.commit()
+
+
+def test_missing_summary_is_seeded_from_aggregation(db):
+    for mood in (2, 4):
+        db.collection('moods').document('u1').collection('entries').document().set({'mood': mood})
+
+    assert user_stats.get_stats(db, 'u1')['moodCount'] == 2
+    summary = user_stats.stats_document(db, 'u1').get().to_dict()
+    assert summary['seeded'] and summary['moodCount'] == 2
+
+    # Seeded summaries are read as they are, and later writes add to them
+    add_mood(db, 'u1', 3)
+    stats = user_stats.get_stats(db, 'u1')
+    assert (stats['moodCount'], stats['averageMood']) == (3, 3.0)
+
+
+def test_write_before_first_read_does_not_leave_a_partial_summary(db):
+    # Entries from before the summary was enabled
+    for mood in (1, 5):
+        db.collection('moods').document('u1').collection('entries').document().set({'mood': mood})
+    add_mood(db, 'u1', 3)
+    assert user_stats.stats_document(db, 'u1').get().get('moodCount') == 1
+
+    stats = user_stats.get_stats(db, 'u1')
+    assert (stats['moodCount'], stats['averageMood']) == (3, 3.0)
+    assert user_stats.stats_document(db, 'u1').get().get('seeded')
+
+
+def test_write_during_seeding_is_not_lost(db, monkeypatch):
+    db.collection('moods').document('u1').collection('entries').document().set({'mood': 2})
+    calls = []
+
+    def aggregate_then_write(db, user_id):
+        counters = count_moods(db, user_id)
+        if not calls:
+            # A mood lands after the aggregation read the entries
+            add_mood(db, user_id, 4)
+        calls.append(counters)
+        return counters
+
+    monkeypatch.setattr(user_stats, 'aggregate_counters', aggregate_then_write)
+    assert user_stats.get_stats(db, 'u1')['moodCount'] == 2
+    assert len(calls) == 2
+    assert user_stats.stats_document(db, 'u1').get().get('moodCount') == 2
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import time
+import weakref
+
+from utils import metrics
+from utils.lazy import LazyModule
+from utils.http_client import (
+    CONNECT_TIMEOUT, MAX_RETRIES, READ_TIMEOUT, RETRY_STATUSES,
+    CircuitOpenError, backoff_delay, get_breaker
+)
+
+# Only the async serving mode needs httpx, so the sync app doesn't pay for importing it
+httpx = LazyModule('httpx')
+
+# An event loop can keep far more upstream calls in flight than a sync worker
+ASYNC_POOL_MAXSIZE = int(os.getenv('UPSTREAM_ASYNC_POOL_MAXSIZE', '200'))
+
+# With LOG_LEVEL=DEBUG, per-request httpx/httpcore records would dominate the event loop
+logging.getLogger('httpx').setLevel(logging.WARNING)
+logging.getLogger('httpcore').setLevel(logging.WARNING)
+
+# httpx clients are bound to the event loop that created them
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """
+    Return the keep-alive AsyncClient for the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ASYNC_POOL_MAXSIZE,
+                max_keepalive_connections=ASYNC_POOL_MAXSIZE
+            )
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_clients():
+    """
+    Close the AsyncClient of the running event loop (call on shutdown)
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def post(url, upstream, headers=None, json=None, data=None,
+               connect_timeout=None, read_timeout=None, max_retries=None):
+    """
+    Async counterpart of http_client.post, sharing its circuit breakers
+
+    Returns:
+        httpx.Response: A response with a non-error status
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open
+        httpx.HTTPError: If the request still fails after retries
+    """
+    breaker = get_breaker(upstream)
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"Circuit open for {upstream}")
+
+    timeout = httpx.Timeout(read_timeout or READ_TIMEOUT, connect=connect_timeout or CONNECT_TIMEOUT)
+    retries = MAX_RETRIES if max_retries is None else max_retries
+    latency = metrics.histogram(f'upstream.{upstream}.latency_ms')
+    client = get_client()
+
+    attempt = 0
+    while True:
+        response = None
+        started = time.monotonic()
+        try:
+            response = await client.post(url, headers=headers, json=json, content=data, timeout=timeout)
+        except httpx.TransportError as e:
+            error = e
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                latency.observe((time.monotonic() - started) * 1000.0)
+                breaker.record_success()
+                response.raise_for_status()
+                return response
+            error = httpx.HTTPStatusError(f"{response.status_code} from {upstream}", request=response.request, response=response)
+
+        metrics.counter(f'upstream.{upstream}.errors').inc()
+        if attempt >= retries:
+            breaker.record_failure()
+            raise error
+
+        attempt += 1
+        metrics.counter(f'upstream.{upstream}.retries').inc()
+        await asyncio.sleep(backoff_delay(attempt, response))
@@ -1,36 +1,147 @@
-import firebase_admin
-from firebase_admin import auth
+import os
+import hashlib
+import math
+import threading
+import time
+from utils.cache import LRUCache
+from utils.clients import get_firebase_app
+from utils.lazy import LazyModule
+
+# The Admin SDK's auth module is slow to import; load it with the first verification
+auth = LazyModule('firebase_admin.auth')
+# pyjwt and cryptography are only needed with AUTH_TOKEN_VERIFIER=local
+token_verifier = LazyModule('utils.token_verifier')
+
+# 'firebase' verifies through the Admin SDK, 'local' with in-memory signing keys
+TOKEN_VERIFIER = os.getenv('AUTH_TOKEN_VERIFIER', 'firebase').lower()
+
+# Verified tokens are remembered until shortly before they expire
+TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_SKEW = float(os.getenv('AUTH_TOKEN_CACHE_SKEW_SECONDS', '30'))
+
+# Firebase ID tokens expire an hour after they are issued; a revocation older
+# than that can no longer match a token that would be accepted
+TOKEN_MAX_LIFETIME = 3600
+
+# Tokens are credentials, so this cache never leaves the process
+token_cache = LRUCache('auth_token', maxsize=TOKEN_CACHE_SIZE)
+
+# uid -> second before which tokens for that user are no longer trusted,
+# pruned once every token it could apply to has expired. Whole seconds, like
+# the iat claim: a token issued later in the second of a revocation is valid
+_revoked_before = {}
+_revoked_lock = threading.Lock()
+
+_local_verifier = None
+_local_verifier_lock = threading.Lock()
+
+def get_local_verifier():
+    """
+    Return the process-wide local verifier for the Firebase project
+    """
+    global _local_verifier
+    if _local_verifier is None:
+        with _local_verifier_lock:
+            if _local_verifier is None:
+                project_id = os.getenv('FIREBASE_PROJECT_ID') or os.getenv('VITE_FIREBASE_PROJECT_ID') or get_firebase_app().project_id
+                _local_verifier = token_verifier.LocalTokenVerifier(project_id)
+    return _local_verifier
+
+def set_local_verifier(verifier):
+    """
+    Replace the local verifier, e.g. with one using a fake issuer's key source
+    """
+    global _local_verifier
+    _local_verifier = verifier
+
+def decode_token(token):
+    """
+    Verify an ID token with the configured verifier and return its claims
+    """
+    if TOKEN_VERIFIER == 'local':
+        return get_local_verifier().verify(token)
+    return auth.verify_id_token(token, app=get_firebase_app())
+
+def token_key(token):
+    """
+    Hash a raw ID token into its cache key
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def revoke_cached_tokens(uid=None, token=None):
+    """
+    Stop trusting cached verifications, so the next request re-verifies
+
+    Args:
+        uid (str): Drop every token issued to this user up to now
+        token (str): Drop this one token
+    """
+    if token:
+        token_cache.delete(token_key(token))
+    if uid:
+        now = time.time()
+        with _revoked_lock:
+            _prune_revocations(now)
+            _revoked_before[uid] = math.floor(now)
+
+def _prune_revocations(now):
+    # Called with _revoked_lock held
+    horizon = now - TOKEN_MAX_LIFETIME - TOKEN_CACHE_SKEW
+    for uid in [uid for uid, revoked_at in _revoked_before.items() if revoked_at < horizon]:
+        del _revoked_before[uid]
+
+def is_revoked(uid, issued_at):
+    revoked_before = _revoked_before.get(uid)
+    return revoked_before is not None and issued_at < revoked_before
 
 def verify_firebase_token(auth_header):
     """
     Verify Firebase ID token from Authorization header
-    
+
     Args:
         auth_header (str): Authorization header from request
-        
+
     Returns:
         str: User ID if token is valid, None otherwise
     """
     if not auth_header:
         return None
-    
+
     # Extract token from Authorization header
     # Format: "Bearer <token>"
     parts = auth_header.split()
     if len(parts) != 2 or parts[0].lower() != 'bearer':
         return None
-    
+
     token = parts[1]
-    
+    key = token_key(token)
+
+    # A cache hit is a token we already verified and that hasn't expired
+    cached = token_cache.get(key)
+    if cached is not None:
+        uid, issued_at = cached
+        if not is_revoked(uid, issued_at):
+            return uid
+        token_cache.delete(key)
+
     try:
         # Verify token
-        decoded_token = auth.verify_id_token(token)
-        
+        decoded_token = decode_token(token)
+
         # Get user ID from token
         user_id = decoded_token['uid']
-        
+        issued_at = decoded_token.get('iat', 0)
+
+        if is_revoked(user_id, issued_at):
+            print(f"Rejecting revoked token for user {user_id}")
+            return None
+
+        ttl = decoded_token.get('exp', 0) - time.time() - TOKEN_CACHE_SKEW
+        if ttl > 0:
+            token_cache.set(key, (user_id, issued_at), ttl=ttl)
+
         return user_id
-    
+
     except Exception as e:
         print(f"Error verifying token: {str(e)}")
         return None
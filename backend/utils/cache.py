@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils import metrics
+
+# Directory for SQLite cache files shared by the workers on one host
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache'))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache bounded by entry count and time-to-live
+
+    Args:
+        name (str): Prefix for the hit/miss counters
+        maxsize (int): Maximum number of entries before the least recently
+            used one is evicted
+        ttl (float): Default lifetime of an entry in seconds (None for no expiry)
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = metrics.counter(f'cache.{name}.hits')
+        self.misses = metrics.counter(f'cache.{name}.misses')
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits.inc()
+                    return value
+                del self._data[key]
+        self.misses.inc()
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Cache stored in a local SQLite file so several worker processes can share it
+
+    Values must be JSON-serializable. Same interface as LRUCache; the least
+    recently read entries are evicted once the table exceeds maxsize.
+    """
+
+    # Run the size check once every this many writes
+    EVICT_EVERY = 64
+
+    def __init__(self, name, maxsize=1024, ttl=None, path=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path or os.path.join(CACHE_DIR, f'{name}.sqlite3')
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = metrics.counter(f'cache.{name}.hits')
+        self.misses = metrics.counter(f'cache.{name}.misses')
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+
+    def _connect(self):
+        # sqlite3 connections must not be shared across threads or forks
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+                self.hits.inc()
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"Error reading cache {self.name}: {str(e)}")
+        self.misses.inc()
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires_at, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"Error writing cache {self.name}: {str(e)}")
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+        conn.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,)
+        )
+
+    def delete(self, key):
+        try:
+            self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            print(f"Error deleting from cache {self.name}: {str(e)}")
+
+    def clear(self):
+        try:
+            self._connect().execute('DELETE FROM cache')
+        except sqlite3.Error as e:
+            print(f"Error clearing cache {self.name}: {str(e)}")
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+def make_cache(name, maxsize=1024, ttl=None, backend=None, path=None):
+    """
+    Create a cache with the given backend
+
+    Args:
+        name (str): Cache name, used for metrics and the SQLite file name
+        maxsize (int): Maximum number of entries
+        ttl (float): Default entry lifetime in seconds
+        backend (str): 'memory' (default) or 'sqlite'; falls back to the
+            CACHE_BACKEND environment variable
+        path (str): SQLite file path (defaults to CACHE_DIR/<name>.sqlite3)
+
+    Returns:
+        LRUCache or SQLiteCache
+    """
+    backend = (backend or os.getenv('CACHE_BACKEND', 'memory')).lower()
+    if backend == 'sqlite':
+        try:
+            return SQLiteCache(name, maxsize=maxsize, ttl=ttl, path=path)
+        except Exception as e:
+            print(f"Error opening SQLite cache {name}, using in-process cache: {str(e)}")
+    return LRUCache(name, maxsize=maxsize, ttl=ttl)
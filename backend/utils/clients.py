@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+
+from utils.lazy import PerProcess
+
+logger = logging.getLogger(__name__)
+
+_firebase_lock = threading.Lock()
+
+
+def credentials_path():
+    return os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+
+
+def get_firebase_app():
+    """
+    Return the default Firebase app, initializing it on first use
+
+    A Firebase app only holds configuration (no sockets or threads), so one
+    per interpreter is safe to inherit across fork.
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+
+    with _firebase_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            pass
+
+        cred_path = credentials_path()
+        if not cred_path or not os.path.exists(cred_path):
+            print(f"Warning: Firebase credentials file not found at {cred_path}. Some features may not work properly.")
+            # Initialize Firebase app with default config for testing
+            return firebase_admin.initialize_app()
+        return firebase_admin.initialize_app(credentials.Certificate(cred_path))
+
+
+def _firestore_client(client_class):
+    app = get_firebase_app()
+    return client_class(project=app.project_id, credentials=app.credential.get_credential())
+
+
+def _create_db():
+    from google.cloud import firestore
+    return _firestore_client(firestore.Client)
+
+
+def _create_async_db():
+    from google.cloud import firestore
+    return _firestore_client(firestore.AsyncClient)
+
+
+def _create_storage_client():
+    cred_path = credentials_path()
+    if not cred_path or not os.path.exists(cred_path):
+        logger.warning("Firebase credentials file not found. Storage client not initialized. File uploads will not work.")
+        return None
+    try:
+        from google.cloud import storage
+        storage_client = storage.Client.from_service_account_json(cred_path)
+        logger.info(f"Storage client initialized with project: {storage_client.project}")
+        return storage_client
+    except Exception as e:
+        logger.error(f"Error initializing storage client: {str(e)}", exc_info=True)
+        logger.warning("File uploads will not work due to storage client initialization failure.")
+        return None
+
+
+# Firestore and Cloud Storage clients, created by the first request that uses
+# them in each worker process
+db = PerProcess(_create_db)
+db_async = PerProcess(_create_async_db)
+storage_client = PerProcess(_create_storage_client)
@@ -0,0 +1,86 @@
+import gzip
+import os
+
+from flask import request
+
+from utils import metrics
+from utils.http_cache import ENCODING_SUFFIXES
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+
+def _choose_encoding():
+    encodings = request.accept_encodings
+    if brotli is not None and encodings['br']:
+        return 'br'
+    if encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _not_modified(response):
+    # A 304 carries the tag of the representation the client holds, which
+    # may have an encoding suffix
+    etag, weak = response.get_etag()
+    if not etag or weak or not request.if_none_match:
+        return
+    for suffix in ENCODING_SUFFIXES:
+        if request.if_none_match.contains(f'{etag}-{suffix}'):
+            response.set_etag(f'{etag}-{suffix}')
+            return
+
+
+def compress_response(response):
+    """
+    after_request hook that gzip- or brotli-encodes large text responses
+
+    Streamed responses (the SSE chat stream, files sent from disk) and
+    responses that already carry a Content-Encoding are left alone. A strong
+    ETag gets the encoding appended, so each representation has its own tag;
+    utils.http_cache accepts either form in If-None-Match, and a 304 gets the
+    form the client sent back.
+    """
+    if response.status_code == 304:
+        _not_modified(response)
+        return response
+
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.content_length is None or response.content_length < COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+
+    metrics.counter(f'compression.{encoding}.responses').inc()
+    metrics.counter('compression.bytes_in').inc(len(data))
+    metrics.counter('compression.bytes_out').inc(len(compressed))
+    return response
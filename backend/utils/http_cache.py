@@ -0,0 +1,79 @@
+import hashlib
+
+from flask import Response, request
+
+from utils import metrics
+
+# Suffixes utils.compression appends to the ETag of an encoded response
+ENCODING_SUFFIXES = ('br', 'gzip')
+# Browsers keep the response but revalidate it on every use
+CACHE_CONTROL = 'private, no-cache'
+
+
+def _digest(*parts):
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(repr(part).encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()[:32]
+
+
+def page_etag(user_id, snapshots, next_cursor=None):
+    """
+    Build a strong ETag for a page of documents without serializing it
+
+    The tag covers the user, the request URL (so page size, cursor and
+    fields= projections differ), the ids on the page and the newest update
+    time among them. Any write to a document on the page makes it the newest,
+    and an insert or delete changes the ids, so the tag changes whenever the
+    response body would.
+
+    Args:
+        user_id (str): Authenticated user id
+        snapshots (list): DocumentSnapshots on the page
+        next_cursor (str): Cursor of the next page, if any
+
+    Returns:
+        str: The unquoted ETag
+    """
+    newest = max((snapshot.update_time for snapshot in snapshots if snapshot.update_time is not None), default=None)
+    return _digest(user_id, request.full_path, next_cursor, newest, [snapshot.id for snapshot in snapshots])
+
+
+def value_etag(user_id, value):
+    """
+    Build a strong ETag from an already computed response value
+    """
+    return _digest(user_id, request.full_path, sorted(value.items()) if isinstance(value, dict) else value)
+
+
+def is_fresh(etag):
+    """
+    Whether the request's If-None-Match already names this ETag (in any encoding)
+    """
+    if not request.if_none_match:
+        return False
+    variants = [etag] + [f'{etag}-{suffix}' for suffix in ENCODING_SUFFIXES]
+    return any(request.if_none_match.contains_weak(variant) for variant in variants)
+
+
+def not_modified(etag):
+    """
+    Return an empty 304 response for a fresh ETag
+    """
+    metrics.counter('http.not_modified').inc()
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """
+    Attach the ETag and revalidation headers to a response
+
+    Vary is set here rather than by utils.compression so that 304s, which
+    are never compressed, are keyed like the 200s they revalidate.
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
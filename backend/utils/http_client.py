@@ -0,0 +1,204 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import metrics
+
+# Outbound request defaults, overridable per call
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '30'))
+MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '2'))
+BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.25'))
+BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', '4'))
+POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', '16'))
+
+# Circuit breaker defaults
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('UPSTREAM_BREAKER_FAILURES', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('UPSTREAM_BREAKER_RESET_SECONDS', '30'))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    After failure_threshold failures in a row the circuit opens and calls are
+    rejected for reset_timeout seconds. The first call after that is let
+    through as a probe; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = metrics.counter(f'upstream.{name}.circuit_opened')
+        self.rejected = metrics.counter(f'upstream.{name}.circuit_rejected')
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._probing = True
+                return True
+        self.rejected.inc()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    self.opened.inc()
+                    print(f"Circuit breaker for {self.name} opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_sessions = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+_registry_pid = None
+
+
+def _reset_after_fork():
+    # Pooled sockets must not be shared between forked workers
+    global _registry_pid
+    if _registry_pid != os.getpid():
+        with _registry_lock:
+            if _registry_pid != os.getpid():
+                _sessions.clear()
+                _registry_pid = os.getpid()
+
+
+def get_session(url):
+    """
+    Return the keep-alive session whose connection pool serves url's host
+    """
+    _reset_after_fork()
+    parts = urlsplit(url)
+    host = f'{parts.scheme}://{parts.netloc}'
+
+    session = _sessions.get(host)
+    if session is None:
+        with _registry_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                session.mount(host, adapter)
+                _sessions[host] = session
+    return session
+
+
+def get_breaker(name):
+    """
+    Return the process-wide circuit breaker for an upstream
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name)
+                _breakers[name] = breaker
+    return breaker
+
+
+def backoff_delay(attempt, response=None):
+    # Honour a short Retry-After from 429s, otherwise exponential backoff with full jitter
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def post(url, upstream, headers=None, json=None, data=None, stream=False,
+         connect_timeout=None, read_timeout=None, max_retries=None):
+    """
+    POST to an upstream through its pooled session, with retries and a circuit breaker
+
+    Args:
+        url (str): Request URL
+        upstream (str): Name of the upstream, used for the breaker and metrics
+        headers (dict): Request headers
+        json: JSON body
+        data: Raw body
+        stream (bool): Return before the body is read (for streamed responses)
+        connect_timeout (float): Override for UPSTREAM_CONNECT_TIMEOUT
+        read_timeout (float): Override for UPSTREAM_READ_TIMEOUT
+        max_retries (int): Override for UPSTREAM_MAX_RETRIES
+
+    Returns:
+        requests.Response: A response with a non-error status
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open
+        requests.RequestException: If the request still fails after retries
+    """
+    breaker = get_breaker(upstream)
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"Circuit open for {upstream}")
+
+    timeout = (connect_timeout or CONNECT_TIMEOUT, read_timeout or READ_TIMEOUT)
+    retries = MAX_RETRIES if max_retries is None else max_retries
+    latency = metrics.histogram(f'upstream.{upstream}.latency_ms')
+    session = get_session(url)
+
+    attempt = 0
+    while True:
+        response = None
+        started = time.monotonic()
+        try:
+            response = session.post(url, headers=headers, json=json, data=data, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                latency.observe((time.monotonic() - started) * 1000.0)
+                # Other 4xx errors are our fault, not a sign of an unhealthy upstream
+                breaker.record_success()
+                response.raise_for_status()
+                return response
+            error = requests.HTTPError(f"{response.status_code} from {upstream}", response=response)
+
+        metrics.counter(f'upstream.{upstream}.errors').inc()
+        if attempt >= retries:
+            breaker.record_failure()
+            raise error
+
+        if response is not None:
+            response.close()
+        attempt += 1
+        metrics.counter(f'upstream.{upstream}.retries').inc()
+        time.sleep(backoff_delay(attempt, response))
@@ -0,0 +1,68 @@
+import importlib
+import os
+import threading
+
+
+class LazyModule:
+    """
+    Stands in for a module that is only imported on first attribute access
+
+    Used for dependencies that are slow to import (numpy, Pillow, the
+    Firestore client library) so that importing the app stays fast and the
+    cost is paid by the first request that needs them, or by warm_up() in a
+    preloading parent process.
+
+    Args:
+        name (str): Fully qualified module name
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            # import_module holds the per-module import lock, so concurrent
+            # first uses still import only once
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        return f'<LazyModule {self._name!r}>'
+
+
+class PerProcess:
+    """
+    Stands in for a client created on first use, once per process
+
+    Network clients (gRPC channels, HTTP connection pools) must not be
+    shared with forked children, so a process whose pid differs from the
+    creator's builds its own. This keeps the objects safe to reference
+    from code imported in a gunicorn --preload parent.
+
+    Args:
+        factory (callable): Builds the client, called with no arguments
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._client = self._factory()
+                    self._pid = os.getpid()
+        return self._client
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __bool__(self):
+        return True
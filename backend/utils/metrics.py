@@ -0,0 +1,102 @@
+import bisect
+import threading
+
+# Default latency buckets in milliseconds
+DEFAULT_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Counter:
+    """
+    Monotonic, thread-safe counter
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """
+    Fixed-bucket, thread-safe histogram
+
+    Args:
+        buckets (tuple): Sorted upper bounds; values above the last bound are
+            counted in an implicit '+Inf' bucket
+    """
+
+    def __init__(self, buckets=DEFAULT_MS_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+
+        labels = [str(b) for b in self.buckets] + ['+Inf']
+        return {
+            'count': count,
+            'sum': round(total, 3),
+            'mean': round(total / count, 3) if count else None,
+            'buckets': dict(zip(labels, counts))
+        }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = factory()
+                _registry[name] = metric
+    return metric
+
+
+def counter(name):
+    """
+    Return the process-wide counter registered under name
+    """
+    return _get_or_create(name, Counter)
+
+
+def histogram(name, buckets=DEFAULT_MS_BUCKETS):
+    """
+    Return the process-wide histogram registered under name
+    """
+    return _get_or_create(name, lambda: Histogram(buckets))
+
+
+def snapshot():
+    """
+    Return the current value of every registered metric
+    """
+    with _registry_lock:
+        items = list(_registry.items())
+    return {name: metric.snapshot() for name, metric in sorted(items)}
@@ -0,0 +1,119 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from utils.timing import timed
+
+
+# Page sizes for list endpoints when the client asks for none, and the most it may ask for
+DEFAULT_PAGE_SIZE = int(os.getenv('LIST_DEFAULT_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', '100'))
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class PaginationError(ValueError):
+    """
+    Raised for an invalid cursor, page size or field list
+    """
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'t': value.isoformat()}
+    return {'v': value}
+
+
+def _decode_value(value):
+    if 't' in value:
+        return datetime.fromisoformat(value['t'])
+    return value['v']
+
+
+def encode_cursor(snapshot, order_field):
+    """
+    Build an opaque cursor positioned after a document
+
+    The cursor holds the document's value of the ordering field and its ID,
+    which breaks ties between equal values.
+    """
+    payload = {'o': _encode_value(snapshot.get(order_field)), 'id': snapshot.id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, order_field):
+    """
+    Turn a cursor back into start_after() values for a query ordered by order_field
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return {order_field: _decode_value(payload['o']), '__name__': payload['id']}
+    except (ValueError, KeyError, TypeError) as e:
+        raise PaginationError('Invalid cursor') from e
+
+
+def page_size(limit, default=DEFAULT_PAGE_SIZE):
+    """
+    Clamp a requested page size to [1, MAX_PAGE_SIZE]
+    """
+    if limit is None:
+        return min(default, MAX_PAGE_SIZE)
+    if limit < 1:
+        raise PaginationError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(fields, allowed):
+    """
+    Parse a comma-separated fields= projection
+
+    Returns:
+        list: The requested fields, or None to return every allowed field
+
+    Raises:
+        PaginationError: If a field isn't in allowed
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise PaginationError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return requested
+
+
+def fetch_page(query, order_field, direction='DESCENDING', cursor=None, limit=None,
+               fields=None, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of a collection or query ordered by order_field
+
+    Args:
+        query: Collection reference or query (without order_by or limit)
+        order_field (str): Field to order and page by
+        direction (str): 'ASCENDING' or 'DESCENDING' (firestore.Query.ASCENDING / DESCENDING)
+        cursor (str): Cursor returned with the previous page
+        limit (int): Requested page size (capped at MAX_PAGE_SIZE)
+        fields (list): Document fields to fetch with select(); None for all
+        default_limit (int): Page size when limit is None
+
+    Returns:
+        tuple: (list of DocumentSnapshot, next cursor or None)
+    """
+    size = page_size(limit, default_limit)
+    query = query.order_by(order_field, direction=direction).order_by('__name__', direction=direction)
+    if fields is not None:
+        # The ordering field is needed to build the next cursor
+        query = query.select(sorted(set(fields) | {order_field}))
+    if cursor:
+        query = query.start_after(decode_cursor(cursor, order_field))
+
+    # One extra document tells whether there is a next page
+    with timed('firestore'):
+        snapshots = list(query.limit(size + 1).stream())
+    if len(snapshots) <= size:
+        return snapshots, None
+    snapshots = snapshots[:size]
+    return snapshots, encode_cursor(snapshots[-1], order_field)
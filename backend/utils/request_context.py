@@ -0,0 +1,152 @@
+import functools
+import json
+import logging
+import os
+
+from flask import g, jsonify, request
+
+from utils import metrics
+from utils.auth import verify_firebase_token
+from utils.clients import db
+from utils.timing import RequestTimings, set_current_timings
+
+# Send per-stage durations to the client in a Server-Timing header
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() == 'true'
+# Log one JSON line with the stage durations of every request
+REQUEST_TIMING_LOG = os.getenv('REQUEST_TIMING_LOG', 'false').lower() == 'true'
+
+# Collections holding one subcollection per user: name -> (collection, subcollection)
+USER_COLLECTIONS = {
+    'conversations': ('conversations', 'chats'),
+    'moods': ('moods', 'entries'),
+    'journals': ('journals', 'entries'),
+    'goals': ('goals', 'items')
+}
+
+logger = logging.getLogger('request_timing')
+
+
+def start_timing():
+    """
+    before_request hook creating the request's timings
+    """
+    g.timings = RequestTimings()
+    set_current_timings(g.timings)
+
+
+def finish_timing(response):
+    """
+    after_request hook reporting the request's timings
+
+    Adds the Server-Timing header, records request.<endpoint>.<stage>_ms
+    histograms and, with REQUEST_TIMING_LOG, logs a JSON line. Streamed
+    responses are reported when their headers are sent.
+    """
+    timings = g.get('timings')
+    if timings is None:
+        return response
+
+    total = timings.elapsed_ms()
+    stages = timings.snapshot()
+    endpoint = request.endpoint or 'unmatched'
+
+    for stage, ms in stages.items():
+        metrics.histogram(f'request.{endpoint}.{stage}_ms').observe(ms)
+    metrics.histogram(f'request.{endpoint}.total_ms').observe(total)
+
+    if SERVER_TIMING:
+        entries = [f'{stage};dur={ms:.1f}' for stage, ms in stages.items()]
+        entries.append(f'total;dur={total:.1f}')
+        response.headers['Server-Timing'] = ', '.join(entries)
+
+    if REQUEST_TIMING_LOG:
+        user = g.get('user')
+        logger.info(json.dumps({
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else request.path,
+            'status': response.status_code,
+            'user': user.user_id if user else None,
+            'total_ms': round(total, 2),
+            'stages': stages
+        }))
+    return response
+
+
+def clear_timing(_error=None):
+    """
+    teardown_request hook detaching the timings from the worker thread
+    """
+    set_current_timings(None)
+
+
+def install(app):
+    """
+    Register the timing hooks on a Flask app
+    """
+    app.before_request(start_timing)
+    app.after_request(finish_timing)
+    app.teardown_request(clear_timing)
+
+
+class UserContext:
+    """
+    The authenticated user of a request, with lazily created Firestore references
+
+    Args:
+        user_id (str): Firebase uid the request's token was issued to
+        timings (RequestTimings): Timings of the request
+    """
+
+    def __init__(self, user_id, timings):
+        self.user_id = user_id
+        self.timings = timings
+        self._refs = {}
+
+    def collection(self, name):
+        """
+        Return the user's subcollection of one of USER_COLLECTIONS
+        """
+        ref = self._refs.get(name)
+        if ref is None:
+            parent, subcollection = USER_COLLECTIONS[name]
+            ref = db.collection(parent).document(self.user_id).collection(subcollection)
+            self._refs[name] = ref
+        return ref
+
+    @property
+    def profile(self):
+        """
+        The user's document in the users collection
+        """
+        ref = self._refs.get('users')
+        if ref is None:
+            ref = self._refs['users'] = db.collection('users').document(self.user_id)
+        return ref
+
+    def timed(self, stage):
+        return self.timings.stage(stage)
+
+
+def authenticated(view):
+    """
+    Require a valid Firebase ID token and pass the request's UserContext to the view
+
+    The token is verified once, timed as the 'auth' stage, and the context is
+    also kept as g.user. Requests without a token or with an invalid one get
+    a 401 before the view runs.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return jsonify({'error': 'No authorization header provided'}), 401
+
+        timings = g.get('timings') or RequestTimings()
+        with timings.stage('auth'):
+            user_id = verify_firebase_token(auth_header)
+        if not user_id:
+            return jsonify({'error': 'Invalid or expired token'}), 401
+
+        g.user = UserContext(user_id, timings)
+        return view(g.user, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,118 @@
+import mimetypes
+import os
+import re
+
+from flask import Response, redirect, request, send_from_directory
+from werkzeug.security import safe_join
+
+# Who sends the bytes of uploaded files:
+#   'none'     Flask streams the file itself (gunicorn uses sendfile() when it can)
+#   'sendfile' X-Sendfile header for Apache mod_xsendfile / lighttpd
+#   'accel'    X-Accel-Redirect to an nginx internal location
+UPLOADS_OFFLOAD = os.getenv('UPLOADS_OFFLOAD', 'none').lower()
+# nginx internal location that maps to the uploads directory (for 'accel')
+UPLOADS_ACCEL_PREFIX = os.getenv('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+# Lifetime of files whose name doesn't carry their content hash
+UPLOADS_MAX_AGE = int(os.getenv('UPLOADS_MAX_AGE', '3600'))
+
+# One year, the longest lifetime caches are expected to honour
+IMMUTABLE_MAX_AGE = 31536000
+IMMUTABLE_CACHE_CONTROL = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+
+# Files named '<content hash>-<size>.<ext>' never change once written
+_HASHED_NAME = re.compile(r'^[0-9a-f]{16}-\d+\.(webp|jpg)$')
+
+
+def is_immutable(filename):
+    """
+    Whether a stored file's name is derived from its contents
+    """
+    return bool(_HASHED_NAME.match(os.path.basename(filename)))
+
+
+def _cache_headers(response, filename):
+    if is_immutable(filename):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={UPLOADS_MAX_AGE}'
+    return response
+
+
+def send_upload(directory, filename):
+    """
+    Send an uploaded file with long-lived caching, conditional GET and Range support
+
+    Content-hashed files get a year-long immutable Cache-Control and their
+    file name as a strong ETag, so every instance serving them agrees on it.
+    With UPLOADS_OFFLOAD the bytes are left to the front proxy and the worker
+    only sends headers.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        # Returned rather than raised, since the app's error handler turns exceptions into 500s
+        return Response('Not Found', status=404, mimetype='text/plain')
+
+    etag = os.path.basename(filename) if is_immutable(filename) else True
+
+    if UPLOADS_OFFLOAD == 'accel':
+        # nginx serves the file, including Range and If-None-Match handling
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = UPLOADS_ACCEL_PREFIX.rstrip('/') + '/' + filename.lstrip('/')
+        return _cache_headers(response, filename)
+
+    # With USE_X_SENDFILE (see configure_offload) this only sends headers
+    response = send_from_directory(
+        directory, filename,
+        etag=etag,
+        max_age=IMMUTABLE_MAX_AGE if is_immutable(filename) else UPLOADS_MAX_AGE,
+        conditional=True
+    )
+    return _cache_headers(response, filename)
+
+
+def send_stored(storage, key):
+    """
+    Send an object kept in remote upload storage (utils.storage)
+
+    The client is redirected to a signed URL so the bucket serves the bytes,
+    ranges and revalidation. When URLs can't be signed (e.g. against an
+    emulator) the object is streamed through the worker instead.
+    """
+    if not key or '..' in key.split('/'):
+        return Response('Not Found', status=404, mimetype='text/plain')
+
+    url = storage.signed_url(key)
+    if url:
+        response = redirect(url, code=302)
+        # The redirect can be reused while the signed URL is still valid
+        response.headers['Cache-Control'] = f'private, max-age={storage.signed_url_ttl // 2}'
+        return response
+
+    etag = os.path.basename(key) if is_immutable(key) else None
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return _cache_headers(response, key)
+
+    stream = storage.open(key)
+    if stream is None:
+        return Response('Not Found', status=404, mimetype='text/plain')
+
+    response = Response(
+        iter(lambda: stream.read(64 * 1024), b''),
+        mimetype=mimetypes.guess_type(key)[0] or 'application/octet-stream',
+        direct_passthrough=True
+    )
+    response.call_on_close(stream.close)
+    if etag:
+        response.set_etag(etag)
+    return _cache_headers(response, key)
+
+
+def configure_offload(app):
+    """
+    Apply UPLOADS_OFFLOAD to the Flask app's send_file settings
+    """
+    app.config['USE_X_SENDFILE'] = UPLOADS_OFFLOAD == 'sendfile'
+    if UPLOADS_OFFLOAD not in ('none', 'sendfile', 'accel'):
+        print(f"Unknown UPLOADS_OFFLOAD {UPLOADS_OFFLOAD!r}, serving uploads from Flask")
@@ -0,0 +1,189 @@
+import io
+import os
+import tempfile
+from datetime import timedelta
+
+# Where uploaded files are kept: 'local' (the uploads directory) or 'gcs'
+UPLOAD_STORAGE = os.getenv('UPLOAD_STORAGE', 'local').lower()
+# Bucket for the 'gcs' backend; defaults to the Firebase Storage bucket
+UPLOAD_BUCKET = os.getenv('UPLOAD_BUCKET') or os.getenv('VITE_FIREBASE_STORAGE_BUCKET')
+# Lifetime of the signed URLs /uploads redirects to, in seconds
+UPLOAD_SIGNED_URL_TTL = int(os.getenv('UPLOAD_SIGNED_URL_TTL', '3600'))
+# Chunk size of resumable uploads to GCS (a multiple of 256 KB)
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+
+
+class LocalStorage:
+    """
+    Stores objects as files under a root directory
+
+    Args:
+        root (str): Directory object keys are relative to
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, data, content_type=None, cache_control=None):
+        """
+        Write an object atomically
+
+        Args:
+            data (bytes or file-like): Contents; file-like objects are copied in chunks
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(data, (bytes, bytearray)):
+                    f.write(data)
+                else:
+                    for chunk in iter(lambda: data.read(64 * 1024), b''):
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def list(self, prefix):
+        """
+        Return the keys of the files directly under a prefix ending in '/'
+        """
+        directory = self.path(prefix.rstrip('/'))
+        if not os.path.isdir(directory):
+            return []
+        return [
+            prefix + entry.name
+            for entry in os.scandir(directory)
+            # Temporary files belong to a write still in progress
+            if entry.is_file(follow_symlinks=False) and not entry.name.startswith('.tmp-')
+        ]
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def open(self, key):
+        path = self.path(key)
+        return open(path, 'rb') if os.path.isfile(path) else None
+
+    def signed_url(self, key):
+        # Local files are served by the app itself
+        return None
+
+
+class GCSStorage:
+    """
+    Stores objects in a Google Cloud Storage bucket
+
+    Works against any GCS-compatible endpoint the client is configured for,
+    including a local fake server via STORAGE_EMULATOR_HOST.
+
+    Args:
+        client (google.cloud.storage.Client): Client to use
+        bucket_name (str): Bucket objects are stored in
+        signed_url_ttl (int): Lifetime of signed download URLs in seconds
+    """
+
+    def __init__(self, client, bucket_name, signed_url_ttl=UPLOAD_SIGNED_URL_TTL):
+        self.client = client
+        self.bucket = client.bucket(bucket_name)
+        self.signed_url_ttl = signed_url_ttl
+        self._can_sign = True
+
+    def put(self, key, data, content_type=None, cache_control=None):
+        """
+        Upload an object
+
+        Bytes up to 8 MB go in a single request. File-like objects of unknown
+        length are streamed with a resumable upload in UPLOAD_CHUNK_SIZE
+        chunks, so a dropped connection only repeats the current chunk.
+
+        Args:
+            data (bytes or file-like): Contents
+        """
+        blob = self.bucket.blob(key, chunk_size=UPLOAD_CHUNK_SIZE)
+        if cache_control:
+            blob.cache_control = cache_control
+        if isinstance(data, (bytes, bytearray)):
+            blob.upload_from_file(io.BytesIO(data), size=len(data), content_type=content_type)
+        else:
+            blob.upload_from_file(data, content_type=content_type)
+
+    def exists(self, key):
+        return self.bucket.blob(key).exists()
+
+    def size(self, key):
+        blob = self.bucket.get_blob(key)
+        return blob.size if blob is not None else None
+
+    def list(self, prefix):
+        return [blob.name for blob in self.client.list_blobs(self.bucket, prefix=prefix, delimiter='/')]
+
+    def delete(self, key):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(key).delete()
+        except NotFound:
+            pass
+
+    def open(self, key):
+        """
+        Return a readable stream of an object, or None if it doesn't exist
+        """
+        blob = self.bucket.get_blob(key)
+        return blob.open('rb') if blob is not None else None
+
+    def signed_url(self, key):
+        """
+        Return a time-limited download URL, or None if the credentials can't sign
+        """
+        if not self._can_sign:
+            return None
+        try:
+            return self.bucket.blob(key).generate_signed_url(
+                version='v4',
+                expiration=timedelta(seconds=self.signed_url_ttl),
+                method='GET'
+            )
+        except Exception as e:
+            # e.g. credentials without a private key, or the emulator; these
+            # won't start working later, so stop trying
+            print(f"Error signing URLs, serving uploads through the app: {str(e)}")
+            self._can_sign = False
+            return None
+
+
+def make_storage(upload_root, get_client=None, backend=UPLOAD_STORAGE, bucket_name=UPLOAD_BUCKET):
+    """
+    Create the upload storage backend
+
+    Args:
+        upload_root (str): Local uploads directory, used by the 'local' backend
+        get_client (callable): Returns the google.cloud.storage.Client for the
+            'gcs' backend; not called by the 'local' one, so local deployments
+            need no GCS credentials
+        backend (str): 'local' or 'gcs'
+        bucket_name (str): Bucket for the 'gcs' backend
+
+    Returns:
+        LocalStorage or GCSStorage
+    """
+    if backend == 'gcs':
+        storage_client = get_client() if get_client is not None else None
+        if storage_client is not None and bucket_name:
+            return GCSStorage(storage_client, bucket_name)
+        print("UPLOAD_STORAGE=gcs needs a storage client and UPLOAD_BUCKET, using local uploads")
+    return LocalStorage(upload_root)
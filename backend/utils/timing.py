@@ -0,0 +1,64 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Timings of the request being handled. A context variable rather than
+# flask.g so pipeline stages running on executor threads can add to it.
+_current_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Accumulated time per stage of one request
+
+    Stages may be entered several times and from several threads; their
+    durations add up, so concurrent stages can sum to more than the total.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, ms):
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + ms
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, (time.monotonic() - started) * 1000.0)
+
+    def elapsed_ms(self):
+        return (time.monotonic() - self.started) * 1000.0
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: round(ms, 2) for stage, ms in self._stages.items()}
+
+
+@contextmanager
+def timed(stage):
+    """
+    Count the enclosed block towards a stage of the current request
+
+    A no-op outside a request, so shared helpers can be instrumented
+    regardless of who calls them.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(stage):
+        yield
+
+
+def set_current_timings(timings):
+    """
+    Make timings the current request's, or detach them with None
+    """
+    _current_timings.set(timings)
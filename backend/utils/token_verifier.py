@@ -0,0 +1,173 @@
+import os
+import re
+import threading
+import time
+
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+
+from utils import http_client, metrics
+from utils.http_client import CONNECT_TIMEOUT, READ_TIMEOUT
+
+# Certificates Google signs Firebase ID tokens with, keyed by kid
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+
+# Refresh bounds in seconds, whatever max-age the certificate endpoint sends
+KEY_REFRESH_MIN = float(os.getenv('AUTH_KEY_REFRESH_MIN_SECONDS', '60'))
+KEY_REFRESH_MAX = float(os.getenv('AUTH_KEY_REFRESH_MAX_SECONDS', '21600'))
+# Retry a failed refresh after this many seconds
+KEY_REFRESH_RETRY = float(os.getenv('AUTH_KEY_REFRESH_RETRY_SECONDS', '30'))
+# Accepted clock difference when checking iat/exp/auth_time
+CLOCK_SKEW = float(os.getenv('AUTH_CLOCK_SKEW_SECONDS', '10'))
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleCertificateSource:
+    """
+    Fetches Google's current x509 signing certificates for Firebase ID tokens
+    """
+
+    def __init__(self, url=GOOGLE_CERTS_URL):
+        self.url = url
+
+    def fetch(self):
+        """
+        Returns:
+            tuple: ({kid: public key}, max_age in seconds or None)
+        """
+        response = http_client.get_session(self.url).get(self.url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+
+        keys = {
+            kid: load_pem_x509_certificate(pem.encode('utf-8')).public_key()
+            for kid, pem in response.json().items()
+        }
+        match = _MAX_AGE.search(response.headers.get('Cache-Control', ''))
+        return keys, float(match.group(1)) if match else None
+
+
+class StaticKeySource:
+    """
+    Serves a fixed set of public keys, e.g. those of a local fake issuer in tests
+
+    Args:
+        keys (dict): kid to public key (a cryptography key object or PEM string)
+        max_age (float): Reported refresh interval
+    """
+
+    def __init__(self, keys, max_age=None):
+        self.keys = dict(keys)
+        self.max_age = max_age
+
+    def fetch(self):
+        return dict(self.keys), self.max_age
+
+
+class LocalTokenVerifier:
+    """
+    Verifies Firebase ID tokens with pyjwt against signing keys held in memory
+
+    Keys are refreshed by a background timer according to the source's
+    max-age, so requests never wait on the certificate endpoint unless a
+    token names a kid that hasn't been seen yet.
+
+    Args:
+        project_id (str): Firebase project ID (the expected audience)
+        key_source: Object whose fetch() returns ({kid: key}, max_age)
+    """
+
+    def __init__(self, project_id, key_source=None):
+        if not project_id:
+            raise ValueError("A Firebase project ID is required to verify tokens locally")
+        self.project_id = project_id
+        self.issuer = f'https://securetoken.google.com/{project_id}'
+        self.key_source = key_source or GoogleCertificateSource()
+        self._keys = {}
+        self._timer = None
+        self._timer_pid = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+        self.refreshes = metrics.counter('auth.keys.refreshes')
+        self.refresh_errors = metrics.counter('auth.keys.refresh_errors')
+
+    def refresh(self):
+        """
+        Fetch the current keys now and schedule the next refresh
+
+        Returns:
+            bool: Whether the keys were refreshed
+        """
+        self._last_attempt = time.monotonic()
+        try:
+            keys, max_age = self.key_source.fetch()
+        except Exception as e:
+            self.refresh_errors.inc()
+            print(f"Error refreshing token signing keys: {str(e)}")
+            self._schedule(KEY_REFRESH_RETRY)
+            return False
+
+        with self._lock:
+            self._keys = keys
+        self.refreshes.inc()
+        self._schedule(min(max(max_age or KEY_REFRESH_MIN, KEY_REFRESH_MIN), KEY_REFRESH_MAX))
+        return True
+
+    def _schedule(self, delay):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self.refresh)
+            self._timer.daemon = True
+            self._timer.start()
+            self._timer_pid = os.getpid()
+
+    def _ensure_keys(self):
+        # Timers do not survive fork, so each worker process starts its own
+        if self._timer_pid != os.getpid():
+            self.refresh()
+
+    def get_key(self, kid):
+        self._ensure_keys()
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._last_attempt >= KEY_REFRESH_MIN:
+            # An unseen kid may be a rotation we haven't picked up yet
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def verify(self, token):
+        """
+        Verify a Firebase ID token's signature and claims
+
+        Returns:
+            dict: The decoded claims, with 'uid' set to the subject
+
+        Raises:
+            jwt.InvalidTokenError: If the token is malformed, expired,
+                signed by an unknown key or issued for another project
+        """
+        header = jwt.get_unverified_header(token)
+        if header.get('alg') != 'RS256':
+            raise jwt.InvalidAlgorithmError(f"Unexpected token algorithm {header.get('alg')}")
+
+        key = self.get_key(header.get('kid'))
+        if key is None:
+            raise jwt.InvalidKeyError(f"No signing key for kid {header.get('kid')}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=['RS256'],
+            audience=self.project_id,
+            issuer=self.issuer,
+            leeway=CLOCK_SKEW,
+            options={'require': ['exp', 'iat', 'sub']}
+        )
+        if not claims['sub'] or len(claims['sub']) > 128:
+            raise jwt.InvalidTokenError("Token has an invalid subject")
+        if claims.get('auth_time', 0) > time.time() + CLOCK_SKEW:
+            raise jwt.ImmatureSignatureError("Token auth_time is in the future")
+
+        claims['uid'] = claims['sub']
+        return claims